@@ -1,26 +1,42 @@
 from pydantic import BaseModel, EmailStr
 from passlib.context import CryptContext
-from jose import JWTError, jwt
-from datetime import datetime, timedelta
-from typing import Optional
+from jose import JWTError
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Set
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from db.database import database
+from rate_limit import password_check_limiter
+from jwt_keys import encode_jwt, decode_jwt
+import asyncio
 import logging
 import os
+import threading
+import time
+import uuid
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configuración de JWT
-SECRET_KEY = os.environ.get("SECRET_KEY", "tu-clave-segura-aqui")  # Idealmente usar variables de entorno
-ALGORITHM = "HS256"
+# Configuración de JWT (firma y claves en jwt_keys.py)
 ACCESS_TOKEN_EXPIRE_MINUTES = 120  # Aumentado de 30 a 60 minutos
 REFRESH_TOKEN_EXPIRE_DAYS = 7  # Soporte para refresh tokens
 
+# Modo stateless: el access token lleva los claims de estado y rol, y las rutas
+# protegidas se autentican sin consultar MongoDB. Deshabilitar un usuario solo se aplica
+# a sus tokens vigentes si se hace con set_user_disabled (POST /users/{email}/disable),
+# que registra la revocación; un cambio directo de 'disabled' en la base de datos no
+# afecta a esos tokens hasta que expiran.
+JWT_STATELESS = os.environ.get("JWT_STATELESS", "false").lower() in ("1", "true", "yes")
+# Ventana máxima (en segundos) en la que una revocación tarda en aplicarse en cada worker
+REVOCATION_REFRESH_SECONDS = int(os.environ.get("REVOCATION_REFRESH_SECONDS", "60"))
+
 # Configuración de hashing de contraseñas
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Valor de hashed_password para usuarios creados por OAuth: no es un hash válido,
+# así que ninguna contraseña coincide con él
+OAUTH_ONLY_PASSWORD = "!oauth-only"
 
 # Esquema de autenticación OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -29,6 +45,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 class User(BaseModel):
     email: EmailStr
     disabled: Optional[bool] = False
+    role: Optional[str] = "user"
 
 class UserInDB(User):
     hashed_password: str
@@ -44,6 +61,8 @@ class RefreshTokenRequest(BaseModel):
 # Funciones de utilidad
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica si la contraseña proporcionada coincide con la hasheada."""
+    if hashed_password == OAUTH_ONLY_PASSWORD:
+        return False
     try:
         return pwd_context.verify(plain_password, hashed_password)
     except Exception as e:
@@ -61,9 +80,10 @@ def get_password_hash(password: str) -> str:
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Crea un token de acceso JWT."""
     to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire, "type": "access"})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    now = datetime.utcnow()
+    expire = now + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    to_encode.update({"exp": expire, "iat": now, "jti": uuid.uuid4().hex, "type": "access"})
+    encoded_jwt = encode_jwt(to_encode)
     return encoded_jwt
 
 def create_refresh_token(data: dict) -> str:
@@ -71,13 +91,13 @@ def create_refresh_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     to_encode.update({"exp": expire, "type": "refresh"})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = encode_jwt(to_encode)
     return encoded_jwt
 
 def decode_token(token: str) -> dict:
     """Decodifica un token JWT y verifica su validez."""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_jwt(token)
         return payload
     except JWTError as e:
         logger.error(f"Error al decodificar JWT: {str(e)}")
@@ -87,6 +107,104 @@ def decode_token(token: str) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+# Revocación de tokens para el modo stateless
+class RevocationSet:
+    """Copia en memoria de la colección 'revoked_tokens', refrescada periódicamente.
+
+    Contiene los jti revocados individualmente y, por usuario, el instante a partir
+    del cual se invalidan todos los tokens emitidos antes (p. ej. al deshabilitarlo).
+    """
+
+    def __init__(self, refresh_seconds: int):
+        self.refresh_seconds = refresh_seconds
+        self._jtis: Set[str] = set()
+        self._subjects: Dict[str, float] = {}
+        self._last_refresh: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def refresh(self) -> None:
+        """Recarga las revocaciones vigentes desde MongoDB."""
+        jtis: Set[str] = set()
+        subjects: Dict[str, float] = {}
+        for doc in database["revoked_tokens"].find({}, {"_id": 0, "jti": 1, "sub": 1, "revoked_at": 1}):
+            if doc.get("jti"):
+                jtis.add(doc["jti"])
+            elif doc.get("sub") and doc.get("revoked_at"):
+                revoked_at = doc["revoked_at"].replace(tzinfo=timezone.utc).timestamp()
+                subjects[doc["sub"]] = max(subjects.get(doc["sub"], 0.0), revoked_at)
+        self._jtis, self._subjects = jtis, subjects
+        logger.debug(f"Revocaciones cargadas: {len(jtis)} tokens, {len(subjects)} usuarios")
+
+    def is_stale(self) -> bool:
+        """Indica si ha pasado la ventana de refresco desde la última carga."""
+        return self._last_refresh is None or time.monotonic() - self._last_refresh >= self.refresh_seconds
+
+    def refresh_if_stale(self) -> None:
+        """Refresca el conjunto si ha pasado la ventana configurada (sin bloquear a otros hilos)."""
+        now = time.monotonic()
+        if not self.is_stale():
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self.refresh()
+        except Exception as e:
+            # Se conserva la copia anterior y se reintenta en la siguiente ventana
+            logger.error(f"Error al refrescar tokens revocados: {str(e)}")
+        finally:
+            self._last_refresh = now
+            self._lock.release()
+
+    def add(self, jti: Optional[str] = None, sub: Optional[str] = None, revoked_at: Optional[float] = None) -> None:
+        """Registra una revocación localmente sin esperar al siguiente refresco."""
+        if jti:
+            self._jtis.add(jti)
+        if sub:
+            self._subjects[sub] = max(self._subjects.get(sub, 0.0), revoked_at or time.time())
+
+    async def ensure_fresh(self) -> None:
+        """Refresca el conjunto si está caducado, consultando MongoDB fuera del event loop."""
+        if self.is_stale():
+            await asyncio.to_thread(self.refresh_if_stale)
+
+    def is_revoked(self, payload: dict) -> bool:
+        """Indica si el token (jti) o todos los tokens previos de su usuario están revocados.
+
+        Usa la copia en memoria tal cual; quien la consulta debe llamar antes a `ensure_fresh`.
+        """
+        if payload.get("jti") in self._jtis:
+            return True
+        revoked_at = self._subjects.get(payload.get("sub"))
+        return revoked_at is not None and payload.get("iat", 0) <= revoked_at
+
+revocation_set = RevocationSet(REVOCATION_REFRESH_SECONDS)
+
+def revoke_token(jti: str, expires_at: datetime) -> None:
+    """Revoca un access token concreto hasta su expiración."""
+    database["revoked_tokens"].insert_one({"jti": jti, "expires_at": expires_at})
+    revocation_set.add(jti=jti)
+    logger.info(f"Token revocado: {jti}")
+
+def revoke_user_tokens(email: str) -> None:
+    """Revoca todos los access tokens emitidos hasta ahora para un usuario."""
+    now = datetime.utcnow()
+    database["revoked_tokens"].insert_one({
+        "sub": email,
+        "revoked_at": now,
+        # Pasado este tiempo todos los tokens afectados ya habrán expirado
+        "expires_at": now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    })
+    revocation_set.add(sub=email, revoked_at=now.replace(tzinfo=timezone.utc).timestamp())
+    logger.info(f"Tokens revocados para el usuario: {email}")
+
+def set_user_disabled(email: str, disabled: bool = True) -> None:
+    """Habilita o deshabilita un usuario; al deshabilitarlo revoca sus tokens vigentes."""
+    result = database["users"].update_one({"email": email}, {"$set": {"disabled": disabled}})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    if disabled:
+        revoke_user_tokens(email)
+
 # Obtener usuario desde MongoDB
 def get_user(email: str) -> Optional[UserInDB]:
     """Busca un usuario en la base de datos por su email."""
@@ -116,7 +234,10 @@ async def authenticate_user(email: str, password: str) -> Optional[UserInDB]:
         if user.disabled:
             logger.warning(f"Autenticación fallida: usuario inactivo - {email}")
             raise HTTPException(status_code=403, detail="Usuario inactivo")
-        if not verify_password(password, user.hashed_password):
+        # bcrypt se ejecuta fuera del event loop y con un límite global de concurrencia
+        async with password_check_limiter.slot():
+            password_ok = await asyncio.to_thread(verify_password, password, user.hashed_password)
+        if not password_ok:
             logger.warning(f"Autenticación fallida: contraseña incorrecta - {email}")
             raise HTTPException(status_code=401, detail="Credenciales incorrectas")
         logger.info(f"Autenticación exitosa para: {email}")
@@ -129,7 +250,7 @@ async def authenticate_user(email: str, password: str) -> Optional[UserInDB]:
         raise HTTPException(status_code=500, detail="Error interno al autenticar usuario")
 
 # Dependencia para obtener el usuario actual
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     """Obtiene el usuario actual a partir de un token JWT."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -142,23 +263,48 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
     email: str = payload.get("sub")
     if not email:
         raise credentials_exception
+    # Camino rápido: el token ya trae el estado del usuario, no se consulta MongoDB
+    if JWT_STATELESS and "disabled" in payload:
+        await revocation_set.ensure_fresh()
+        if payload.get("disabled") or revocation_set.is_revoked(payload):
+            raise credentials_exception
+        return User(email=email, disabled=False, role=payload.get("role", "user"))
     user = get_user(email)
     if not user or user.disabled:
         raise credentials_exception
     return user
 
 # Dependencia para usuario activo
-async def get_current_active_user(current_user: UserInDB = Depends(get_current_user)) -> UserInDB:
+async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     """Verifica que el usuario esté activo."""
     if current_user.disabled:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Usuario inactivo")
     return current_user
 
+# Dependencia para usuarios administradores
+async def get_current_admin_user(current_user: User = Depends(get_current_active_user)) -> User:
+    """Verifica que el usuario activo tenga el rol de administrador."""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Se requiere rol de administrador")
+    return current_user
+
 # Generar tokens para login
-async def generate_tokens(email: str) -> Token:
-    """Genera un access token y un refresh token para el usuario."""
+async def generate_tokens(email: str, user: Optional[dict] = None) -> Token:
+    """Genera un access token y un refresh token para el usuario.
+
+    En modo stateless el access token incluye los claims 'disabled' y 'role',
+    tomados de `user` o, si no se proporciona, de la base de datos.
+    """
     token_data = {"sub": email}
-    access_token = create_access_token(token_data)
+    access_data = dict(token_data)
+    if JWT_STATELESS:
+        if user is None:
+            user = database["users"].find_one({"email": email}, {"disabled": 1, "role": 1}) or {}
+        access_data.update({
+            "disabled": bool(user.get("disabled", False)),
+            "role": user.get("role") or "user"
+        })
+    access_token = create_access_token(access_data)
     refresh_token = create_refresh_token(token_data)
     return Token(
         access_token=access_token,
@@ -0,0 +1,77 @@
+"""
+Benchmark de los motores de frecuencia de palabras sobre colecciones
+(services/cloudwords_service.py: 'python', 'aggregate' e 'index').
+
+Crea colecciones temporales con textos sintéticos de distintos tamaños en la base de
+datos configurada (MONGODB_URI), mide cada motor y borra las colecciones al terminar.
+El motor 'index' se mide dos veces: construyendo el índice y consultándolo ya hecho.
+
+Uso (desde la raíz del repositorio, con MongoDB accesible):
+    python benchmarks/bench_collection_frequency.py [tamaños separados por comas]
+"""
+import sys
+import time
+import random
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db.database import database
+from services.cloudwords_service import python_top_terms, aggregate_top_terms
+from services.term_index_service import build_term_index, top_terms, drop_term_indexes
+
+VOCABULARY = [
+    "producto", "precio", "entrega", "calidad", "cliente", "servicio", "garantía", "envío",
+    "tienda", "oferta", "descuento", "pedido", "factura", "devolución", "soporte", "marca",
+    "modelo", "color", "tamaño", "material", "diseño", "batería", "pantalla", "cámara",
+] + [f"termino{i}" for i in range(2000)]
+STOPWORDS = ["el", "la", "de", "que", "y", "en", "los", "con", "para", "por"]
+
+def synthetic_text(rng, words=60):
+    # Distribución aproximadamente Zipf: pocos términos muy frecuentes y una cola larga
+    tokens = []
+    for _ in range(words):
+        if rng.random() < 0.3:
+            tokens.append(rng.choice(STOPWORDS))
+        else:
+            tokens.append(VOCABULARY[min(int(rng.paretovariate(1.1)) - 1, len(VOCABULARY) - 1)])
+    return " ".join(tokens).capitalize() + "."
+
+def populate(coleccion, size, rng):
+    collection = database[coleccion]
+    collection.drop()
+    batch = []
+    for i in range(size):
+        batch.append({"name": f"doc{i}", "description": synthetic_text(rng)})
+        if len(batch) >= 1000:
+            collection.insert_many(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch)
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+def main():
+    sizes = [int(n) for n in sys.argv[1].split(",")] if len(sys.argv) > 1 else [1000, 10000, 100000]
+    rng = random.Random(42)
+    print(f"{'documentos':>10} {'python':>10} {'aggregate':>10} {'index (build)':>14} {'index':>10}  top-20 igual")
+    for size in sizes:
+        coleccion = f"bench_frequency_{size}"
+        populate(coleccion, size, rng)
+        try:
+            python_time, python_result = timed(lambda: python_top_terms(coleccion, top_n=20, min_length=2))
+            aggregate_time, aggregate_result = timed(lambda: aggregate_top_terms(coleccion, top_n=20, min_length=2))
+            build_time, _ = timed(lambda: build_term_index(coleccion))
+            index_time, index_result = timed(lambda: top_terms(coleccion, top_n=20, min_length=2))
+            same = dict(python_result) == dict(aggregate_result) == dict(index_result)
+            print(f"{size:>10} {python_time:>9.3f}s {aggregate_time:>9.3f}s {build_time:>13.3f}s "
+                  f"{index_time:>9.4f}s  {'sí' if same else 'no'}")
+        finally:
+            drop_term_indexes(coleccion)
+            database[coleccion].drop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Tiempo de importación de la API (arranque en frío).
+
+Ejecuta `python -X importtime -c "import main"` en un proceso nuevo y resume la salida:
+el tiempo total (el mejor de varias ejecuciones) y los módulos con mayor tiempo acumulado.
+Para comparar con otro commit, sacarlo en otro directorio (`git worktree add`) y pasarlo
+con --root; la caché de bytecode debe estar ya generada en ambos.
+
+db.database se conecta a MongoDB al importarse; con --mock-db se sustituye pymongo.MongoClient
+por el de mongomock antes de importar (pymongo y mongomock quedan fuera del tiempo medido).
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_import_time.py [módulo] [top_n] [--runs N] [--mock-db] [--root DIR]
+"""
+import os
+import sys
+import argparse
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MOCK_DB_PRELUDE = "import mongomock, pymongo; pymongo.MongoClient = mongomock.MongoClient; "
+
+def import_times(module: str, root: Path = ROOT, mock_db: bool = False):
+    """Devuelve [(acumulado_us, propio_us, módulo)] de la importación de `module`."""
+    env = dict(os.environ)
+    prelude = ""
+    if mock_db:
+        prelude = MOCK_DB_PRELUDE
+        env.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"{prelude}import {module}"],
+                            cwd=root, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stderr.splitlines()[-1] if result.stderr else "Error al importar", file=sys.stderr)
+        sys.exit(1)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    return rows
+
+def total_time(rows, module: str) -> int:
+    return next((row[0] for row in rows if row[2] == module), sum(row[1] for row in rows))
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de importación en frío de un módulo")
+    parser.add_argument("module", nargs="?", default="main")
+    parser.add_argument("top_n", nargs="?", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=5, help="Ejecuciones; se muestra la más rápida")
+    parser.add_argument("--mock-db", action="store_true", help="Importar sin MongoDB (mongomock)")
+    parser.add_argument("--root", type=Path, default=ROOT, help="Directorio del repositorio a medir")
+    args = parser.parse_args()
+    module = args.module
+    rows = min((import_times(module, args.root, args.mock_db) for _ in range(max(args.runs, 1))),
+               key=lambda rows: total_time(rows, module))
+    total = total_time(rows, module)
+    print(f"import {module}: {total / 1000:.1f} ms ({len(rows)} módulos, mejor de {args.runs})")
+    print(f"{'acumulado':>12} {'propio':>10}  módulo")
+    for cumulative, own, name in sorted(rows, reverse=True)[:args.top_n]:
+        print(f"{cumulative / 1000:>10.1f}ms {own / 1000:>8.1f}ms  {name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark de la caché de lemas (services/lemmatization_service.py).
+
+Lematiza un corpus realista token a token sin caché (la función original, vía
+`__wrapped__`) y con la caché acotada, e informa del tiempo y la tasa de acierto.
+En inglés usa el texto de Emma (Jane Austen) de `nltk.corpus.gutenberg` si está
+descargado; en español, o si falta el corpus, un texto sintético con distribución
+Zipf de palabras, que es la forma habitual de las frecuencias en lenguaje natural.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_lemma_cache.py [tokens]
+"""
+import sys
+import time
+import random
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.text_processing import regex_tokenize
+from services.lemmatization_service import (
+    lemmatize_english_token,
+    lemmatize_spanish_token,
+    get_lemma_cache_stats
+)
+
+SPANISH_WORDS = (
+    "casa casas perro perritos gatita cantando comiendo hablar comer vivir trabajaba cansada "
+    "productos precios clientes tiendas ciudades camino caminando ventana ventanas libro libros "
+    "mujeres hombres niños niñas trabajando estudiar estudiaba llegada salida entregas pedidos"
+).split()
+
+ENGLISH_WORDS = (
+    "dogs running cars houses leaves children mice geese wolves feet teeth women men cities "
+    "products prices customers stores walked walking studies studying better best boxes wives "
+    "knives lives parties stories ladies churches buses heroes potatoes analyses criteria"
+).split()
+
+def english_corpus(size):
+    try:
+        from nltk.corpus import gutenberg
+        tokens = regex_tokenize(gutenberg.raw("austen-emma.txt"))
+    except LookupError:
+        return None
+    return (tokens * (size // len(tokens) + 1))[:size]
+
+def zipf_corpus(words, size, seed=42):
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    return rng.choices(words, weights=weights, k=size)
+
+def bench(name, func, tokens):
+    func.cache_clear()
+    start = time.perf_counter()
+    for token in tokens:
+        func.__wrapped__(token)
+    uncached = time.perf_counter() - start
+    start = time.perf_counter()
+    for token in tokens:
+        func(token)
+    cached = time.perf_counter() - start
+    stats = get_lemma_cache_stats()[name]
+    print(f"{name:<8} {len(tokens):>9} tokens  sin caché {uncached:8.3f}s  con caché {cached:8.3f}s  "
+          f"x{uncached / cached:6.1f}  acierto {stats['hit_rate']:.1%} ({stats['size']} lemas distintos)")
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    # Cargar WordNet fuera de la medición
+    lemmatize_english_token.__wrapped__("warmup")
+    english = english_corpus(size)
+    if english is None:
+        english = zipf_corpus(ENGLISH_WORDS, size)
+    bench("english", lemmatize_english_token, english)
+    bench("spanish", lemmatize_spanish_token, zipf_corpus(SPANISH_WORDS, size))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Prueba del cliente HTTP de OAuth (services/oauth_service.py) contra un proveedor local.
+
+Levanta en un hilo un servidor HTTP/1.1 con keep-alive que imita los endpoints de token
+y userinfo de un proveedor, apunta a él la configuración de 'google' y comprueba:
+
+- Reutilización de conexiones: muchas llamadas a userinfo usan una sola conexión TCP
+  (se cuentan los puertos de origen distintos que ve el servidor) y se compara el
+  tiempo con abrir un cliente nuevo en cada llamada.
+- Reintentos con backoff: un 503 transitorio en userinfo (GET, idempotente) se
+  reintenta hasta obtener respuesta, y un error de conexión también se reintenta
+  incluso en el canje del código.
+- Camino de fallo: el canje del código (POST de un solo uso) no se reintenta ante un
+  503, y un userinfo que siempre falla termina en OAuthServiceError tras
+  OAUTH_HTTP_RETRIES reintentos.
+
+El servicio importa db.database, así que MONGODB_URI debe apuntar a un MongoDB
+accesible (p. ej. uno local); los estados OAuth se guardan en memoria. Las mismas
+comprobaciones, sin red ni base de datos, están en tests/test_oauth_client.py.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_oauth_client.py [llamadas]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Backoff corto para que la prueba sea rápida; el resto de la configuración es la real
+os.environ.setdefault("OAUTH_HTTP_BACKOFF", "0.01")
+os.environ["OAUTH_STATE_BACKEND"] = "memory"
+
+import httpx
+from services import oauth_service
+from services.oauth_service import OAuthService, OAuthServiceError, OAUTH_HTTP_RETRIES, close_http_client
+
+USER = {"id": "42", "email": "stub@example.com", "name": "Usuario Stub", "picture": ""}
+
+class StubProvider(BaseHTTPRequestHandler):
+    """Proveedor falso; el comportamiento de cada ruta se elige por el path."""
+    protocol_version = "HTTP/1.1"
+    # Cabeceras y cuerpo van en escrituras separadas: sin esto Nagle y el ACK diferido
+    # añaden ~40 ms a cada respuesta sobre una conexión reutilizada
+    disable_nagle_algorithm = True
+    hits = {}
+    ports = set()
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        path = urlparse(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        with self.lock:
+            self.ports.add(self.client_address[1])
+            count = self.hits[path] = self.hits.get(path, 0) + 1
+        if path == "/token":
+            self._reply(200, {"access_token": "stub-token", "token_type": "Bearer"})
+        elif path == "/token-503":
+            self._reply(503, {"error": "unavailable"})
+        elif path == "/userinfo":
+            self._reply(200, USER)
+        elif path == "/userinfo-flaky":
+            # Falla las dos primeras veces y luego responde
+            self._reply(503 if count <= 2 else 200, USER)
+        elif path == "/userinfo-down":
+            self._reply(503, {"error": "unavailable"})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    do_GET = _handle
+    do_POST = _handle
+
+    @classmethod
+    def reset(cls):
+        with cls.lock:
+            cls.hits.clear()
+            cls.ports.clear()
+
+class RetryCounter(logging.Handler):
+    """Cuenta los avisos de reintento que registra el servicio."""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.retries = 0
+
+    def emit(self, record):
+        if record.getMessage().startswith("Reintentando"):
+            self.retries += 1
+
+def closed_port() -> int:
+    """Un puerto local en el que no escucha nadie (para provocar errores de conexión)."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def check(condition, message):
+    print(f"  [{'OK' if condition else 'FALLO'}] {message}")
+    if not condition:
+        check.failures += 1
+check.failures = 0
+
+async def exchange(service, base_url, token_path):
+    service.providers["google"]["token_url"] = f"{base_url}{token_path}"
+    state = parse_qs(urlparse(service.get_authorization_url("google")).query)["state"][0]
+    return await service.exchange_code_for_token("google", "stub-code", state)
+
+async def run(calls: int):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubProvider)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    retry_counter = RetryCounter()
+    oauth_service.logger.addHandler(retry_counter)
+
+    service = OAuthService()
+    config = service.providers["google"]
+    try:
+        print("Reutilización de conexiones")
+        config["user_info_url"] = f"{base_url}/userinfo"
+        await service.get_user_info("google", "stub-token")  # abrir la conexión
+        StubProvider.reset()
+        start = time.perf_counter()
+        for _ in range(calls):
+            await service.get_user_info("google", "stub-token")
+        shared = time.perf_counter() - start
+        check(len(StubProvider.ports) == 1, f"{calls} llamadas por {len(StubProvider.ports)} conexión(es)")
+        start = time.perf_counter()
+        for _ in range(calls):
+            async with httpx.AsyncClient() as client:
+                (await client.get(config["user_info_url"])).raise_for_status()
+        fresh = time.perf_counter() - start
+        print(f"  cliente compartido: {shared / calls * 1000:.2f} ms/llamada, "
+              f"cliente nuevo: {fresh / calls * 1000:.2f} ms/llamada")
+
+        print("Reintentos con backoff")
+        StubProvider.reset()
+        retry_counter.retries = 0
+        config["user_info_url"] = f"{base_url}/userinfo-flaky"
+        if OAUTH_HTTP_RETRIES >= 2:
+            user = await service.get_user_info("google", "stub-token")
+            check(user["email"] == USER["email"], "userinfo responde tras dos 503")
+            check(StubProvider.hits.get("/userinfo-flaky") == 3, "userinfo pedido 3 veces")
+        else:
+            print("  (omitido: requiere OAUTH_HTTP_RETRIES >= 2)")
+
+        retry_counter.retries = 0
+        try:
+            await exchange(service, f"http://127.0.0.1:{closed_port()}", "/token")
+            check(False, "el canje contra un puerto cerrado debía fallar")
+        except OAuthServiceError:
+            check(retry_counter.retries == OAUTH_HTTP_RETRIES,
+                  f"error de conexión reintentado {retry_counter.retries} veces (esperado {OAUTH_HTTP_RETRIES})")
+
+        token = await exchange(service, base_url, "/token")
+        check(token["access_token"] == "stub-token", "canje del código correcto")
+
+        print("Camino de fallo")
+        StubProvider.reset()
+        retry_counter.retries = 0
+        try:
+            await exchange(service, base_url, "/token-503")
+            check(False, "el canje con 503 debía fallar")
+        except OAuthServiceError:
+            check(StubProvider.hits.get("/token-503") == 1, "el canje (POST) no se reintenta ante un 503")
+
+        config["user_info_url"] = f"{base_url}/userinfo-down"
+        try:
+            await service.get_user_info("google", "stub-token")
+            check(False, "userinfo caído debía fallar")
+        except OAuthServiceError:
+            check(StubProvider.hits.get("/userinfo-down") == OAUTH_HTTP_RETRIES + 1,
+                  f"userinfo caído pedido {StubProvider.hits.get('/userinfo-down')} veces antes de fallar")
+    finally:
+        oauth_service.logger.removeHandler(retry_counter)
+        await close_http_client()
+        server.shutdown()
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    asyncio.run(run(calls))
+    if check.failures:
+        print(f"{check.failures} comprobación(es) fallida(s)")
+        sys.exit(1)
+    print("Todas las comprobaciones pasaron")
+
+if __name__ == "__main__":
+    main()
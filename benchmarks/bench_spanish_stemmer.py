@@ -0,0 +1,72 @@
+"""
+Benchmark del lematizador de sufijos en español (services/spanish_stemmer.py).
+
+Compara el tiempo de la cadena de `endswith` original (copiada abajo como referencia)
+con las tablas de búsqueda token a token, sin y con la memoria de resultados, y con el
+modo por lotes (`stem_array`, que procesa cada token distinto una sola vez), sobre tokens
+con una distribución de Zipf y sobre tokens aleatorios casi sin repeticiones. Los casos
+de referencia y la equivalencia con la cadena original están en
+tests/test_spanish_stemmer.py.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_spanish_stemmer.py [tokens]
+"""
+import sys
+import time
+import random
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.spanish_stemmer import SuffixStemmer, SPANISH_SUFFIX_RULES
+
+def legacy_stem(token):
+    # Cadena original de lemmatize_text para español
+    if token.endswith('es') and len(token) > 3:
+        token = token[:-2]
+    elif token.endswith('s') and len(token) > 3:
+        token = token[:-1]
+    if token.endswith('ito') or token.endswith('ita'):
+        token = token[:-3]
+    if len(token) > 4:
+        if token.endswith('ando') or token.endswith('endo'):
+            token = token[:-4]
+        elif token.endswith('ar') or token.endswith('er') or token.endswith('ir'):
+            token = token[:-2]
+        elif token.endswith('aba') or token.endswith('ada'):
+            token = token[:-3]
+    return token
+
+def random_tokens(size, seed=42):
+    rng = random.Random(seed)
+    letters = "aeiousrndtbclmñá"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(1, 10))) for _ in range(size)]
+
+def zipf_tokens(size, seed=42):
+    rng = random.Random(seed)
+    vocabulary = random_tokens(5000, seed)
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    return rng.choices(vocabulary, weights=weights, k=size)
+
+def timed(func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    for name, tokens in (("Zipf", zipf_tokens(size)), ("aleatorios", random_tokens(size))):
+        lookup = SuffixStemmer(SPANISH_SUFFIX_RULES, cache_size=0)
+        cached = SuffixStemmer(SPANISH_SUFFIX_RULES)
+        legacy = timed(lambda: [legacy_stem(token) for token in tokens])
+        table = timed(lambda: [lookup.stem(token) for token in tokens])
+        memo = timed(lambda: [cached.stem(token) for token in tokens])
+        batch = timed(lambda: lookup.stem_array(tokens))
+        print(f"{size} tokens ({name}): cadena endswith {legacy:.3f}s  tablas {table:.3f}s  "
+              f"tablas con memoria {memo:.3f}s  lotes (numpy) {batch:.3f}s")
+
+if __name__ == "__main__":
+    main()
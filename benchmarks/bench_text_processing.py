@@ -0,0 +1,58 @@
+"""
+Microbenchmark del pipeline de texto compartido (services/text_processing.py).
+
+Compara, por llamada, el coste de preparar los recursos como se hacía antes
+(`set(stopwords.words(...))` y `WordNetLemmatizer()` en cada petición) con el de
+reutilizar las stopwords congeladas y el lematizador compartido.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_text_processing.py [repeticiones]
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from nltk.corpus import stopwords
+from nltk.stem import WordNetLemmatizer
+from services.text_processing import get_stopwords, get_lemmatizer, filter_stopwords, regex_tokenize
+
+TEXT = (
+    "Las nubes de palabras muestran los términos más frecuentes de un texto. "
+    "The quick brown fox jumps over the lazy dog while the dogs were running. "
+) * 5
+
+def per_call_setup(language):
+    stop_words = set(stopwords.words(language))
+    lemmatizer = WordNetLemmatizer()
+    return stop_words, lemmatizer
+
+def shared_setup(language):
+    return get_stopwords(language), get_lemmatizer()
+
+def per_call_pipeline(language):
+    stop_words, _ = per_call_setup(language)
+    return [word for word in TEXT.lower().split() if word not in stop_words]
+
+def shared_pipeline(language):
+    return filter_stopwords(regex_tokenize(TEXT), language)
+
+def report(name, func, language, number):
+    seconds = timeit.timeit(lambda: func(language), number=number)
+    print(f"{name:<28} {language:<8} {seconds / number * 1e6:10.1f} µs/llamada")
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    # Calentar: carga de corpus y primer acceso a WordNet fuera de la medición
+    for language in ("spanish", "english"):
+        per_call_setup(language)
+        shared_setup(language)
+    for language in ("spanish", "english"):
+        report("preparación por llamada", per_call_setup, language, number)
+        report("preparación compartida", shared_setup, language, number)
+        report("pipeline por llamada", per_call_pipeline, language, number)
+        report("pipeline compartido", shared_pipeline, language, number)
+
+if __name__ == "__main__":
+    main()
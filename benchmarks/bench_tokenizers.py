@@ -0,0 +1,70 @@
+"""
+Benchmark y comparación de precisión de los tokenizadores (services/text_processing.py).
+
+Mide el tiempo por texto de `regex_tokenize` y de `nltk_tokenize` (Punkt + Treebank)
+y compara sus tokens tomando `word_tokenize` como referencia. Como el tokenizador
+regex descarta la puntuación, de la referencia solo se cuentan los tokens con al menos
+una letra o dígito. Se informa precisión, exhaustividad y F1 sobre los multiconjuntos de
+tokens, y las diferencias más frecuentes (p. ej. contracciones inglesas).
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_tokenizers.py [repeticiones]
+"""
+import re
+import sys
+import timeit
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.text_processing import regex_tokenize, nltk_tokenize
+
+TEXTS = {
+    "spanish": [
+        "El señor Núñez compró 3 paquetes de café en la tienda de la esquina, ¿no?",
+        "¡Qué día! Llovió toda la mañana y la niña llegó empapada a la escuela.",
+        "La pingüinera está a 20 km de Ushuaia; el viaje dura dos horas y media.",
+        "Los años 90 fueron buenos para la economía, según el informe anual del BID.",
+        "Envío gratis en pedidos superiores a $50.000 — válido hasta el 31/12.",
+        "El producto llegó roto. Pedí la devolución por correo: soporte@tienda.com",
+    ],
+    "english": [
+        "The dogs weren't running; they'd been sleeping all afternoon.",
+        "Dr. Smith's well-known e-mail policy isn't popular with the staff.",
+        "Prices rose 3.5% in Q4, according to the company's annual report.",
+        "I can't believe it's already 2024! Let's meet at 5 p.m. tomorrow.",
+        "State-of-the-art cameras, long battery life and a bright display.",
+        "\"Great value,\" said one customer. \"Would buy again.\"",
+    ],
+}
+WORD = re.compile(r"\w")
+
+def reference_tokens(text):
+    return [token for token in nltk_tokenize(text) if WORD.search(token)]
+
+def compare(texts):
+    candidate, reference = Counter(), Counter()
+    for text in texts:
+        candidate.update(regex_tokenize(text))
+        reference.update(reference_tokens(text))
+    common = sum((candidate & reference).values())
+    precision = common / max(1, sum(candidate.values()))
+    recall = common / max(1, sum(reference.values()))
+    f1 = 2 * precision * recall / max(1e-12, precision + recall)
+    return precision, recall, f1, (candidate - reference), (reference - candidate)
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    nltk_tokenize("warm up")  # Carga de Punkt fuera de la medición
+    for language, texts in TEXTS.items():
+        for name, func in (("regex", regex_tokenize), ("nltk", nltk_tokenize)):
+            seconds = timeit.timeit(lambda: [func(text) for text in texts], number=number)
+            print(f"{language:<8} {name:<6} {seconds / (number * len(texts)) * 1e6:8.1f} µs/texto")
+        precision, recall, f1, extra, missing = compare(texts)
+        print(f"{language:<8} precisión {precision:.3f}  exhaustividad {recall:.3f}  F1 {f1:.3f}")
+        print(f"{'':<8} solo regex: {extra.most_common(8)}")
+        print(f"{'':<8} solo nltk:  {missing.most_common(8)}")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import logging
 from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ConfigurationError
+from pymongo.errors import ConnectionFailure, ConfigurationError, OperationFailure
 import os
 import time
 
@@ -60,7 +60,7 @@ except Exception as e:
 # Asegurarse de que las colecciones necesarias existan
 try:
     collections = database.list_collection_names()
-    required_collections = ['users', 'productos', 'proveedores', 'news', 'rpa_sync_tasks']  # Añadida 'rpa_sync_tasks'
+    required_collections = ['users', 'productos', 'proveedores', 'news', 'rpa_sync_tasks', 'revoked_tokens']
     for coll in required_collections:
         if coll not in collections:
             database.create_collection(coll)
@@ -69,4 +69,32 @@ try:
             logger.info(f"Colección '{coll}' ya existe")
 except Exception as e:
     logger.error(f"Error al verificar/crear las colecciones: {str(e)}")
-    raise Exception(f"Error al verificar/crear las colecciones: {str(e)}")
\ No newline at end of file
+    raise Exception(f"Error al verificar/crear las colecciones: {str(e)}")
+
+# Índices requeridos
+# Si no se puede crear el índice único de 'users.email' (p. ej. porque ya hay emails
+# duplicados) el registro vuelve a comprobar la existencia del email antes de insertar
+USERS_EMAIL_UNIQUE_INDEX = False
+try:
+    # Las revocaciones se eliminan solas cuando los tokens afectados ya han expirado
+    database["revoked_tokens"].create_index("expires_at", expireAfterSeconds=0)
+    logger.info("Índice TTL de 'revoked_tokens' verificado")
+    # Índice de frecuencias de términos: un documento por término y consulta por conteo
+    database["term_index"].create_index([("index", 1), ("term", 1)], unique=True)
+    database["term_index"].create_index([("index", 1), ("count", -1)])
+    # Caché de lematización por documento: caduca sola y se borra por colección
+    database["lemma_cache"].create_index("updated_at", expireAfterSeconds=30 * 24 * 3600)
+    database["lemma_cache"].create_index("coleccion")
+    # Trabajos en segundo plano: se conservan una semana
+    database["jobs"].create_index("created_at", expireAfterSeconds=7 * 24 * 3600)
+    try:
+        # El registro confía en este índice para rechazar emails duplicados en un solo insert
+        database["users"].create_index("email", unique=True)
+        USERS_EMAIL_UNIQUE_INDEX = True
+        logger.info("Índice único de 'users.email' verificado")
+    except OperationFailure as e:
+        logger.error(f"No se pudo crear el índice único de 'users.email' (¿emails duplicados?): {str(e)}. "
+                     "Se comprobarán los emails antes de cada registro")
+except Exception as e:
+    logger.error(f"Error al crear los índices: {str(e)}")
+    raise Exception(f"Error al crear los índices: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from jose import JWTError, jwk, jwt
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Configuración de firma. HS256 usa SECRET_KEY; RS*/ES* usan las claves PEM de JWT_KEYS_DIR
+SECRET_KEY = os.environ.get("SECRET_KEY", "tu-clave-segura-aqui")  # Idealmente usar variables de entorno
+ALGORITHM = os.environ.get("JWT_ALGORITHM", "HS256")
+JWT_KEYS_DIR = os.environ.get("JWT_KEYS_DIR", "keys")
+JWT_ACTIVE_KID = os.environ.get("JWT_ACTIVE_KID")
+JWKS_MAX_AGE = int(os.environ.get("JWKS_MAX_AGE", "300"))
+
+ASYMMETRIC_ALGORITHMS = ("RS256", "RS384", "RS512", "ES256", "ES384", "ES512")
+
+class KeyRingError(Exception):
+    """Excepción personalizada para errores de configuración de claves JWT."""
+    pass
+
+def is_asymmetric() -> bool:
+    return ALGORITHM in ASYMMETRIC_ALGORITHMS
+
+class KeyRing:
+    """Claves de firma cargadas desde un directorio con un fichero `<kid>.pem` por clave.
+
+    La clave activa (JWT_ACTIVE_KID o la más reciente) firma los tokens nuevos; las demás
+    se conservan solo para verificar tokens emitidos antes de la rotación. Las claves ya
+    parseadas y el documento JWKS se mantienen en memoria.
+    """
+
+    def __init__(self, algorithm: str, keys_dir: str, active_kid: Optional[str] = None):
+        self.algorithm = algorithm
+        self.keys_dir = Path(keys_dir)
+        self.active_kid = active_kid
+        self._private: Dict[str, jwk.Key] = {}
+        self._public: Dict[str, jwk.Key] = {}
+        self._jwks: dict = {"keys": []}
+        self._jwks_etag = ""
+        self._signing_kid: Optional[str] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """Lee y parsea todas las claves del directorio."""
+        files = sorted(self.keys_dir.glob("*.pem"), key=lambda f: f.stat().st_mtime)
+        if not files:
+            raise KeyRingError(f"No hay claves .pem en {self.keys_dir}")
+        private, public, entries = {}, {}, []
+        for key_file in files:
+            kid = key_file.stem
+            key = jwk.construct(key_file.read_text(), self.algorithm)
+            private[kid] = key
+            public[kid] = key.public_key()
+            entries.append({**public[kid].to_dict(), "kid": kid, "use": "sig", "alg": self.algorithm})
+        signing_kid = self.active_kid or files[-1].stem
+        if signing_kid not in private:
+            raise KeyRingError(f"La clave activa '{signing_kid}' no existe en {self.keys_dir}")
+        jwks = {"keys": entries}
+        with self._lock:
+            self._private, self._public, self._jwks = private, public, jwks
+            self._jwks_etag = hashlib.sha256(json.dumps(jwks, sort_keys=True).encode()).hexdigest()[:32]
+            self._signing_kid = signing_kid
+            self._loaded_at = time.monotonic()
+        logger.info(f"Claves JWT cargadas: {list(private)}; clave activa: {signing_kid}")
+
+    def _ensure_loaded(self) -> None:
+        if self._signing_kid is None:
+            self.load()
+
+    def signing_key(self) -> Tuple[str, jwk.Key]:
+        self._ensure_loaded()
+        return self._signing_kid, self._private[self._signing_kid]
+
+    def verification_key(self, kid: Optional[str]) -> jwk.Key:
+        self._ensure_loaded()
+        key = self._public.get(kid)
+        # Un kid desconocido puede venir de una rotación hecha por otro proceso: recargar una vez
+        if key is None and time.monotonic() - self._loaded_at > 1:
+            self.load()
+            key = self._public.get(kid)
+        if key is None:
+            raise JWTError(f"Clave de firma desconocida: {kid}")
+        return key
+
+    def jwks(self) -> Tuple[dict, str]:
+        """Devuelve el documento JWKS público y su ETag."""
+        self._ensure_loaded()
+        return self._jwks, self._jwks_etag
+
+keyring = KeyRing(ALGORITHM, JWT_KEYS_DIR, JWT_ACTIVE_KID)
+
+def encode_jwt(claims: dict) -> str:
+    """Firma los claims con la clave configurada (secreto compartido o clave activa)."""
+    if not is_asymmetric():
+        return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+    kid, key = keyring.signing_key()
+    return jwt.encode(claims, key, algorithm=ALGORITHM, headers={"kid": kid})
+
+def decode_jwt(token: str) -> dict:
+    """Verifica la firma y la expiración de un token. Lanza JWTError si no es válido."""
+    if not is_asymmetric():
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    kid = jwt.get_unverified_header(token).get("kid")
+    return jwt.decode(token, keyring.verification_key(kid), algorithms=[ALGORITHM])
+
+def get_jwks() -> Tuple[dict, str]:
+    """JWKS publicado para que otros servicios verifiquen tokens localmente."""
+    if not is_asymmetric():
+        return {"keys": []}, "empty"
+    return keyring.jwks()
+
+def rotate_signing_key(kid: Optional[str] = None) -> str:
+    """Genera una clave nueva en JWT_KEYS_DIR; pasa a ser la activa si no se fija JWT_ACTIVE_KID.
+
+    Las claves anteriores siguen publicadas en el JWKS hasta que se borren sus ficheros,
+    lo que debe hacerse cuando hayan expirado los refresh tokens firmados con ellas.
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+    if not is_asymmetric():
+        raise KeyRingError(f"El algoritmo {ALGORITHM} no usa claves asimétricas")
+    kid = kid or time.strftime("%Y%m%d%H%M%S")
+    if ALGORITHM.startswith("RS"):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        curve = {"ES256": ec.SECP256R1(), "ES384": ec.SECP384R1(), "ES512": ec.SECP521R1()}[ALGORITHM]
+        private_key = ec.generate_private_key(curve)
+    pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+    keys_dir = Path(JWT_KEYS_DIR)
+    keys_dir.mkdir(parents=True, exist_ok=True)
+    key_file = keys_dir / f"{kid}.pem"
+    key_file.write_bytes(pem)
+    os.chmod(key_file, 0o600)
+    keyring.load()
+    logger.info(f"Nueva clave de firma generada: {kid}")
+    return kid
+
+if __name__ == "__main__":
+    # Uso: JWT_ALGORITHM=RS256 python jwt_keys.py rotate [kid]
+    if len(sys.argv) >= 2 and sys.argv[1] == "rotate":
+        print(rotate_signing_key(sys.argv[2] if len(sys.argv) > 2 else None))
+    else:
+        print("Uso: python jwt_keys.py rotate [kid]")
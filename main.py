@@ -1,8 +1,8 @@
 from fastapi import FastAPI, HTTPException, status, Depends, Request
-from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr, validator
-from db.database import database
+from db.database import database, USERS_EMAIL_UNIQUE_INDEX
 from routes.producto_routes import router as producto_router
 from routes.entidad_routes import router as entidad_router
 from routes.scraping_routes import router as scraping_router
@@ -10,8 +10,21 @@ from routes.cloudwords_routes import router as cloudwords_router
 from routes.lemmatization_routes import router as lemmatization_router
 from routes.rpa_routes import router as rpa_router
 from routes.oauth_routes import router as oauth_router  # Nueva importación
-from auth import UserInDB, authenticate_user, generate_tokens, get_current_active_user, OAuth2PasswordRequestForm, get_password_hash, Token, RefreshTokenRequest, decode_token
+from routes.job_routes import router as job_router
+from services.oauth_service import close_http_client
+from services.cloudwords_service import shutdown_render_pool
+from services.lemmatization_service import warm_up_lemmatization_pool, shutdown_lemmatization_pool
+from services.job_service import submit_job, shutdown_job_executor
+from services.text_processing import warm_up_text_processing
+from auth import User, authenticate_user, generate_tokens, get_current_active_user, get_current_admin_user, OAuth2PasswordRequestForm, get_password_hash, Token, RefreshTokenRequest, decode_token, set_user_disabled
+from jwt_keys import get_jwks, JWKS_MAX_AGE
+from rate_limit import login_ip_limiter, login_email_limiter, register_ip_limiter, password_check_limiter, client_ip
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from typing import List
 from datetime import timedelta
+from contextlib import asynccontextmanager
+import os
+import asyncio
 from pathlib import Path
 import logging
 import traceback
@@ -19,9 +32,32 @@ import traceback
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MAX_BULK_USERS = 1000
+# Lotes hasta este tamaño se registran en la petición (cada hash bcrypt tarda ~0.25 s);
+# los mayores se procesan como trabajo en segundo plano por tramos de BULK_USERS_CHUNK
+BULK_SYNC_MAX_USERS = int(os.environ.get("BULK_SYNC_MAX_USERS", "20"))
+BULK_USERS_CHUNK = int(os.environ.get("BULK_USERS_CHUNK", "100"))
+LEMMATIZATION_PREWARM = os.environ.get("LEMMATIZATION_PREWARM", "false").lower() in ("1", "true", "yes")
+# Cargar stopwords, Punkt y WordNet al arrancar en lugar de en la primera petición que los use
+API_WARMUP = os.environ.get("API_WARMUP", "false").lower() in ("1", "true", "yes")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if API_WARMUP:
+        await asyncio.to_thread(warm_up_text_processing)
+    if LEMMATIZATION_PREWARM:
+        await warm_up_lemmatization_pool()
+    yield
+    # Liberar recursos compartidos al apagar
+    await close_http_client()
+    shutdown_render_pool()
+    shutdown_lemmatization_pool()
+    shutdown_job_executor()
+
 app = FastAPI(title="API de Gestión MongoDB Atlas", 
               description="API para gestionar productos y entidades en MongoDB Atlas con OAuth",
-              version="1.0.1")
+              version="1.0.1",
+              lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -53,6 +89,7 @@ app.include_router(cloudwords_router)
 app.include_router(lemmatization_router)
 app.include_router(rpa_router)
 app.include_router(oauth_router)  # Nueva ruta OAuth
+app.include_router(job_router)
 
 # Modelo para los datos de registro con validación
 class RegisterRequest(BaseModel):
@@ -65,31 +102,55 @@ class RegisterRequest(BaseModel):
             raise ValueError('La contraseña debe tener al menos 6 caracteres')
         return v
 
+class BulkRegisterRequest(BaseModel):
+    users: List[RegisterRequest]
+    
+    @validator('users')
+    def users_max_length(cls, v):
+        if not v:
+            raise ValueError('Se requiere al menos un usuario')
+        if len(v) > MAX_BULK_USERS:
+            raise ValueError(f'Máximo {MAX_BULK_USERS} usuarios por solicitud')
+        return v
+
+def _new_user_document(email: str, hashed_password: str) -> dict:
+    """Documento de usuario para altas con email y contraseña."""
+    return {
+        "email": email, 
+        "hashed_password": hashed_password, 
+        "disabled": False,
+        "created_via": "email_password",
+        "name": email.split('@')[0],  # Usar parte del email como nombre
+        "picture": ""
+    }
+
 # Endpoint de registro mejorado
 @app.post("/register", status_code=201)
-async def register_user(request: RegisterRequest):
+async def register_user(request: RegisterRequest, http_request: Request):
     email = request.email
     password = request.password
     
     logger.info(f"Intento de registro con email: {email}")
     
     try:
-        # Verificar si el usuario ya existe
-        if database["users"].find_one({"email": email}):
+        register_ip_limiter.check(client_ip(http_request))
+        
+        # Sin el índice único no hay DuplicateKeyError: comprobar antes de insertar
+        if not USERS_EMAIL_UNIQUE_INDEX and database["users"].find_one({"email": email}, {"_id": 1}):
             logger.warning(f"El email {email} ya está registrado")
             raise HTTPException(status_code=400, detail="El email ya está registrado")
         
         # Crear hash de la contraseña y registro
-        hashed_password = get_password_hash(password)
-        user = {
-            "email": email, 
-            "hashed_password": hashed_password, 
-            "disabled": False,
-            "created_via": "email_password",
-            "name": email.split('@')[0],  # Usar parte del email como nombre
-            "picture": ""
-        }
-        result = database["users"].insert_one(user)
+        async with password_check_limiter.slot():
+            hashed_password = await asyncio.to_thread(get_password_hash, password)
+        user = _new_user_document(email, hashed_password)
+        
+        # El índice único de 'users.email' detecta duplicados en el mismo insert
+        try:
+            result = database["users"].insert_one(user)
+        except DuplicateKeyError:
+            logger.warning(f"El email {email} ya está registrado")
+            raise HTTPException(status_code=400, detail="El email ya está registrado")
         
         logger.info(f"Usuario registrado con ID: {result.inserted_id}")
         return {"mensaje": "Usuario registrado exitosamente"}
@@ -101,11 +162,89 @@ async def register_user(request: RegisterRequest):
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail="Error interno al registrar usuario")
 
+def _insert_user_documents(documents: list):
+    """Inserta usuarios nuevos; devuelve (insertados, emails duplicados, errores)."""
+    duplicados = []
+    errores = []
+    if not USERS_EMAIL_UNIQUE_INDEX:
+        # Sin el índice único los duplicados no fallan al insertar: descartarlos antes
+        existing = {doc["email"] for doc in database["users"].find(
+            {"email": {"$in": [d["email"] for d in documents]}}, {"email": 1})}
+        duplicados = [d["email"] for d in documents if d["email"] in existing]
+        documents = [d for d in documents if d["email"] not in existing]
+        if not documents:
+            return 0, duplicados, errores
+    try:
+        result = database["users"].insert_many(documents, ordered=False)
+        insertados = len(result.inserted_ids)
+    except BulkWriteError as e:
+        insertados = e.details.get("nInserted", 0)
+        for write_error in e.details.get("writeErrors", []):
+            email = documents[write_error["index"]]["email"]
+            if write_error.get("code") == 11000:
+                duplicados.append(email)
+            else:
+                errores.append({"email": email, "error": write_error.get("errmsg", "")})
+    return insertados, duplicados, errores
+
+def _bulk_register_job(users: list):
+    """Trabajo de alta masiva: hashea e inserta por tramos informando del progreso."""
+    def run(progress):
+        insertados, duplicados, errores = 0, [], []
+        for start in range(0, len(users), BULK_USERS_CHUNK):
+            chunk = users[start:start + BULK_USERS_CHUNK]
+            documents = [_new_user_document(u.email, get_password_hash(u.password)) for u in chunk]
+            chunk_insertados, chunk_duplicados, chunk_errores = _insert_user_documents(documents)
+            insertados += chunk_insertados
+            duplicados.extend(chunk_duplicados)
+            errores.extend(chunk_errores)
+            progress(start + len(chunk), len(users), {"insertados": insertados}, force=True)
+        logger.info(f"Alta masiva: {insertados} insertados, {len(duplicados)} duplicados, {len(errores)} errores")
+        return {"insertados": insertados, "duplicados": duplicados, "errores": errores}
+    return run
+
+# Alta masiva de usuarios para procesos de onboarding
+@app.post("/users/bulk", status_code=201)
+async def bulk_register_users(request: BulkRegisterRequest, current_user: User = Depends(get_current_admin_user)):
+    logger.info(f"Alta masiva de {len(request.users)} usuarios solicitada por {current_user.email}")
+    try:
+        # Un mismo email repetido en el lote solo se inserta una vez
+        unique_users = list({u.email: u for u in request.users}.values())
+        if len(unique_users) > BULK_SYNC_MAX_USERS:
+            # Cientos de hashes bcrypt superarían los timeouts de clientes y proxies y
+            # ocuparían un hueco del limitador que también usan los logins
+            job_id = submit_job("users-bulk", {"usuarios": len(unique_users)}, current_user.email,
+                                _bulk_register_job(unique_users))
+            return JSONResponse(status_code=202, content={"job_id": job_id, "status_url": f"/jobs/{job_id}"})
+        
+        async with password_check_limiter.slot():
+            hashed_passwords = await asyncio.to_thread(
+                lambda: [get_password_hash(u.password) for u in unique_users]
+            )
+        documents = [_new_user_document(u.email, h) for u, h in zip(unique_users, hashed_passwords)]
+        insertados, duplicados, errores = _insert_user_documents(documents)
+        
+        logger.info(f"Alta masiva: {insertados} insertados, {len(duplicados)} duplicados, {len(errores)} errores")
+        return {
+            "insertados": insertados,
+            "duplicados": duplicados,
+            "errores": errores
+        }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Error interno en alta masiva de usuarios: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail="Error interno al registrar usuarios")
+
 # Endpoint de login mejorado
 @app.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
     try:
         logger.info(f"Intento de login con email: {form_data.username}")
+        # Límites por IP y por email antes de pagar la verificación bcrypt
+        login_ip_limiter.check(client_ip(request))
+        login_email_limiter.check(form_data.username.lower())
         user = await authenticate_user(form_data.username, form_data.password)
         if not user:
             logger.warning(f"Credenciales incorrectas para email: {form_data.username}")
@@ -114,7 +253,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
                 detail="Credenciales incorrectas",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        tokens = await generate_tokens(user.email)
+        tokens = await generate_tokens(user.email, user.dict())
         logger.info(f"Tokens generados para {user.email}")
         return tokens
     except HTTPException as e:
@@ -152,7 +291,7 @@ async def refresh_token(request: RefreshTokenRequest):
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        tokens = await generate_tokens(email)
+        tokens = await generate_tokens(email, user_dict)
         logger.info(f"Tokens renovados para {email}")
         return tokens
     except HTTPException as e:
@@ -163,9 +302,22 @@ async def refresh_token(request: RefreshTokenRequest):
         raise HTTPException(status_code=500, detail="Error interno al renovar token")
 
 @app.get("/users/me")
-async def read_users_me(current_user: UserInDB = Depends(get_current_active_user)):
+async def read_users_me(current_user: User = Depends(get_current_active_user)):
     return {"email": current_user.email}
 
+# Deshabilitar un usuario revoca también sus tokens vigentes (necesario en modo stateless)
+@app.post("/users/{email}/disable")
+async def disable_user(email: str, current_user: User = Depends(get_current_admin_user)):
+    logger.info(f"Deshabilitando usuario {email} (solicitado por {current_user.email})")
+    await asyncio.to_thread(set_user_disabled, email, True)
+    return {"email": email, "disabled": True}
+
+@app.post("/users/{email}/enable")
+async def enable_user(email: str, current_user: User = Depends(get_current_admin_user)):
+    logger.info(f"Habilitando usuario {email} (solicitado por {current_user.email})")
+    await asyncio.to_thread(set_user_disabled, email, False)
+    return {"email": email, "disabled": False}
+
 @app.get("/health")
 async def health_check():
     """Endpoint para verificar la salud de la API"""
@@ -177,6 +329,15 @@ async def health_check():
         logger.error(f"Error en health check: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error de conexión: {str(e)}")
 
+@app.get("/.well-known/jwks.json")
+async def jwks(request: Request):
+    """Publica las claves públicas de firma para verificar tokens sin llamar a esta API."""
+    keys, etag = get_jwks()
+    headers = {"Cache-Control": f"public, max-age={JWKS_MAX_AGE}", "ETag": f'"{etag}"'}
+    if request.headers.get("if-none-match") == f'"{etag}"':
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=keys, headers=headers)
+
 @app.get("/api/cliente-api", response_class=HTMLResponse)
 async def serve_cliente_api():
     html_path = Path(__file__).parent / "cliente-api.html"
@@ -0,0 +1,42 @@
+"""
+Preparación del entorno antes de arrancar la API: descarga los datos de NLTK que faltan
+y verifica que se pueden cargar. Pensado para la imagen o el paso de despliegue, de modo
+que la API no descargue nada al importar sus módulos.
+
+Uso:
+    python preflight.py           # descarga lo que falte y verifica
+    python preflight.py --check   # solo verifica (termina con error si falta algo)
+"""
+import sys
+import logging
+from services.text_processing import missing_nltk_resources, warm_up_text_processing
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def preflight(download: bool = True) -> bool:
+    """Descarga (opcionalmente) y verifica los recursos de NLTK; devuelve si todo está listo."""
+    missing = missing_nltk_resources()
+    if missing and download:
+        import nltk
+        for package in missing:
+            logger.info(f"Descargando recurso de NLTK: {package}")
+            nltk.download(package, quiet=True)
+        missing = missing_nltk_resources()
+    if missing:
+        logger.error(f"Faltan recursos de NLTK: {', '.join(missing)}")
+        return False
+    try:
+        # Cargar de verdad stopwords, Punkt y WordNet, no solo comprobar que existen
+        warm_up_text_processing()
+    except Exception as e:
+        logger.error(f"Los recursos de NLTK no se pueden cargar: {str(e)}")
+        return False
+    logger.info("Recursos de NLTK verificados")
+    return True
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] not in ("--check",):
+        print("Uso: python preflight.py [--check]")
+        sys.exit(2)
+    sys.exit(0 if preflight(download="--check" not in sys.argv) else 1)
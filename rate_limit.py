@@ -0,0 +1,133 @@
+import asyncio
+import ipaddress
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import HTTPException, Request, status
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Configuración de los límites (peticiones por minuto y ráfaga máxima)
+LOGIN_RATE_PER_IP = float(os.environ.get("LOGIN_RATE_PER_IP", "30"))
+LOGIN_BURST_PER_IP = int(os.environ.get("LOGIN_BURST_PER_IP", "10"))
+LOGIN_RATE_PER_EMAIL = float(os.environ.get("LOGIN_RATE_PER_EMAIL", "10"))
+LOGIN_BURST_PER_EMAIL = int(os.environ.get("LOGIN_BURST_PER_EMAIL", "5"))
+REGISTER_RATE_PER_IP = float(os.environ.get("REGISTER_RATE_PER_IP", "10"))
+REGISTER_BURST_PER_IP = int(os.environ.get("REGISTER_BURST_PER_IP", "5"))
+# Máximo de verificaciones/hash bcrypt simultáneos en este proceso
+MAX_CONCURRENT_PASSWORD_CHECKS = int(os.environ.get("MAX_CONCURRENT_PASSWORD_CHECKS", str(os.cpu_count() or 2)))
+PASSWORD_CHECK_QUEUE_TIMEOUT = float(os.environ.get("PASSWORD_CHECK_QUEUE_TIMEOUT", "0.5"))
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000"))
+# Proxies de confianza (IPs o redes CIDR separadas por comas). X-Forwarded-For solo se
+# respeta si la conexión llega de uno de ellos; por defecto ninguno.
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(entry.strip(), strict=False)
+    for entry in os.environ.get("TRUSTED_PROXIES", "").split(",") if entry.strip()
+]
+
+def too_many_requests(retry_after: float, detail: str = "Demasiadas solicitudes, intente más tarde") -> HTTPException:
+    """Construye la respuesta 429 con la cabecera Retry-After."""
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+class TokenBucketLimiter:
+    """Limitador token-bucket en memoria, con una cubeta por clave (IP, email...).
+
+    Las claves se guardan en orden LRU y se descartan las más antiguas al superar
+    `max_keys`, de modo que la memoria queda acotada aunque cambien las IPs.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> float:
+        """Consume un token para `key`. Devuelve 0 si se permite o los segundos a esperar."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(key, None)
+            if bucket is None:
+                bucket = [float(self.burst), now]
+            else:
+                tokens, last = bucket
+                bucket[0] = min(float(self.burst), tokens + (now - last) * self.rate)
+                bucket[1] = now
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                return 0.0
+            return (1.0 - bucket[0]) / self.rate if self.rate > 0 else 60.0
+
+    def check(self, key: str) -> None:
+        """Como `acquire`, pero lanza un 429 si la clave ha superado su límite."""
+        retry_after = self.acquire(key)
+        if retry_after > 0:
+            logger.warning(f"Límite de solicitudes superado para: {key}")
+            raise too_many_requests(retry_after)
+
+class ConcurrencyLimiter:
+    """Limita las operaciones costosas simultáneas; si no hay hueco a tiempo responde 429."""
+
+    def __init__(self, max_concurrent: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    @asynccontextmanager
+    async def slot(self):
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Capacidad de verificación de contraseñas agotada")
+            raise too_many_requests(1, "Servidor ocupado, intente más tarde")
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+login_ip_limiter = TokenBucketLimiter(LOGIN_RATE_PER_IP, LOGIN_BURST_PER_IP)
+login_email_limiter = TokenBucketLimiter(LOGIN_RATE_PER_EMAIL, LOGIN_BURST_PER_EMAIL)
+register_ip_limiter = TokenBucketLimiter(REGISTER_RATE_PER_IP, REGISTER_BURST_PER_IP)
+password_check_limiter = ConcurrencyLimiter(MAX_CONCURRENT_PASSWORD_CHECKS, PASSWORD_CHECK_QUEUE_TIMEOUT)
+
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+def client_ip(request: Request) -> str:
+    """
+    Obtiene la IP del cliente.
+
+    Por defecto es la del par de la conexión. Si ese par es un proxy de confianza se
+    recorre X-Forwarded-For de derecha a izquierda y se toma el primer salto que no es
+    de confianza: las entradas a su izquierda las pone el cliente y no son fiables.
+    """
+    peer = request.client.host if request.client else "desconocido"
+    if not TRUSTED_PROXIES or not _is_trusted_proxy(peer):
+        return peer
+    forwarded: Optional[str] = request.headers.get("x-forwarded-for")
+    if not forwarded:
+        return peer
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted_proxy(hop):
+            return hop
+    # Todos los saltos son proxies propios: el más a la izquierda es el origen
+    return hops[0] if hops else peer
@@ -1,7 +1,29 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from fastapi.responses import StreamingResponse
-from services.cloudwords_service import generate_wordcloud, generate_wordcloud_from_collection, get_word_frequency, CloudwordsServiceError
-from typing import List, Dict
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import Response, JSONResponse
+from services.job_service import submit_job
+from services.cloudwords_service import (
+    generate_wordcloud,
+    generate_wordcloud_from_collection,
+    build_collection_wordcloud,
+    get_word_frequency,
+    get_batch_word_frequency,
+    get_collection_word_frequency,
+    wordcloud_filename,
+    collection_wordcloud_title,
+    CloudwordsServiceError,
+    IMAGE_MEDIA_TYPES,
+    COLLECTION_ENGINES,
+    FREQUENCY_MODES,
+    WORDCLOUD_JOB_PHASES,
+    MAX_BATCH_TEXTS
+)
+from services.cloudwords_cache import cache_key, wordcloud_cache
+from services.text_processing import TOKENIZERS
+from services.collection_version_service import get_collection_version
+from services.term_index_service import build_term_index, TermIndexBuildInProgress
+from services.tfidf_service import get_distinctive_terms, TfidfServiceError, TFIDF_MAX_NGRAM
+import asyncio
+from typing import List, Dict, Optional
 from auth import get_current_active_user
 import logging
 from pydantic import BaseModel
@@ -17,26 +39,85 @@ class TextRequest(BaseModel):
     title: str = "Nube de Palabras"
     width: int = 800
     height: int = 400
+    format: str = "png"
+    tokenizer: str = "regex"
+
+class BatchFrequencyRequest(BaseModel):
+    texts: List[str]
+    language: str = "spanish"
+    top_n: int = 20
+    tokenizer: str = "regex"
+
+async def _cached_image_response(request: Request, key: str, filename: str, image_format: str, render):
+    """Sirve una imagen desde la caché (con ETag) o la genera con `render` y la guarda.
+    
+    `render` devuelve (buffer, nombre) o (buffer, nombre, cabeceras extra); las cabeceras
+    extra se guardan en la misma entrada que la imagen para servirlas también desde la caché.
+    """
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    cached = wordcloud_cache.get_with_metadata(key)
+    if cached is None:
+        buffer, filename, *extra = await render()
+        content = buffer.getvalue()
+        extra_headers = extra[0] if extra and extra[0] else {}
+        wordcloud_cache.put_with_metadata(key, content, extra_headers)
+        headers.update(extra_headers)
+    else:
+        logger.debug(f"Nube de palabras servida desde caché: {key}")
+        content, extra_headers = cached
+        headers.update(extra_headers)
+    
+    headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return Response(content=content, media_type=IMAGE_MEDIA_TYPES[image_format], headers=headers)
+
+def _error_bound_headers(mode: str, error_bound: int) -> Dict[str, str]:
+    """En modo aproximado se informa cuánto puede faltarle a cualquier palabra omitida."""
+    return {"X-Frequency-Error-Bound": str(error_bound)} if mode == 'approx' else {}
+
+def _validate_tokenizer(tokenizer: str) -> None:
+    if tokenizer not in TOKENIZERS:
+        raise HTTPException(status_code=400, detail=f"Tokenizador no soportado: {tokenizer}")
+
+def _validate_collection_options(engine: str, mode: str) -> None:
+    if engine not in COLLECTION_ENGINES:
+        raise HTTPException(status_code=400, detail=f"Motor no soportado: {engine}")
+    if mode not in FREQUENCY_MODES:
+        raise HTTPException(status_code=400, detail=f"Modo no soportado: {mode}")
+    if mode == 'approx' and engine not in ('python', 'auto'):
+        raise HTTPException(status_code=400, detail="El modo 'approx' solo está disponible con los motores 'python' y 'auto'")
 
 @router.post("/generate")
 async def generate_wordcloud_endpoint(
     request: TextRequest,
+    http_request: Request,
     current_user=Depends(get_current_active_user)
 ):
     """Genera una nube de palabras a partir de un texto."""
     logger.info(f"Generando nube de palabras para texto de longitud: {len(request.text)}")
+    if request.format not in IMAGE_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {request.format}")
+    _validate_tokenizer(request.tokenizer)
     try:
-        buffer, filename = generate_wordcloud(
-            request.text, 
-            request.language, 
-            request.title, 
-            request.width, 
-            request.height
-        )
-        return StreamingResponse(
-            buffer,
-            media_type="image/png",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        key = cache_key("wordcloud", request.text, request.language, request.width, request.height,
+                        request.title, request.format, request.tokenizer)
+        return await _cached_image_response(
+            http_request,
+            key,
+            wordcloud_filename(request.title, request.format),
+            request.format,
+            lambda: generate_wordcloud(
+                request.text, 
+                request.language, 
+                request.title, 
+                request.width, 
+                request.height,
+                request.format,
+                request.tokenizer
+            )
         )
     except CloudwordsServiceError as e:
         logger.error(f"Error en el servicio de nube de palabras: {str(e)}")
@@ -48,18 +129,52 @@ async def generate_wordcloud_endpoint(
 @router.get("/collection/{coleccion}")
 async def generate_wordcloud_from_collection_endpoint(
     coleccion: str,
+    request: Request,
     campo: str = Query("description", description="Campo de texto a analizar"),
     language: str = Query("spanish", description="Idioma para filtrar stopwords ('spanish' o 'english')"),
+    format: str = Query("png", description="Formato de imagen ('png' o 'webp')"),
+    engine: str = Query("auto", description="Motor de conteo ('auto': el índice si existe; 'index', 'python' o 'aggregate')"),
+    mode: str = Query("exact", description="'exact' o 'approx' (memoria fija, solo con el motor 'python')"),
+    background: bool = Query(False, description="Generar como trabajo en segundo plano (ver /jobs/{id})"),
     current_user=Depends(get_current_active_user)
 ):
     """Genera una nube de palabras a partir de los textos en un campo específico de una colección."""
-    logger.info(f"Generando nube de palabras para colección: {coleccion}, campo: {campo}")
+    logger.info(f"Generando nube de palabras para colección: {coleccion}, campo: {campo}, motor: {engine}, modo: {mode}")
+    if format not in IMAGE_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {format}")
+    _validate_collection_options(engine, mode)
+    
+    async def render():
+        buffer, filename, error_bound = await generate_wordcloud_from_collection(
+            coleccion, campo, language, format, engine, mode
+        )
+        return buffer, filename, _error_bound_headers(mode, error_bound)
+    
     try:
-        buffer, filename = generate_wordcloud_from_collection(coleccion, campo, language)
-        return StreamingResponse(
-            buffer,
-            media_type="image/png",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        # La versión de la colección invalida la caché cuando cambian sus documentos
+        key = cache_key("wordcloud-collection", coleccion, get_collection_version(coleccion), campo,
+                        language, format, engine, mode)
+        if background:
+            def run(progress):
+                content, filename, error_bound = build_collection_wordcloud(
+                    coleccion, campo, language, format, engine, mode, progress
+                )
+                # Mismas cabeceras que el camino síncrono, para los aciertos de caché posteriores
+                wordcloud_cache.put_with_metadata(key, content, _error_bound_headers(mode, error_bound))
+                progress.attach_file(content, IMAGE_MEDIA_TYPES[format], filename)
+                progress(len(WORDCLOUD_JOB_PHASES), len(WORDCLOUD_JOB_PHASES), {"fase": "completado"}, force=True)
+                return {"filename": filename, "error_bound": error_bound if mode == 'approx' else None}
+            
+            params = {"coleccion": coleccion, "campo": campo, "language": language, "format": format,
+                      "engine": engine, "mode": mode}
+            job_id = submit_job("wordcloud-collection", params, current_user.email, run)
+            return JSONResponse(status_code=202, content={"job_id": job_id, "status_url": f"/jobs/{job_id}"})
+        return await _cached_image_response(
+            request,
+            key,
+            wordcloud_filename(collection_wordcloud_title(coleccion, campo), format),
+            format,
+            render
         )
     except CloudwordsServiceError as e:
         logger.error(f"Error en el servicio de nube de palabras: {str(e)}")
@@ -73,16 +188,116 @@ async def get_word_frequency_endpoint(
     text: str,
     language: str = Query("spanish", description="Idioma para filtrar stopwords ('spanish' o 'english')"),
     top_n: int = Query(20, description="Número de palabras más frecuentes a retornar"),
+    mode: str = Query("exact", description="'exact' o 'approx' (memoria fija, con cota de error por palabra)"),
+    tokenizer: str = Query("regex", description="Tokenizador ('regex' o 'nltk')"),
     current_user=Depends(get_current_active_user)
 ):
     """Obtiene la frecuencia de palabras en un texto."""
     logger.info(f"Obteniendo frecuencia de palabras para texto de longitud: {len(text)}")
+    if mode not in FREQUENCY_MODES:
+        raise HTTPException(status_code=400, detail=f"Modo no soportado: {mode}")
+    _validate_tokenizer(tokenizer)
     try:
-        result = get_word_frequency(text, language, top_n)
+        result = get_word_frequency(text, language, top_n, mode, tokenizer)
         return result
     except CloudwordsServiceError as e:
         logger.error(f"Error en el servicio de nube de palabras: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error al obtener frecuencia de palabras: {str(e)}")
     except Exception as e:
         logger.error(f"Error inesperado: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+@router.post("/frequency/batch")
+async def get_batch_word_frequency_endpoint(
+    request: BatchFrequencyRequest,
+    current_user=Depends(get_current_active_user)
+):
+    """Obtiene la frecuencia de palabras por documento y total para un lote de textos."""
+    logger.info(f"Obteniendo frecuencia de palabras para un lote de {len(request.texts)} textos")
+    if len(request.texts) > MAX_BATCH_TEXTS:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_BATCH_TEXTS} textos por petición")
+    if request.top_n < 1:
+        raise HTTPException(status_code=400, detail="top_n debe ser mayor que 0")
+    _validate_tokenizer(request.tokenizer)
+    try:
+        return await asyncio.to_thread(
+            get_batch_word_frequency, request.texts, request.language, request.top_n, request.tokenizer
+        )
+    except CloudwordsServiceError as e:
+        logger.error(f"Error en el servicio de nube de palabras: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al obtener frecuencia de palabras: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error inesperado: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+@router.get("/collection/{coleccion}/frequency")
+async def get_collection_word_frequency_endpoint(
+    coleccion: str,
+    campo: str = Query("description", description="Campo de texto a analizar"),
+    language: str = Query("spanish", description="Idioma para filtrar stopwords ('spanish' o 'english')"),
+    top_n: int = Query(20, description="Número de palabras más frecuentes a retornar"),
+    engine: str = Query("auto", description="Motor de conteo ('auto': el índice si existe; 'index', 'python' o 'aggregate')"),
+    mode: str = Query("exact", description="'exact' o 'approx' (memoria fija, solo con el motor 'python')"),
+    current_user=Depends(get_current_active_user)
+):
+    """Obtiene la frecuencia de palabras de un campo de una colección."""
+    logger.info(f"Obteniendo frecuencia de palabras para colección: {coleccion}, campo: {campo}, motor: {engine}, modo: {mode}")
+    _validate_collection_options(engine, mode)
+    try:
+        return await asyncio.to_thread(
+            get_collection_word_frequency, coleccion, campo, language, top_n, engine, mode
+        )
+    except CloudwordsServiceError as e:
+        logger.error(f"Error en el servicio de nube de palabras: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al obtener frecuencia de palabras: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error inesperado: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+@router.get("/collection/{coleccion}/tfidf")
+async def get_collection_tfidf_endpoint(
+    coleccion: str,
+    campo: str = Query("description", description="Campo de texto a analizar"),
+    language: str = Query("spanish", description="Idioma para filtrar stopwords ('spanish' o 'english')"),
+    ngram_max: int = Query(1, description="Longitud máxima de los n-gramas (1 a 3)"),
+    group_by: Optional[str] = Query(None, description="Campo por el que agrupar los documentos"),
+    top_n: int = Query(10, description="Términos distintivos por documento o grupo"),
+    min_df: int = Query(1, description="Mínimo de documentos o grupos en que debe aparecer un término"),
+    skip: int = Query(0, description="Filas a saltar"),
+    limit: int = Query(100, description="Máximo de filas a retornar"),
+    current_user=Depends(get_current_active_user)
+):
+    """Obtiene los términos más distintivos (TF-IDF) por documento o grupo de un campo de una colección."""
+    logger.info(f"Analizando TF-IDF para colección: {coleccion}, campo: {campo}, n-gramas: {ngram_max}")
+    if not 1 <= ngram_max <= TFIDF_MAX_NGRAM:
+        raise HTTPException(status_code=400, detail=f"ngram_max debe estar entre 1 y {TFIDF_MAX_NGRAM}")
+    if top_n < 1 or min_df < 1 or skip < 0 or limit < 1:
+        raise HTTPException(status_code=400, detail="Parámetros de paginación o filtrado no válidos")
+    try:
+        return await asyncio.to_thread(
+            get_distinctive_terms, coleccion, campo, language, ngram_max, group_by, top_n, min_df, skip, limit
+        )
+    except TfidfServiceError as e:
+        logger.error(f"Error en el análisis TF-IDF: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error inesperado: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+@router.post("/collection/{coleccion}/index")
+async def rebuild_term_index_endpoint(
+    coleccion: str,
+    campo: str = Query("description", description="Campo de texto a indexar"),
+    language: str = Query("spanish", description="Idioma para filtrar stopwords ('spanish' o 'english')"),
+    current_user=Depends(get_current_active_user)
+):
+    """Reconstruye el índice de frecuencias de términos de un campo de una colección."""
+    logger.info(f"Reconstruyendo índice de términos para colección: {coleccion}, campo: {campo}")
+    try:
+        meta = await asyncio.to_thread(build_term_index, coleccion, campo, language)
+        return {**meta, "built_at": meta["built_at"].isoformat()}
+    except TermIndexBuildInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error al reconstruir índice de términos: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al reconstruir índice: {str(e)}")
\ No newline at end of file
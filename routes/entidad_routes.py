@@ -9,6 +9,9 @@ from services.entidad_service import (
     EntidadServiceError
 )
 from typing import List, Dict
+from services.collection_version_service import bump_collection_version
+from services.term_index_service import drop_term_indexes
+from services.lemma_cache_service import drop_lemma_cache
 from auth import get_current_active_user
 import logging
 
@@ -139,6 +142,9 @@ async def eliminar_coleccion_endpoint(coleccion: str, current_user=Depends(get_c
         from db.database import database
         coleccion_obj = database[coleccion]
         resultado = coleccion_obj.drop()
+        bump_collection_version(coleccion)
+        drop_term_indexes(coleccion)
+        drop_lemma_cache(coleccion)
         logger.debug(f"Colección {coleccion} eliminada: {resultado}")
         return {"mensaje": f"Colección {coleccion} eliminada correctamente"}
     except Exception as e:
@@ -0,0 +1,53 @@
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import Response
+from services.job_service import get_job, cancel_job, get_job_file
+from auth import get_current_active_user
+import logging
+
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+def _owned_job(job_id: str, current_user) -> dict:
+    """Trabajo del usuario (o cualquiera para administradores); 404 si no existe o es ajeno."""
+    job = get_job(job_id)
+    if not job or (job["owner"] != current_user.email and current_user.role != "admin"):
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
+
+def _job_response(job: dict) -> dict:
+    job = dict(job)
+    job["id"] = job.pop("_id")
+    if "file" in job:
+        # El contenido se descarga aparte en /jobs/{id}/result
+        job["file"] = {key: value for key, value in job["file"].items() if key != "content"}
+        job["result_url"] = f"/jobs/{job['id']}/result"
+    return job
+
+@router.get("/{job_id}")
+async def get_job_endpoint(job_id: str, current_user=Depends(get_current_active_user)):
+    """Estado, progreso y resultados parciales de un trabajo."""
+    return _job_response(_owned_job(job_id, current_user))
+
+@router.post("/{job_id}/cancel")
+async def cancel_job_endpoint(job_id: str, current_user=Depends(get_current_active_user)):
+    """Pide la cancelación de un trabajo pendiente o en curso."""
+    _owned_job(job_id, current_user)
+    logger.info(f"Cancelación solicitada para el trabajo {job_id}")
+    return _job_response(cancel_job(job_id))
+
+@router.get("/{job_id}/result")
+async def get_job_result_endpoint(job_id: str, current_user=Depends(get_current_active_user)):
+    """Resultado de un trabajo completado: su fichero (p. ej. la imagen de la nube) o el JSON del análisis."""
+    job = _owned_job(job_id, current_user)
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"El trabajo no está completado (estado: {job['status']})")
+    file = get_job_file(job_id)
+    if file:
+        return Response(
+            content=bytes(file["content"]),
+            media_type=file["media_type"],
+            headers={"Content-Disposition": f"attachment; filename={file['filename']}"}
+        )
+    return job.get("result")
@@ -1,5 +1,19 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
-from services.lemmatization_service import lemmatize_text, LemmatizationServiceError
+from fastapi.responses import JSONResponse
+from services.job_service import submit_job
+from services.lemmatization_service import (
+    lemmatize_text,
+    lemmatize_batch,
+    analyze_collection,
+    read_collection_texts,
+    get_lemma_cache_stats,
+    LemmatizationServiceError,
+    MAX_BATCH_TEXTS,
+    SUPPORTED_LANGUAGES
+)
+from typing import List, Optional
+import asyncio
+from services.text_processing import TOKENIZERS
 from auth import get_current_active_user
 from pydantic import BaseModel
 import logging
@@ -13,6 +27,16 @@ class TextRequest(BaseModel):
     text: str
     language: str = "spanish"
     remove_stopwords: bool = True
+    tokenizer: str = "nltk"
+
+class BatchLemmatizationRequest(BaseModel):
+    texts: Optional[List[str]] = None
+    coleccion: Optional[str] = None
+    campo: str = "description"
+    limit: int = MAX_BATCH_TEXTS
+    language: str = "spanish"
+    remove_stopwords: bool = True
+    tokenizer: str = "nltk"
 
 class LemmatizedResponse(BaseModel):
     original_text: str
@@ -20,6 +44,10 @@ class LemmatizedResponse(BaseModel):
     tokens_count: int
     language: str
 
+def _validate_tokenizer(tokenizer: str) -> None:
+    if tokenizer not in TOKENIZERS:
+        raise HTTPException(status_code=400, detail=f"Tokenizador no soportado: {tokenizer}")
+
 @router.post("/", response_model=LemmatizedResponse)
 async def lemmatize_text_endpoint(
     request: TextRequest,
@@ -27,11 +55,13 @@ async def lemmatize_text_endpoint(
 ):
     """Lematiza un texto y opcionalmente elimina stopwords."""
     logger.info(f"Lematizando texto de longitud: {len(request.text)} en idioma: {request.language}")
+    _validate_tokenizer(request.tokenizer)
     try:
         lemmatized = lemmatize_text(
             request.text, 
             language=request.language, 
-            remove_stopwords=request.remove_stopwords
+            remove_stopwords=request.remove_stopwords,
+            tokenizer=request.tokenizer
         )
         
         return LemmatizedResponse(
@@ -47,58 +77,82 @@ async def lemmatize_text_endpoint(
         logger.error(f"Error inesperado: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
+@router.post("/batch")
+async def lemmatize_batch_endpoint(
+    request: BatchLemmatizationRequest,
+    current_user=Depends(get_current_active_user)
+):
+    """Lematiza un lote de textos, o los de un campo de una colección, en el pool de procesos."""
+    if (request.texts is None) == (request.coleccion is None):
+        raise HTTPException(status_code=400, detail="Indique 'texts' o 'coleccion', pero no ambos")
+    if request.language.lower() not in SUPPORTED_LANGUAGES:
+        raise HTTPException(status_code=400, detail=f"Idioma no soportado: {request.language}")
+    if request.texts is not None and len(request.texts) > MAX_BATCH_TEXTS:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_BATCH_TEXTS} textos por petición")
+    if not 1 <= request.limit <= MAX_BATCH_TEXTS:
+        raise HTTPException(status_code=400, detail=f"limit debe estar entre 1 y {MAX_BATCH_TEXTS}")
+    _validate_tokenizer(request.tokenizer)
+    try:
+        if request.coleccion is not None:
+            logger.info(f"Lematizando por lotes la colección: {request.coleccion}, campo: {request.campo}")
+            ids, texts = await asyncio.to_thread(read_collection_texts, request.coleccion, request.campo, request.limit)
+        else:
+            logger.info(f"Lematizando un lote de {len(request.texts)} textos")
+            ids, texts = None, request.texts
+        
+        lemmatized = await lemmatize_batch(
+            texts, request.language.lower(), request.remove_stopwords, request.tokenizer
+        )
+        
+        results = []
+        for position, text in enumerate(lemmatized):
+            item = {"lemmatized_text": text, "tokens_count": len(text.split())}
+            if ids is not None:
+                item["id"] = ids[position]
+            results.append(item)
+        return {"language": request.language, "total": len(results), "results": results}
+    except LemmatizationServiceError as e:
+        logger.error(f"Error en el servicio de lematización: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al lematizar lote: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error inesperado: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+@router.get("/cache-stats")
+async def lemma_cache_stats_endpoint(current_user=Depends(get_current_active_user)):
+    """Devuelve las estadísticas de la caché de lemas del proceso que atiende la petición."""
+    return get_lemma_cache_stats()
+
 @router.post("/analyze-collection")
 async def lemmatize_collection_endpoint(
     coleccion: str = Query(..., description="Nombre de la colección a analizar"),
     campo: str = Query("description", description="Campo de texto a analizar"),
     language: str = Query("spanish", description="Idioma del texto ('english' o 'spanish')"),
     remove_stopwords: bool = Query(True, description="Si se deben eliminar stopwords"),
+    incremental: bool = Query(True, description="Reutilizar los documentos sin cambios desde el último análisis"),
+    tokenizer: str = Query("nltk", description="Tokenizador ('nltk' o 'regex', más rápido)"),
+    background: bool = Query(False, description="Ejecutar como trabajo en segundo plano (ver /jobs/{id})"),
     current_user=Depends(get_current_active_user)
 ):
     """Lematiza los textos de un campo específico en una colección y devuelve estadísticas."""
     logger.info(f"Analizando y lematizando colección: {coleccion}, campo: {campo}")
+    _validate_tokenizer(tokenizer)
     try:
-        from db.database import database
+        if background:
+            params = {"coleccion": coleccion, "campo": campo, "language": language,
+                      "remove_stopwords": remove_stopwords, "incremental": incremental, "tokenizer": tokenizer}
+            job_id = submit_job(
+                "analyze-collection", params, current_user.email,
+                lambda progress: analyze_collection(
+                    coleccion, campo, language, remove_stopwords, incremental, tokenizer, progress
+                )
+            )
+            return JSONResponse(status_code=202, content={"job_id": job_id, "status_url": f"/jobs/{job_id}"})
         
-        # Obtener todos los documentos de la colección
-        documentos = list(database[coleccion].find({}))
-        
-        # Extraer el campo de texto de cada documento
-        total_docs = len(documentos)
-        docs_with_field = 0
-        all_tokens_original = []
-        all_tokens_lemmatized = []
-        
-        for doc in documentos:
-            if campo in doc and doc[campo]:
-                docs_with_field += 1
-                text = str(doc[campo])
-                
-                # Contar tokens originales
-                original_tokens = text.split()
-                all_tokens_original.extend(original_tokens)
-                
-                # Lematizar
-                lemmatized = lemmatize_text(text, language, remove_stopwords)
-                lemmatized_tokens = lemmatized.split()
-                all_tokens_lemmatized.extend(lemmatized_tokens)
-        
-        # Calcular estadísticas
-        result = {
-            "coleccion": coleccion,
-            "campo": campo,
-            "total_documentos": total_docs,
-            "documentos_con_texto": docs_with_field,
-            "total_tokens_originales": len(all_tokens_original),
-            "total_tokens_lematizados": len(all_tokens_lemmatized),
-            "reduccion_porcentaje": round((1 - len(all_tokens_lemmatized) / max(1, len(all_tokens_original))) * 100, 2),
-            "tokens_unicos_originales": len(set(all_tokens_original)),
-            "tokens_unicos_lematizados": len(set(all_tokens_lemmatized)),
-            "muestra_tokens_originales": all_tokens_original[:20] if all_tokens_original else [],
-            "muestra_tokens_lematizados": all_tokens_lemmatized[:20] if all_tokens_lemmatized else [],
-        }
-        
-        return result
+        # Se recorre la colección en streaming, fuera del event loop
+        return await asyncio.to_thread(
+            analyze_collection, coleccion, campo, language, remove_stopwords, incremental, tokenizer
+        )
     except LemmatizationServiceError as e:
         logger.error(f"Error en el servicio de lematización: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error al lematizar colección: {str(e)}")
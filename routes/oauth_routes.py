@@ -40,16 +40,23 @@ async def oauth_callback(
             )
         
         # Intercambiar código por token
-        token_info = oauth_service.exchange_code_for_token(provider, code, state)
+        token_info = await oauth_service.exchange_code_for_token(provider, code, state)
         
-        # Obtener información del usuario
-        user_info = oauth_service.get_user_info(provider, token_info['access_token'])
+        # Obtener información del usuario: del id_token verificado localmente si es
+        # posible, y si no del endpoint userinfo del proveedor
+        user_info = None
+        if token_info.get('id_token'):
+            user_info = await oauth_service.get_user_from_id_token(
+                provider, token_info['id_token'], token_info['access_token']
+            )
+        if user_info is None:
+            user_info = await oauth_service.get_user_info(provider, token_info['access_token'])
         
         # Crear o actualizar usuario en la base de datos
         user = await oauth_service.create_or_update_user(user_info)
         
         # Generar tokens JWT para la sesión
-        tokens = await generate_tokens(user['email'])
+        tokens = await generate_tokens(user['email'], user)
         
         # Redirigir a la aplicación con tokens
         redirect_url = (
@@ -0,0 +1,148 @@
+import os
+import json
+import struct
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Configuración de la caché de nubes de palabras y frecuencias
+CLOUDWORDS_CACHE_DIR = os.environ.get("CLOUDWORDS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "cloudwords_cache"))
+CLOUDWORDS_CACHE_MEMORY_MB = int(os.environ.get("CLOUDWORDS_CACHE_MEMORY_MB", "64"))
+CLOUDWORDS_CACHE_DISK_MB = int(os.environ.get("CLOUDWORDS_CACHE_DISK_MB", "512"))
+# Prefijo de las entradas con metadatos: magia + longitud del JSON + JSON + contenido
+_METADATA_MAGIC = b"CWM1"
+
+def cache_key(*parts) -> str:
+    """Clave de contenido: hash SHA-256 de los parámetros que determinan el resultado."""
+    raw = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+class ContentCache:
+    """Caché de dos niveles: LRU en memoria y, opcionalmente, ficheros en disco.
+
+    Ambos niveles se limitan por tamaño en bytes; en disco se eliminan primero los
+    ficheros usados hace más tiempo (por fecha de modificación, que se actualiza en
+    cada acierto).
+    """
+
+    def __init__(self, max_memory_bytes: int, directory: Optional[str] = None, max_disk_bytes: int = 0):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.directory = Path(directory) if directory and max_disk_bytes > 0 else None
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(f.stat().st_size for f in self.directory.glob("*/*") if f.is_file())
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            return None
+        self._put_memory(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        self._put_memory(key, data)
+        if self.directory is None or len(data) > self.max_disk_bytes:
+            return
+        path = self._path(key)
+        if path.exists():
+            os.utime(path)
+            return
+        try:
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"No se pudo escribir en la caché de disco: {str(e)}")
+            return
+        with self._lock:
+            self._disk_bytes += len(data)
+            over_limit = self._disk_bytes > self.max_disk_bytes
+        if over_limit:
+            self._evict_disk()
+
+    def put_with_metadata(self, key: str, content: bytes, metadata: Dict[str, str]) -> None:
+        """Guarda un contenido junto a sus metadatos (p. ej. cabeceras) en una sola entrada."""
+        encoded = json.dumps(metadata, ensure_ascii=False).encode('utf-8')
+        self.put(key, _METADATA_MAGIC + struct.pack(">I", len(encoded)) + encoded + content)
+
+    def get_with_metadata(self, key: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        """Devuelve (contenido, metadatos); las entradas guardadas con `put` no tienen metadatos."""
+        data = self.get(key)
+        if data is None:
+            return None
+        if not data.startswith(_METADATA_MAGIC):
+            return data, {}
+        start = len(_METADATA_MAGIC) + 4
+        (length,) = struct.unpack(">I", data[len(_METADATA_MAGIC):start])
+        return data[start + length:], json.loads(data[start:start + length].decode('utf-8'))
+
+    def _put_memory(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous)
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _evict_disk(self) -> None:
+        """Borra los ficheros menos usados hasta quedar al 90% del límite."""
+        files = []
+        for f in self.directory.glob("*/*"):
+            try:
+                stat = f.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, f))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_disk_bytes * 0.9)
+        for _, size, f in files:
+            if total <= target:
+                break
+            try:
+                f.unlink()
+                total -= size
+            except OSError:
+                continue
+        with self._lock:
+            self._disk_bytes = total
+        logger.debug(f"Caché de disco reducida a {total} bytes")
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+wordcloud_cache = ContentCache(
+    CLOUDWORDS_CACHE_MEMORY_MB * 1024 * 1024,
+    CLOUDWORDS_CACHE_DIR,
+    CLOUDWORDS_CACHE_DISK_MB * 1024 * 1024
+)
+# Las frecuencias son pequeñas: solo se guardan en memoria
+frequency_cache = ContentCache(8 * 1024 * 1024)
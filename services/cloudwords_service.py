@@ -1,26 +1,119 @@
 import io
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud
-import pandas as pd
+import os
+import asyncio
+import functools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from collections import Counter
-import nltk
-from nltk.corpus import stopwords
+import numpy as np
+from services.text_processing import regex_tokenize, filter_stopwords, get_stopwords, get_tokenizer
+from services.wordcloud_render import render_wordcloud, IMAGE_FORMATS
+from services.cloudwords_cache import cache_key, frequency_cache
+from services.term_index_service import top_terms, has_term_index
+from services.corpus_reader import count_field_terms
+from services.sketches import SpaceSaving, SKETCH_CAPACITY
+from db.database import database
+import json
 import logging
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Descargar recursos de NLTK si es necesario
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
-
 class CloudwordsServiceError(Exception):
     """Excepción personalizada para errores en el servicio de nube de palabras."""
     pass
 
-def generate_wordcloud(text, language='spanish', title='Nube de Palabras', width=800, height=400):
+# Pool de procesos para renderizar nubes sin bloquear el event loop
+CLOUDWORDS_WORKERS = int(os.environ.get("CLOUDWORDS_WORKERS", str(min(4, os.cpu_count() or 1))))
+CLOUDWORDS_MAX_CONCURRENT = int(os.environ.get("CLOUDWORDS_MAX_CONCURRENT", str(CLOUDWORDS_WORKERS * 2)))
+IMAGE_MEDIA_TYPES = {'png': 'image/png', 'webp': 'image/webp'}
+MAX_CLOUD_WORDS = 200
+MAX_BATCH_TEXTS = int(os.environ.get("CLOUDWORDS_MAX_BATCH_TEXTS", "10000"))
+# Motores para el análisis de colecciones: índice precalculado, Python en streaming
+# o pipeline de agregación ejecutado en MongoDB. 'auto' usa el índice si ya existe y si
+# no cuenta en streaming: una consulta normal no lanza la construcción de un índice.
+COLLECTION_ENGINES = ('auto', 'index', 'python', 'aggregate')
+# 'approx' cuenta con un resumen Space-Saving de memoria fija (ver services.sketches)
+FREQUENCY_MODES = ('exact', 'approx')
+
+# Pasos de un trabajo de nube de palabras de una colección (ver build_collection_wordcloud)
+WORDCLOUD_JOB_PHASES = ('conteo', 'renderizado', 'caché')
+# Equivalente en PCRE (MongoDB) del tokenizador de services.text_processing
+MONGO_TOKEN_REGEX = r"[\p{L}\p{N}_]+(?:[-'][\p{L}\p{N}_]+)*"
+
+# Espera entre intentos de obtener un hueco de renderizado desde el event loop
+RENDER_SLOT_POLL_SECONDS = 0.02
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+# Huecos de renderizado compartidos por las peticiones (event loop) y los trabajos (hilos)
+_render_slots = threading.BoundedSemaphore(CLOUDWORDS_MAX_CONCURRENT)
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            # 'spawn' evita heredar por fork el cliente de MongoDB y los hilos del proceso principal
+            _render_pool = ProcessPoolExecutor(
+                max_workers=CLOUDWORDS_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            logger.info(f"Pool de renderizado de nubes iniciado con {CLOUDWORDS_WORKERS} procesos")
+        return _render_pool
+
+def _discard_broken_pool(pool: ProcessPoolExecutor) -> None:
+    """Un worker murió (p. ej. por memoria): se libera el pool roto y se recreará en el siguiente uso."""
+    global _render_pool
+    logger.error("El pool de renderizado se rompió, se reiniciará")
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_render_pool():
+    """Detiene el pool de renderizado (al apagar la aplicación)."""
+    global _render_pool
+    with _render_pool_lock:
+        pool, _render_pool = _render_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def render_wordcloud_sync(**kwargs) -> bytes:
+    """Renderiza una nube en el pool de procesos desde un hilo (p. ej. un trabajo en segundo plano)."""
+    with _render_slots:
+        pool = _get_render_pool()
+        try:
+            return pool.submit(functools.partial(render_wordcloud, **kwargs)).result()
+        except BrokenProcessPool:
+            _discard_broken_pool(pool)
+            raise
+
+async def render_wordcloud_async(**kwargs) -> bytes:
+    """Renderiza una nube en el pool de procesos, con un límite de renderizados simultáneos."""
+    # El semáforo es de hilos (lo comparten los trabajos); esperar sin bloquear el event loop
+    while not _render_slots.acquire(blocking=False):
+        await asyncio.sleep(RENDER_SLOT_POLL_SECONDS)
+    try:
+        pool = _get_render_pool()
+        try:
+            return await asyncio.wrap_future(pool.submit(functools.partial(render_wordcloud, **kwargs)))
+        except BrokenProcessPool:
+            _discard_broken_pool(pool)
+            raise
+    finally:
+        _render_slots.release()
+
+def wordcloud_filename(title, image_format='png'):
+    """Nombre de archivo para la descarga de una nube de palabras."""
+    return f"wordcloud_{title.replace(' ', '_')}.{image_format}"
+
+def collection_wordcloud_title(coleccion, campo):
+    return f"Palabras en {coleccion} - {campo}"
+
+async def generate_wordcloud(text, language='spanish', title='Nube de Palabras', width=800, height=400, image_format='png',
+                             tokenizer='regex'):
     """
     Genera una nube de palabras a partir de un texto.
     
@@ -30,55 +123,158 @@ def generate_wordcloud(text, language='spanish', title='Nube de Palabras', width
         title (str): Título para la imagen
         width (int): Ancho de la imagen
         height (int): Alto de la imagen
+        image_format (str): Formato de salida ('png' o 'webp')
+        tokenizer (str): Tokenizador ('regex' o 'nltk')
         
     Returns:
         tuple[io.BytesIO, str]: Buffer de imagen y nombre de archivo
     """
     try:
-        # Configurar stopwords según el idioma
-        if language == 'english':
-            stop_words = set(stopwords.words('english'))
-        else:
-            stop_words = set(stopwords.words('spanish'))
+        if image_format not in IMAGE_FORMATS:
+            raise CloudwordsServiceError(f"Formato de imagen no soportado: {image_format}")
         
-        # Procesar el texto y filtrar stopwords
-        words = text.lower().split()
-        filtered_words = [word for word in words if word not in stop_words]
+        # Tokenizar y filtrar stopwords según el idioma
+        stopwords_language = 'english' if language == 'english' else 'spanish'
+        filtered_words = filter_stopwords(get_tokenizer(tokenizer)(text), stopwords_language)
         text_filtered = ' '.join(filtered_words)
         
-        # Generar la nube de palabras
-        wordcloud = WordCloud(
-            width=width, 
-            height=height, 
-            background_color='white',
-            colormap='viridis',
-            max_words=200,
-            contour_width=1, 
-            contour_color='steelblue'
-        ).generate(text_filtered)
-        
-        # Crear la figura
-        plt.figure(figsize=(width/100, height/100), dpi=100)
-        plt.imshow(wordcloud, interpolation='bilinear')
-        plt.title(title)
-        plt.axis('off')
-        
-        # Guardar en un buffer de memoria
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', bbox_inches='tight')
-        plt.close()
-        buffer.seek(0)
-        
-        # Nombre de archivo
-        filename = f"wordcloud_{title.replace(' ', '_')}.png"
-        
-        return buffer, filename
+        # Generar la nube de palabras en el pool de procesos
+        image_bytes = await render_wordcloud_async(
+            text=text_filtered,
+            title=title,
+            width=width,
+            height=height,
+            image_format=image_format
+        )
+        
+        return io.BytesIO(image_bytes), wordcloud_filename(title, image_format)
     
     except Exception as e:
         logger.error(f"Error al generar nube de palabras: {str(e)}")
         raise CloudwordsServiceError(f"Error al generar nube de palabras: {str(e)}")
 
-def generate_wordcloud_from_collection(coleccion, campo='description', language='spanish'):
+def aggregate_top_terms(coleccion, campo='description', language='spanish', top_n=20, min_length=0):
+    """
+    Calcula los términos más frecuentes con un pipeline de agregación en el servidor.
+    
+    Solo viajan a Python los `top_n` términos resultantes. `$toLower` de MongoDB solo
+    convierte letras ASCII, así que las mayúsculas acentuadas se cuentan aparte.
+    
+    Returns:
+        list[tuple[str, int]]: Pares (término, frecuencia)
+    """
+    stopwords_language = 'english' if language == 'english' else 'spanish'
+    term_filter = {"$nin": sorted(get_stopwords(stopwords_language))}
+    pipeline = [
+        {"$match": {campo: {"$type": "string", "$ne": ""}}},
+        {"$project": {
+            "_id": 0,
+            "tokens": {"$regexFindAll": {"input": {"$toLower": f"${campo}"}, "regex": MONGO_TOKEN_REGEX}}
+        }},
+        {"$unwind": "$tokens"},
+        {"$project": {"term": "$tokens.match"}},
+        {"$match": {"term": term_filter}},
+    ]
+    if min_length:
+        pipeline.append({"$match": {"$expr": {"$gt": [{"$strLenCP": "$term"}, min_length]}}})
+    pipeline += [
+        {"$group": {"_id": "$term", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$limit": top_n}
+    ]
+    return [(doc["_id"], doc["count"]) for doc in database[coleccion].aggregate(pipeline, allowDiskUse=True)]
+
+def python_top_terms(coleccion, campo='description', language='spanish', top_n=20, min_length=0, progress=None):
+    """Calcula los términos más frecuentes leyendo la colección en streaming desde Python."""
+    counter, _ = count_field_terms(coleccion, campo, _frequency_tokenizer(language, min_length), progress=progress)
+    return counter.most_common(top_n)
+
+def _frequency_tokenizer(language, min_length):
+    stopwords_language = 'english' if language == 'english' else 'spanish'
+    return lambda text: filter_stopwords(regex_tokenize(text), stopwords_language, min_length)
+
+def approx_top_terms(coleccion, campo='description', language='spanish', top_n=20, min_length=0, progress=None):
+    """
+    Términos más frecuentes leyendo la colección en streaming con memoria fija.
+    
+    Returns:
+        tuple[list[tuple[str, int, int]], int]: Tríos (término, frecuencia, error) y la
+        frecuencia máxima de cualquier término que no aparezca en la lista
+    """
+    sketch = SpaceSaving(max(SKETCH_CAPACITY, top_n))
+    count_field_terms(coleccion, campo, _frequency_tokenizer(language, min_length), counter=sketch, progress=progress)
+    return sketch.top_k(top_n), sketch.error_bound
+
+def collection_top_terms(coleccion, campo='description', language='spanish', top_n=20, min_length=0, engine='auto',
+                         progress=None):
+    """
+    Términos más frecuentes de un campo de una colección con el motor elegido.
+    
+    Args:
+        engine (str): 'auto', 'index' (conteos precalculados), 'python' o 'aggregate'
+        progress (callable): Aviso de documentos procesados (solo con el motor 'python')
+        
+    Returns:
+        list[tuple[str, int]]: Pares (término, frecuencia)
+    """
+    if engine == 'auto':
+        engine = 'index' if has_term_index(coleccion, campo, language) else 'python'
+    if engine == 'index':
+        return top_terms(coleccion, campo, language, top_n, min_length=min_length)
+    if engine == 'python':
+        return python_top_terms(coleccion, campo, language, top_n, min_length, progress)
+    if engine == 'aggregate':
+        return aggregate_top_terms(coleccion, campo, language, top_n, min_length)
+    raise CloudwordsServiceError(f"Motor no soportado: {engine}")
+
+def collection_cloud_frequencies(coleccion, campo='description', language='spanish', engine='auto', mode='exact',
+                                 progress=None):
+    """
+    Frecuencias para la nube de palabras de una colección.
+    
+    Returns:
+        tuple[dict, int]: Palabra -> frecuencia y cota de error (0 si son exactas)
+    """
+    if mode == 'approx':
+        terms, error_bound = approx_top_terms(coleccion, campo, language, MAX_CLOUD_WORDS, progress=progress)
+        frecuencias = {word: freq for word, freq, _ in terms}
+    else:
+        # Con 'index' las frecuencias están precalculadas (el índice se construye la primera vez)
+        error_bound = 0
+        frecuencias = dict(collection_top_terms(coleccion, campo, language, MAX_CLOUD_WORDS, 0, engine, progress))
+    if not frecuencias:
+        raise CloudwordsServiceError(f"No se encontraron textos en el campo {campo} de la colección {coleccion}")
+    return frecuencias, error_bound
+
+def build_collection_wordcloud(coleccion, campo='description', language='spanish', image_format='png',
+                               engine='auto', mode='exact', progress=None):
+    """
+    Versión síncrona de generate_wordcloud_from_collection para trabajos en segundo plano.
+    
+    Args:
+        progress (JobProgress): Progreso del trabajo. Se informa una fase por paso
+            (WORDCLOUD_JOB_PHASES) y, al pasar de una a otra, se comprueba si se pidió la
+            cancelación; durante el conteo en streaming se añaden los documentos procesados.
+    
+    Returns:
+        tuple[bytes, str, int]: Imagen, nombre de archivo y cota de error de las frecuencias
+    """
+    count_progress = None
+    if progress is not None:
+        progress(0, len(WORDCLOUD_JOB_PHASES), {"fase": "conteo"}, force=True)
+        count_progress = lambda documentos: progress(0, len(WORDCLOUD_JOB_PHASES),
+                                                     {"fase": "conteo", "documentos": documentos})
+    frecuencias, error_bound = collection_cloud_frequencies(coleccion, campo, language, engine, mode, count_progress)
+    if progress is not None:
+        progress(1, len(WORDCLOUD_JOB_PHASES), {"fase": "renderizado", "terminos": len(frecuencias)}, force=True)
+    title = collection_wordcloud_title(coleccion, campo)
+    image_bytes = render_wordcloud_sync(frequencies=frecuencias, title=title, image_format=image_format)
+    if progress is not None:
+        progress(2, len(WORDCLOUD_JOB_PHASES), {"fase": "caché"}, force=True)
+    return image_bytes, wordcloud_filename(title, image_format), error_bound
+
+async def generate_wordcloud_from_collection(coleccion, campo='description', language='spanish', image_format='png',
+                                             engine='auto', mode='exact'):
     """
     Genera una nube de palabras a partir de los textos en un campo específico de una colección.
     
@@ -86,40 +282,149 @@ def generate_wordcloud_from_collection(coleccion, campo='description', language=
         coleccion (str): Nombre de la colección
         campo (str): Campo de texto a analizar
         language (str): Idioma para filtrar stopwords
+        image_format (str): Formato de salida ('png' o 'webp')
+        engine (str): Motor de conteo ('auto', 'index', 'python' o 'aggregate')
+        mode (str): 'exact' o 'approx' (solo con el motor 'python')
+        
+    Returns:
+        tuple[io.BytesIO, str, int]: Buffer de imagen, nombre de archivo y cota de error
+        de las frecuencias (0 si son exactas)
+    """
+    try:
+        frecuencias, error_bound = await asyncio.to_thread(
+            collection_cloud_frequencies, coleccion, campo, language, engine, mode
+        )
+        
+        # Generar la nube de palabras
+        buffer, filename = await generate_wordcloud_from_frequencies(
+            frecuencias,
+            title=collection_wordcloud_title(coleccion, campo),
+            image_format=image_format
+        )
+        return buffer, filename, error_bound
+    
+    except Exception as e:
+        logger.error(f"Error al generar nube de palabras desde colección: {str(e)}")
+        raise CloudwordsServiceError(f"Error al generar nube de palabras: {str(e)}")
+
+async def generate_wordcloud_from_frequencies(frequencies, title='Nube de Palabras', width=800, height=400, image_format='png'):
+    """
+    Genera una nube de palabras a partir de frecuencias ya calculadas.
+    
+    Args:
+        frequencies (dict): Palabra -> frecuencia
+        title (str): Título para la imagen
+        width (int): Ancho de la imagen
+        height (int): Alto de la imagen
+        image_format (str): Formato de salida ('png' o 'webp')
         
     Returns:
         tuple[io.BytesIO, str]: Buffer de imagen y nombre de archivo
     """
+    if image_format not in IMAGE_FORMATS:
+        raise CloudwordsServiceError(f"Formato de imagen no soportado: {image_format}")
+    image_bytes = await render_wordcloud_async(
+        frequencies=frequencies,
+        title=title,
+        width=width,
+        height=height,
+        image_format=image_format
+    )
+    return io.BytesIO(image_bytes), wordcloud_filename(title, image_format)
+
+def _top_entries(terms, counts, vocabulary, top_n):
+    """Convierte los `top_n` conteos mayores (empates por orden de aparición) en la lista de respuesta."""
+    order = np.lexsort((terms, -counts))[:top_n]
+    return [{"word": vocabulary[terms[i]], "frequency": int(counts[i])} for i in order]
+
+def get_batch_word_frequency(texts, language='spanish', top_n=20, tokenizer='regex'):
+    """
+    Obtiene la frecuencia de palabras de muchos textos en una sola pasada.
+    
+    Cada texto se tokeniza a identificadores de un vocabulario común y los conteos se
+    calculan de forma vectorizada como una matriz documento-término dispersa (pares
+    documento/término con su frecuencia), sin un `Counter` por documento.
+    
+    Args:
+        texts (list[str]): Textos a analizar
+        language (str): Idioma para filtrar stopwords ('spanish' o 'english')
+        top_n (int): Número de palabras más frecuentes a retornar (por documento y en total)
+        tokenizer (str): Tokenizador ('regex' o 'nltk')
+        
+    Returns:
+        dict: Totales del lote y las palabras más frecuentes por documento (en el orden recibido)
+    """
     try:
-        from db.database import database
+        stopwords_language = 'english' if language == 'english' else 'spanish'
+        tokenize = get_tokenizer(tokenizer)
+        vocabulary = {}
+        term_ids = []
+        lengths = np.zeros(len(texts), dtype=np.int64)
+        for position, text in enumerate(texts):
+            tokens = filter_stopwords(tokenize(text or ""), stopwords_language, min_length=2)
+            lengths[position] = len(tokens)
+            term_ids.extend(vocabulary.setdefault(token, len(vocabulary)) for token in tokens)
+        words = list(vocabulary)
+        n_terms = len(words)
         
-        # Obtener todos los documentos de la colección
-        documentos = list(database[coleccion].find({}))
+        terms = np.asarray(term_ids, dtype=np.int64)
+        docs = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
         
-        # Extraer el campo de texto de cada documento
-        textos = []
-        for doc in documentos:
-            if campo in doc and doc[campo]:
-                textos.append(str(doc[campo]))
+        # Matriz dispersa en formato COO: claves únicas documento*V + término
+        keys, counts = np.unique(docs * max(n_terms, 1) + terms, return_counts=True)
+        pair_docs, pair_terms = np.divmod(keys, max(n_terms, 1))
         
-        if not textos:
-            raise CloudwordsServiceError(f"No se encontraron textos en el campo {campo} de la colección {coleccion}")
+        total_counts = np.bincount(terms, minlength=n_terms)
+        all_terms = np.nonzero(total_counts)[0]
+        total = _top_entries(all_terms, total_counts[all_terms], words, top_n)
         
-        # Unir todos los textos
-        texto_completo = ' '.join(textos)
+        # np.unique devuelve los pares ordenados por documento: cada documento es un tramo contiguo
+        bounds = np.searchsorted(pair_docs, np.arange(len(texts) + 1))
+        por_documento = [
+            _top_entries(pair_terms[start:end], counts[start:end], words, top_n) if end > start else []
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
         
-        # Generar la nube de palabras
-        return generate_wordcloud(
-            texto_completo, 
-            language=language, 
-            title=f"Palabras en {coleccion} - {campo}"
-        )
+        return {
+            "documentos": len(texts),
+            "tokens": int(lengths.sum()),
+            "vocabulario": n_terms,
+            "total": total,
+            "por_documento": por_documento
+        }
     
     except Exception as e:
-        logger.error(f"Error al generar nube de palabras desde colección: {str(e)}")
-        raise CloudwordsServiceError(f"Error al generar nube de palabras: {str(e)}")
+        logger.error(f"Error al obtener frecuencia de palabras por lotes: {str(e)}")
+        raise CloudwordsServiceError(f"Error al obtener frecuencia de palabras por lotes: {str(e)}")
+
+def get_collection_word_frequency(coleccion, campo='description', language='spanish', top_n=20, engine='auto',
+                                  mode='exact'):
+    """
+    Obtiene la frecuencia de palabras de un campo de una colección.
+    
+    Args:
+        coleccion (str): Nombre de la colección
+        campo (str): Campo de texto a analizar
+        language (str): Idioma para filtrar stopwords ('spanish' o 'english')
+        top_n (int): Número de palabras más frecuentes a retornar
+        engine (str): Motor de conteo ('auto', 'index', 'python' o 'aggregate')
+        mode (str): 'exact' o 'approx' (solo con el motor 'python')
+        
+    Returns:
+        list[dict]: Lista de diccionarios con palabras y frecuencias (y su error en modo 'approx')
+    """
+    try:
+        # Mismo criterio que get_word_frequency: palabras de más de 2 caracteres
+        if mode == 'approx':
+            terms, _ = approx_top_terms(coleccion, campo, language, top_n, min_length=2)
+            return [{"word": word, "frequency": freq, "error": error} for word, freq, error in terms]
+        terms = collection_top_terms(coleccion, campo, language, top_n, min_length=2, engine=engine)
+        return [{"word": word, "frequency": freq} for word, freq in terms]
+    except Exception as e:
+        logger.error(f"Error al obtener frecuencia de palabras de la colección: {str(e)}")
+        raise CloudwordsServiceError(f"Error al obtener frecuencia de palabras: {str(e)}")
 
-def get_word_frequency(text, language='spanish', top_n=20):
+def get_word_frequency(text, language='spanish', top_n=20, mode='exact', tokenizer='regex'):
     """
     Obtiene la frecuencia de palabras en un texto.
     
@@ -127,29 +432,37 @@ def get_word_frequency(text, language='spanish', top_n=20):
         text (str): Texto a analizar
         language (str): Idioma para filtrar stopwords ('spanish' o 'english')
         top_n (int): Número de palabras más frecuentes a retornar
+        mode (str): 'exact' o 'approx' (memoria fija, cada palabra incluye su error)
+        tokenizer (str): Tokenizador ('regex' o 'nltk')
         
     Returns:
         list[dict]: Lista de diccionarios con palabras y frecuencias
     """
     try:
-        # Configurar stopwords según el idioma
-        if language == 'english':
-            stop_words = set(stopwords.words('english'))
-        else:
-            stop_words = set(stopwords.words('spanish'))
+        # Resultados repetidos para el mismo texto se sirven desde la caché
+        key = cache_key("frequency", text, language, top_n, mode, tokenizer)
+        cached = frequency_cache.get(key)
+        if cached is not None:
+            return json.loads(cached)
         
-        # Procesar el texto y filtrar stopwords
-        words = text.lower().split()
-        filtered_words = [word for word in words if word not in stop_words and len(word) > 2]
+        # Tokenizar y filtrar stopwords según el idioma
+        stopwords_language = 'english' if language == 'english' else 'spanish'
+        filtered_words = filter_stopwords(get_tokenizer(tokenizer)(text), stopwords_language, min_length=2)
         
-        # Contar frecuencia de palabras
-        word_counts = Counter(filtered_words)
-        
-        # Obtener las palabras más frecuentes
-        most_common = word_counts.most_common(top_n)
-        
-        # Convertir a lista de diccionarios
-        result = [{"word": word, "frequency": freq} for word, freq in most_common]
+        if mode == 'approx':
+            sketch = SpaceSaving(max(SKETCH_CAPACITY, top_n))
+            sketch.update(filtered_words)
+            result = [{"word": word, "frequency": freq, "error": error} for word, freq, error in sketch.top_k(top_n)]
+        else:
+            # Contar frecuencia de palabras
+            word_counts = Counter(filtered_words)
+            
+            # Obtener las palabras más frecuentes
+            most_common = word_counts.most_common(top_n)
+            
+            # Convertir a lista de diccionarios
+            result = [{"word": word, "frequency": freq} for word, freq in most_common]
+        frequency_cache.put(key, json.dumps(result).encode('utf-8'))
         
         return result
     
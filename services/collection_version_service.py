@@ -0,0 +1,40 @@
+from db.database import database
+import os
+import time
+import logging
+
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Edad máxima de los resultados cacheados por versión de colección (nubes, TF-IDF). Acota
+# cuánto se sirve un resultado antiguo tras escrituras que no pasan por los servicios
+# (ediciones directas en la base de datos) y no cambian el número de documentos. 0 la desactiva.
+COLLECTION_CACHE_MAX_AGE = int(os.environ.get("COLLECTION_CACHE_MAX_AGE", "3600"))
+
+def bump_collection_version(coleccion: str) -> None:
+    """Incrementa la versión de una colección tras una escritura desde la capa de servicios."""
+    try:
+        database["collection_versions"].update_one({"_id": coleccion}, {"$inc": {"version": 1}}, upsert=True)
+    except Exception as e:
+        # No debe fallar la escritura principal; como mucho se sirve un resultado cacheado antiguo
+        logger.error(f"Error al actualizar la versión de la colección {coleccion}: {str(e)}")
+
+def get_write_version(coleccion: str) -> str:
+    """Versión de escritura: cambia con cada escritura hecha por los servicios (y la entrada
+    de datos RPA) y con el número de documentos, que también cambia cuando otros procesos
+    insertan o borran."""
+    doc = database["collection_versions"].find_one({"_id": coleccion})
+    version = doc["version"] if doc else 0
+    count = database[coleccion].estimated_document_count()
+    return f"{version}:{count}"
+
+def get_collection_version(coleccion: str) -> str:
+    """Versión de una colección para invalidar resultados derivados de su contenido.
+
+    Es la versión de escritura más el periodo de COLLECTION_CACHE_MAX_AGE en curso, para
+    que una modificación que esta no detecta caduque como mucho en ese tiempo.
+    """
+    write_version = get_write_version(coleccion)
+    if COLLECTION_CACHE_MAX_AGE > 0:
+        return f"{write_version}:{int(time.time() // COLLECTION_CACHE_MAX_AGE)}"
+    return write_version
@@ -0,0 +1,112 @@
+import os
+import logging
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+from db.database import database
+
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Lectura en streaming de un campo de texto de una colección: solo se trae el campo
+# pedido, por lotes, y nunca se materializa la colección ni un texto concatenado.
+CORPUS_BATCH_SIZE = int(os.environ.get("CORPUS_BATCH_SIZE", "500"))
+CORPUS_MAX_DOC_CHARS = int(os.environ.get("CORPUS_MAX_DOC_CHARS", "1000000"))
+CORPUS_MAX_VOCABULARY = int(os.environ.get("CORPUS_MAX_VOCABULARY", "500000"))
+
+def iter_field_documents(coleccion: str, campo: str, extra_fields: Sequence[str] = (), include_id: bool = True,
+                         batch_size: int = CORPUS_BATCH_SIZE,
+                         max_chars: int = CORPUS_MAX_DOC_CHARS) -> Iterator[Tuple[Dict, str]]:
+    """
+    Recorre los documentos con texto en un campo con un cursor proyectado.
+
+    Args:
+        coleccion (str): Nombre de la colección
+        campo (str): Campo de texto a leer
+        extra_fields (list[str]): Otros campos a traer junto al texto
+        include_id (bool): Si se trae también el `_id`
+        batch_size (int): Documentos por lote del cursor
+        max_chars (int): Longitud máxima por texto (el resto se descarta)
+
+    Yields:
+        tuple[dict, str]: Documento proyectado y su texto
+    """
+    projection = {campo: 1, "_id": 1 if include_id else 0}
+    for field in extra_fields:
+        projection[field] = 1
+    cursor = database[coleccion].find(
+        {campo: {"$exists": True, "$nin": [None, ""]}},
+        projection,
+        batch_size=batch_size
+    )
+    try:
+        for doc in cursor:
+            value = doc.get(campo)
+            if value:
+                text = str(value)
+                yield doc, text[:max_chars] if len(text) > max_chars else text
+    finally:
+        cursor.close()
+
+def iter_field_texts(coleccion: str, campo: str, batch_size: int = CORPUS_BATCH_SIZE,
+                     max_chars: int = CORPUS_MAX_DOC_CHARS) -> Iterator[str]:
+    """Recorre solo los textos no vacíos de un campo (ver iter_field_documents)."""
+    for _, text in iter_field_documents(coleccion, campo, include_id=False, batch_size=batch_size,
+                                        max_chars=max_chars):
+        yield text
+
+class BoundedCounter:
+    """Contador de términos con un tope de vocabulario.
+
+    Al superar `max_terms` términos distintos se descartan los menos frecuentes hasta
+    quedar en la mitad del tope. `error_bound` acumula el mayor conteo descartado en cada
+    poda: ningún conteo está subestimado en más de ese valor (es 0 si nunca se podó).
+    """
+
+    def __init__(self, max_terms: int = CORPUS_MAX_VOCABULARY):
+        self.max_terms = max_terms
+        self.counts = Counter()
+        self.error_bound = 0
+
+    def update(self, tokens: Iterable[str]) -> None:
+        self.counts.update(tokens)
+        if len(self.counts) > self.max_terms:
+            self._prune()
+
+    def _prune(self) -> None:
+        ordered = self.counts.most_common()
+        keep = max(1, self.max_terms // 2)
+        self.error_bound += ordered[keep][1]
+        self.counts = Counter(dict(ordered[:keep]))
+        logger.warning(f"Vocabulario podado a {len(self.counts)} términos (cota de error {self.error_bound})")
+
+    def most_common(self, n: Optional[int] = None):
+        return self.counts.most_common(n)
+
+def count_field_terms(coleccion: str, campo: str, tokenize: Callable[[str], Iterable[str]],
+                      max_terms: int = CORPUS_MAX_VOCABULARY,
+                      batch_size: int = CORPUS_BATCH_SIZE, counter=None,
+                      progress: Optional[Callable[[int], None]] = None) -> Tuple[BoundedCounter, int]:
+    """
+    Cuenta los términos de un campo de una colección en streaming y con memoria acotada.
+
+    Args:
+        coleccion (str): Nombre de la colección
+        campo (str): Campo de texto a analizar
+        tokenize (callable): Función texto -> tokens ya filtrados
+        max_terms (int): Tope de términos distintos en memoria
+        batch_size (int): Documentos por lote del cursor
+        counter: Contador a usar en lugar de un BoundedCounter (p. ej. services.sketches.SpaceSaving)
+        progress (callable): Se llama con los documentos procesados tras cada documento
+
+    Returns:
+        tuple[BoundedCounter, int]: Conteos y número de documentos con texto
+    """
+    if counter is None:
+        counter = BoundedCounter(max_terms)
+    documentos = 0
+    for text in iter_field_texts(coleccion, campo, batch_size=batch_size):
+        documentos += 1
+        counter.update(tokenize(text))
+        if progress is not None:
+            progress(documentos)
+    return counter, documentos
@@ -3,6 +3,8 @@ from bson import ObjectId
 from models.producto_models import Entidad  # Cambiado de Producto a Entidad
 from typing import List, Dict, Optional
 from pymongo.errors import PyMongoError
+from services.collection_version_service import bump_collection_version
+from services.term_index_service import record_document_change, needs_previous_version
 import logging
 
 logging.basicConfig(
@@ -52,7 +54,10 @@ def insertar_entidad(coleccion: str, entidad: Entidad) -> Dict[str, str]:  # Cam
     logger.info(f"Insertando entidad en {coleccion}: {entidad.dict()}")
     try:
         coleccion_db = database.get_collection(coleccion)
-        resultado = coleccion_db.insert_one(entidad.dict())
+        documento = entidad.dict()
+        resultado = coleccion_db.insert_one(documento)
+        bump_collection_version(coleccion)
+        record_document_change(coleccion, None, documento)
         return {"id": str(resultado.inserted_id), "mensaje": "Entidad insertada correctamente"}
     except PyMongoError as e:
         logger.error(f"Error al insertar: {str(e)}", exc_info=True)
@@ -67,8 +72,12 @@ def actualizar_entidad(coleccion: str, entidad_id: str, entidad: Entidad) -> Dic
         datos_actualizados = {k: v for k, v in entidad.dict().items() if v is not None}
         if not datos_actualizados:
             return {"mensaje": "No hay datos para actualizar"}
+        documento_antes = coleccion_db.find_one({"_id": obj_id}) if needs_previous_version(coleccion) else None
         resultado = coleccion_db.update_one({"_id": obj_id}, {"$set": datos_actualizados})
         if resultado.matched_count > 0:
+            bump_collection_version(coleccion)
+            if documento_antes:
+                record_document_change(coleccion, documento_antes, {**documento_antes, **datos_actualizados})
             return {"mensaje": "Entidad actualizada correctamente"}
         return {"mensaje": "Entidad no encontrada"}
     except ValueError as ve:
@@ -90,6 +99,8 @@ def eliminar_entidad(coleccion: str, entidad_id: str) -> Dict[str, str]:
             return {"mensaje": "Entidad no encontrada"}
         resultado = coleccion_db.delete_one({"_id": obj_id})
         if resultado.deleted_count > 0:
+            bump_collection_version(coleccion)
+            record_document_change(coleccion, documento_antes, None)
             return {"mensaje": "Entidad eliminada correctamente"}
         raise EntidadServiceError(f"No se pudo eliminar la entidad: {entidad_id}")
     except ValueError as ve:
@@ -0,0 +1,184 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from bson import Binary
+from db.database import database
+
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Trabajos en segundo plano para análisis largos. El estado, el progreso, los resultados
+# parciales y la petición de cancelación viven en la colección 'jobs', así que cualquier
+# proceso de la API puede responder a GET /jobs/{id}; la ejecución ocurre en un pool de
+# hilos del proceso que recibió la petición.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_PROGRESS_INTERVAL = float(os.environ.get("JOB_PROGRESS_INTERVAL", "1.0"))
+# Un trabajo 'running' sin noticias durante este tiempo se da por interrumpido (p. ej. reinicio).
+# Mientras se ejecuta, un latido renueva updated_at aunque el trabajo no informe de progreso.
+JOB_STALE_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", "600"))
+JOB_HEARTBEAT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_SECONDS", "30"))
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+_executor = None
+
+class JobServiceError(Exception):
+    """Excepción personalizada para errores en el servicio de trabajos."""
+    pass
+
+class JobCancelled(Exception):
+    """Se lanza dentro de un trabajo cuando se ha pedido su cancelación."""
+    pass
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+    return _executor
+
+def shutdown_job_executor():
+    """Detiene el pool de trabajos (al apagar la aplicación); los trabajos en curso quedan interrumpidos."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+class JobProgress:
+    """Callback de progreso que recibe cada trabajo.
+
+    Guarda el avance y los resultados parciales como mucho una vez por intervalo y, en la
+    misma operación, comprueba si se pidió la cancelación (lanzando JobCancelled).
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self._last = 0.0
+
+    def __call__(self, processed: int, total: Optional[int] = None, partial: Optional[Dict] = None,
+                 force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last < JOB_PROGRESS_INTERVAL:
+            return
+        self._last = now
+        update = {"progress.processed": processed, "updated_at": datetime.utcnow()}
+        if total is not None:
+            update["progress.total"] = total
+        if partial is not None:
+            update["partial"] = partial
+        job = database["jobs"].find_one_and_update(
+            {"_id": self.job_id}, {"$set": update}, projection={"cancel_requested": 1}
+        )
+        if job and job.get("cancel_requested"):
+            raise JobCancelled()
+
+    def attach_file(self, content: bytes, media_type: str, filename: str) -> None:
+        """Guarda un fichero de resultado (p. ej. la imagen de una nube de palabras)."""
+        database["jobs"].update_one(
+            {"_id": self.job_id},
+            {"$set": {"file": {"content": Binary(content), "media_type": media_type, "filename": filename}}}
+        )
+
+def submit_job(job_type: str, params: Dict, owner: str, func: Callable[[JobProgress], Dict]) -> str:
+    """
+    Registra un trabajo y lo encola para ejecutarse en segundo plano.
+
+    Args:
+        job_type (str): Tipo de trabajo (p. ej. 'analyze-collection')
+        params (dict): Parámetros con que se lanzó, para mostrarlos en el estado
+        owner (str): Email del usuario que lo lanzó
+        func (callable): Función que recibe un JobProgress y devuelve el resultado
+
+    Returns:
+        str: Identificador del trabajo
+    """
+    job_id = uuid.uuid4().hex
+    now = datetime.utcnow()
+    database["jobs"].insert_one({
+        "_id": job_id,
+        "type": job_type,
+        "params": params,
+        "owner": owner,
+        "status": "pending",
+        "progress": {"processed": 0, "total": None},
+        "cancel_requested": False,
+        "created_at": now,
+        "updated_at": now
+    })
+    _get_executor().submit(_run_job, job_id, func)
+    logger.info(f"Trabajo {job_id} ({job_type}) encolado")
+    return job_id
+
+def _finish(job_id: str, fields: Dict) -> None:
+    # Solo si sigue en curso: no sobrescribir un trabajo que ya se dio por fallido
+    now = datetime.utcnow()
+    database["jobs"].update_one({"_id": job_id, "status": "running"},
+                                {"$set": {**fields, "finished_at": now, "updated_at": now}})
+
+def _heartbeat(job_id: str, stop: threading.Event) -> None:
+    """Renueva updated_at mientras el trabajo se ejecuta, informe o no de su progreso."""
+    while not stop.wait(JOB_HEARTBEAT_SECONDS):
+        try:
+            database["jobs"].update_one({"_id": job_id, "status": "running"},
+                                        {"$set": {"updated_at": datetime.utcnow()}})
+        except Exception as e:
+            logger.error(f"Error al renovar el latido del trabajo {job_id}: {str(e)}")
+
+def _run_job(job_id: str, func: Callable[[JobProgress], Dict]) -> None:
+    now = datetime.utcnow()
+    started = database["jobs"].update_one(
+        {"_id": job_id, "status": "pending"},
+        {"$set": {"status": "running", "started_at": now, "updated_at": now}}
+    )
+    if not started.modified_count:
+        # Cancelado antes de empezar
+        return
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(job_id, stop), name=f"job-heartbeat-{job_id}", daemon=True).start()
+    try:
+        result = func(JobProgress(job_id))
+        _finish(job_id, {"status": "completed", "result": result})
+        logger.info(f"Trabajo {job_id} completado")
+    except JobCancelled:
+        _finish(job_id, {"status": "cancelled"})
+        logger.info(f"Trabajo {job_id} cancelado")
+    except Exception as e:
+        logger.error(f"Error en el trabajo {job_id}: {str(e)}")
+        _finish(job_id, {"status": "failed", "error": str(e)})
+    finally:
+        stop.set()
+
+def get_job(job_id: str) -> Optional[Dict]:
+    """Estado de un trabajo (sin el contenido del fichero de resultado)."""
+    job = database["jobs"].find_one({"_id": job_id}, {"file.content": 0})
+    # Un trabajo 'pending' puede esperar en cola lo que haga falta; solo un 'running' sin
+    # latido reciente indica que el proceso que lo ejecutaba se detuvo
+    if job and job["status"] == 'running':
+        if job["updated_at"] < datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS):
+            error = "Trabajo interrumpido (sin progreso reciente)"
+            database["jobs"].update_one(
+                {"_id": job_id, "status": "running"},
+                {"$set": {"status": "failed", "error": error, "finished_at": datetime.utcnow()}}
+            )
+            job.update(status="failed", error=error)
+    return job
+
+def cancel_job(job_id: str) -> Optional[Dict]:
+    """Pide la cancelación de un trabajo: inmediata si no empezó, en el siguiente aviso de progreso si está en curso."""
+    database["jobs"].update_one(
+        {"_id": job_id, "status": "pending"},
+        {"$set": {"status": "cancelled", "cancel_requested": True, "finished_at": datetime.utcnow()}}
+    )
+    database["jobs"].update_one(
+        {"_id": job_id, "status": "running"},
+        {"$set": {"cancel_requested": True}}
+    )
+    return get_job(job_id)
+
+def get_job_file(job_id: str) -> Optional[Dict]:
+    """Fichero de resultado de un trabajo, si lo tiene."""
+    job = database["jobs"].find_one({"_id": job_id}, {"file": 1})
+    return job.get("file") if job else None
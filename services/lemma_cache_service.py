@@ -0,0 +1,61 @@
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, List, Tuple
+from pymongo import UpdateOne
+from db.database import database
+from services.spanish_stemmer import spanish_stemmer
+
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Resultado de lematizar cada documento, guardado en 'lemma_cache' junto al hash de su
+# texto: un nuevo análisis solo vuelve a lematizar los documentos cuyo texto cambió.
+# Las entradas caducan a los 30 días (índice TTL sobre updated_at, ver db/database.py) para
+# no acumular las de documentos borrados. LEMMA_RULES_VERSION invalida todo si cambia la
+# lematización, y la huella de la tabla de sufijos invalida los análisis en español si
+# se configuran otras reglas.
+LEMMA_CACHE_COLLECTION = "lemma_cache"
+LEMMA_RULES_VERSION = 1
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def analysis_id(coleccion: str, campo: str, language: str, remove_stopwords: bool, tokenizer: str = 'nltk') -> str:
+    """Identifica un tipo de análisis: el mismo texto da otro resultado si cambia algún parámetro."""
+    rules = f"v{LEMMA_RULES_VERSION}"
+    if language == 'spanish':
+        rules += f"-{spanish_stemmer.fingerprint}"
+    return f"{coleccion}|{campo}|{language}|{int(remove_stopwords)}|{tokenizer}|{rules}"
+
+def get_cached_lemmas(analysis: str, doc_ids: List[str]) -> Dict[str, Tuple[str, str]]:
+    """Entradas guardadas de un lote de documentos: doc_id -> (hash del texto, texto lematizado)."""
+    cursor = database[LEMMA_CACHE_COLLECTION].find(
+        {"_id": {"$in": [f"{analysis}|{doc_id}" for doc_id in doc_ids]}},
+        {"doc_id": 1, "content_hash": 1, "lemmatized_text": 1}
+    )
+    return {doc["doc_id"]: (doc["content_hash"], doc["lemmatized_text"]) for doc in cursor}
+
+def store_lemmas(coleccion: str, analysis: str, entries: List[Tuple[str, str, str]]) -> None:
+    """Guarda (doc_id, hash del texto, texto lematizado) de los documentos recién lematizados."""
+    if not entries:
+        return
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"_id": f"{analysis}|{doc_id}"},
+            {"$set": {"coleccion": coleccion, "analysis": analysis, "doc_id": doc_id, "content_hash": digest,
+                      "lemmatized_text": lemmatized, "tokens_count": len(lemmatized.split()), "updated_at": now}},
+            upsert=True
+        )
+        for doc_id, digest, lemmatized in entries
+    ]
+    try:
+        database[LEMMA_CACHE_COLLECTION].bulk_write(operations, ordered=False)
+    except Exception as e:
+        # Un fallo al guardar solo hace que la próxima vez se vuelvan a lematizar
+        logger.error(f"Error al guardar la caché de lematización de {coleccion}: {str(e)}")
+
+def drop_lemma_cache(coleccion: str) -> None:
+    """Elimina las entradas guardadas de una colección."""
+    database[LEMMA_CACHE_COLLECTION].delete_many({"coleccion": coleccion})
@@ -1,27 +1,64 @@
-import nltk
-from nltk.stem import WordNetLemmatizer
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
+import os
+import asyncio
+import functools
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from services.text_processing import get_tokenizer, filter_stopwords, get_lemmatizer
+from services.spanish_stemmer import spanish_stemmer
 import logging
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Descargar recursos necesarios si no existen
-try:
-    nltk.data.find('tokenizers/punkt')
-    nltk.data.find('corpora/wordnet')
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('punkt')
-    nltk.download('wordnet')
-    nltk.download('stopwords')
-
 class LemmatizationServiceError(Exception):
     """Excepción personalizada para errores en el servicio de lematización."""
     pass
 
-def lemmatize_text(text, language='english', remove_stopwords=True):
+# Pool de procesos para lematizar lotes grandes usando todos los núcleos
+LEMMATIZATION_WORKERS = int(os.environ.get("LEMMATIZATION_WORKERS", str(os.cpu_count() or 1)))
+LEMMATIZATION_CHUNK_SIZE = int(os.environ.get("LEMMATIZATION_CHUNK_SIZE", "200"))
+MAX_BATCH_TEXTS = int(os.environ.get("LEMMATIZATION_MAX_BATCH_TEXTS", "10000"))
+SUPPORTED_LANGUAGES = ('english', 'spanish')
+
+_lemmatization_pool = None
+
+# Los textos repiten mucho las mismas palabras: cada token se lematiza una sola vez
+# por proceso y el resultado se reutiliza (caché acotada, una por idioma)
+LEMMA_CACHE_SIZE = int(os.environ.get("LEMMA_CACHE_SIZE", "100000"))
+
+@functools.lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize_english_token(token):
+    """Lema de WordNet de un token en inglés."""
+    return get_lemmatizer().lemmatize(token)
+
+@functools.lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize_spanish_token(token):
+    """Lema aproximado de un token en español con reglas básicas de sufijos (ver services.spanish_stemmer)."""
+    return spanish_stemmer.stem(token)
+
+def get_lemma_cache_stats():
+    """
+    Estadísticas de las cachés de lemas de este proceso.
+    
+    Returns:
+        dict: Aciertos, fallos, tamaño y tasa de acierto por idioma
+    """
+    stats = {}
+    for language, func in (('english', lemmatize_english_token), ('spanish', lemmatize_spanish_token)):
+        info = func.cache_info()
+        lookups = info.hits + info.misses
+        stats[language] = {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "maxsize": info.maxsize,
+            "hit_rate": round(info.hits / lookups, 4) if lookups else 0.0
+        }
+    return stats
+
+def lemmatize_text(text, language='english', remove_stopwords=True, tokenizer='nltk'):
     """
     Lematiza un texto y opcionalmente elimina stopwords.
     
@@ -29,25 +66,26 @@ def lemmatize_text(text, language='english', remove_stopwords=True):
         text (str): Texto a lematizar
         language (str): Idioma del texto ('english' o 'spanish')
         remove_stopwords (bool): Si se deben eliminar stopwords
+        tokenizer (str): Tokenizador ('nltk' o 'regex', más rápido)
         
     Returns:
         str: Texto lematizado
     """
     try:
+        tokenize = get_tokenizer(tokenizer)
+        
         # Por ahora WordNet solo funciona bien con inglés,
         # para español usaremos un enfoque simplificado
         if language.lower() == 'english':
             # Tokenizar
-            tokens = word_tokenize(text.lower())
+            tokens = tokenize(text)
             
             # Stopwords
             if remove_stopwords:
-                stop_words = set(stopwords.words('english'))
-                tokens = [token for token in tokens if token not in stop_words]
+                tokens = filter_stopwords(tokens, 'english')
             
             # Lematizar
-            lemmatizer = WordNetLemmatizer()
-            lemmatized_tokens = [lemmatizer.lemmatize(token) for token in tokens]
+            lemmatized_tokens = [lemmatize_english_token(token) for token in tokens]
             
             # Unir tokens lematizados
             lemmatized_text = ' '.join(lemmatized_tokens)
@@ -58,36 +96,14 @@ def lemmatize_text(text, language='english', remove_stopwords=True):
             # Esto es una versión básica, idealmente se usaría spaCy o una librería específica para español
             
             # Tokenizar
-            tokens = word_tokenize(text.lower())
+            tokens = tokenize(text)
             
             # Stopwords
             if remove_stopwords:
-                stop_words = set(stopwords.words('spanish'))
-                tokens = [token for token in tokens if token not in stop_words]
+                tokens = filter_stopwords(tokens, 'spanish')
             
             # Reglas básicas de lematización para español
-            lemmatized_tokens = []
-            for token in tokens:
-                # Eliminación de plurales comunes
-                if token.endswith('es') and len(token) > 3:
-                    token = token[:-2]
-                elif token.endswith('s') and len(token) > 3:
-                    token = token[:-1]
-                
-                # Eliminación de diminutivos comunes
-                if token.endswith('ito') or token.endswith('ita'):
-                    token = token[:-3]
-                
-                # Eliminación de terminaciones verbales comunes
-                if len(token) > 4:
-                    if token.endswith('ando') or token.endswith('endo'):
-                        token = token[:-4]
-                    elif token.endswith('ar') or token.endswith('er') or token.endswith('ir'):
-                        token = token[:-2]
-                    elif token.endswith('aba') or token.endswith('ada'):
-                        token = token[:-3]
-                
-                lemmatized_tokens.append(token)
+            lemmatized_tokens = [lemmatize_spanish_token(token) for token in tokens]
             
             # Unir tokens lematizados
             lemmatized_text = ' '.join(lemmatized_tokens)
@@ -98,4 +114,195 @@ def lemmatize_text(text, language='english', remove_stopwords=True):
     
     except Exception as e:
         logger.error(f"Error al lematizar texto: {str(e)}")
-        raise LemmatizationServiceError(f"Error al lematizar texto: {str(e)}")
\ No newline at end of file
+        raise LemmatizationServiceError(f"Error al lematizar texto: {str(e)}")
+
+def _init_lemmatization_worker():
+    """Inicializador de cada worker: carga una vez los datos de NLTK (Punkt, WordNet, stopwords)."""
+    for language in SUPPORTED_LANGUAGES:
+        lemmatize_text("warm up running tests", language)
+
+def _ping_worker():
+    return os.getpid()
+
+def lemmatize_chunk(texts, language='english', remove_stopwords=True, tokenizer='nltk'):
+    """Lematiza una lista de textos (se ejecuta dentro de un worker del pool)."""
+    return [lemmatize_text(text, language, remove_stopwords, tokenizer) for text in texts]
+
+def _get_lemmatization_pool() -> ProcessPoolExecutor:
+    global _lemmatization_pool
+    if _lemmatization_pool is None:
+        # 'spawn' evita heredar por fork el cliente de MongoDB y los hilos del proceso principal
+        _lemmatization_pool = ProcessPoolExecutor(
+            max_workers=LEMMATIZATION_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_lemmatization_worker
+        )
+        logger.info(f"Pool de lematización iniciado con {LEMMATIZATION_WORKERS} procesos")
+    return _lemmatization_pool
+
+async def warm_up_lemmatization_pool():
+    """Arranca todos los workers del pool para que la primera petición no pague su inicialización."""
+    loop = asyncio.get_running_loop()
+    pool = _get_lemmatization_pool()
+    pids = await asyncio.gather(*(loop.run_in_executor(pool, _ping_worker) for _ in range(LEMMATIZATION_WORKERS)))
+    logger.info(f"Pool de lematización precalentado ({len(set(pids))} procesos)")
+
+def shutdown_lemmatization_pool():
+    """Detiene el pool de lematización (al apagar la aplicación)."""
+    global _lemmatization_pool
+    if _lemmatization_pool is not None:
+        _lemmatization_pool.shutdown(wait=False, cancel_futures=True)
+        _lemmatization_pool = None
+
+async def lemmatize_batch(texts, language='english', remove_stopwords=True, tokenizer='nltk'):
+    """
+    Lematiza muchos textos repartiéndolos en bloques entre los procesos del pool.
+    
+    Args:
+        texts (list[str]): Textos a lematizar
+        language (str): Idioma de los textos ('english' o 'spanish')
+        remove_stopwords (bool): Si se deben eliminar stopwords
+        tokenizer (str): Tokenizador ('nltk' o 'regex')
+        
+    Returns:
+        list[str]: Textos lematizados, en el mismo orden recibido
+    """
+    global _lemmatization_pool
+    if not texts:
+        return []
+    # Bloques pequeños si el lote es corto, para repartirlo igualmente entre todos los procesos
+    chunk_size = max(1, min(LEMMATIZATION_CHUNK_SIZE, -(-len(texts) // LEMMATIZATION_WORKERS)))
+    loop = asyncio.get_running_loop()
+    pool = _get_lemmatization_pool()
+    try:
+        chunks = await asyncio.gather(*(
+            loop.run_in_executor(
+                pool, lemmatize_chunk, texts[start:start + chunk_size], language, remove_stopwords, tokenizer
+            )
+            for start in range(0, len(texts), chunk_size)
+        ))
+    except BrokenProcessPool:
+        # Un worker murió (p. ej. por memoria): se recrea el pool para las siguientes peticiones
+        logger.error("El pool de lematización se rompió, se reiniciará")
+        _lemmatization_pool = None
+        raise LemmatizationServiceError("El pool de lematización se detuvo durante el lote")
+    return list(itertools.chain.from_iterable(chunks))
+
+def read_collection_texts(coleccion, campo='description', limit=MAX_BATCH_TEXTS):
+    """
+    Lee hasta `limit` textos de un campo de una colección con un cursor proyectado.
+    
+    Returns:
+        tuple[list[str], list[str]]: Identificadores de los documentos y sus textos
+    """
+    # Import local: los workers del pool importan este módulo y no deben conectarse a MongoDB
+    from services.corpus_reader import iter_field_documents
+    
+    ids, texts = [], []
+    for doc, text in itertools.islice(iter_field_documents(coleccion, campo), limit):
+        ids.append(str(doc["_id"]))
+        texts.append(text)
+    return ids, texts
+
+SAMPLE_TOKENS = 20
+
+def analyze_collection(coleccion, campo='description', language='spanish', remove_stopwords=True, incremental=True,
+                       tokenizer='nltk', progress=None):
+    """
+    Lematiza los textos de un campo de una colección y calcula estadísticas de tokens.
+    
+    Recorre la colección con un cursor proyectado y solo guarda contadores, conteos de
+    distintos (exactos o HyperLogLog por encima de un umbral) y una muestra fija, así que
+    la memoria no depende del tamaño de la colección. En modo incremental, los documentos
+    cuyo texto no cambió desde el último análisis se toman de la caché de lematización.
+    
+    Args:
+        coleccion (str): Nombre de la colección
+        campo (str): Campo de texto a analizar
+        language (str): Idioma del texto ('english' o 'spanish')
+        remove_stopwords (bool): Si se deben eliminar stopwords
+        incremental (bool): Si se reutilizan los resultados guardados de análisis anteriores
+        tokenizer (str): Tokenizador ('nltk' o 'regex')
+        progress (callable): Se llama tras cada lote con (procesados, total, estadísticas parciales)
+        
+    Returns:
+        dict: Estadísticas de la colección
+    """
+    # Import local: los workers del pool importan este módulo y no deben conectarse a MongoDB
+    from db.database import database
+    from services.corpus_reader import iter_field_documents, CORPUS_BATCH_SIZE
+    from services.sketches import DistinctCounter
+    from services.lemma_cache_service import analysis_id, content_hash, get_cached_lemmas, store_lemmas
+    
+    total_docs = database[coleccion].count_documents({})
+    docs_with_field = 0
+    total_original = 0
+    total_lemmatized = 0
+    unique_original = DistinctCounter()
+    unique_lemmatized = DistinctCounter()
+    sample_original = []
+    sample_lemmatized = []
+    relemmatized = 0
+    analysis = analysis_id(coleccion, campo, language.lower(), remove_stopwords, tokenizer)
+    
+    def process(batch):
+        nonlocal docs_with_field, total_original, total_lemmatized, relemmatized
+        cached = get_cached_lemmas(analysis, [doc_id for doc_id, _ in batch]) if incremental else {}
+        new_entries = []
+        for doc_id, text in batch:
+            docs_with_field += 1
+            
+            # Contar tokens originales
+            original_tokens = text.split()
+            total_original += len(original_tokens)
+            unique_original.update(original_tokens)
+            if len(sample_original) < SAMPLE_TOKENS:
+                sample_original.extend(original_tokens[:SAMPLE_TOKENS - len(sample_original)])
+            
+            # Lematizar solo si el texto cambió desde el último análisis
+            digest = content_hash(text)
+            entry = cached.get(doc_id)
+            if entry is not None and entry[0] == digest:
+                lemmatized = entry[1]
+            else:
+                lemmatized = lemmatize_text(text, language, remove_stopwords, tokenizer)
+                new_entries.append((doc_id, digest, lemmatized))
+                relemmatized += 1
+            lemmatized_tokens = lemmatized.split()
+            total_lemmatized += len(lemmatized_tokens)
+            unique_lemmatized.update(lemmatized_tokens)
+            if len(sample_lemmatized) < SAMPLE_TOKENS:
+                sample_lemmatized.extend(lemmatized_tokens[:SAMPLE_TOKENS - len(sample_lemmatized)])
+        store_lemmas(coleccion, analysis, new_entries)
+    
+    def snapshot():
+        return {
+            "coleccion": coleccion,
+            "campo": campo,
+            "total_documentos": total_docs,
+            "documentos_con_texto": docs_with_field,
+            "total_tokens_originales": total_original,
+            "total_tokens_lematizados": total_lemmatized,
+            "reduccion_porcentaje": round((1 - total_lemmatized / max(1, total_original)) * 100, 2),
+            "tokens_unicos_originales": len(unique_original),
+            "tokens_unicos_lematizados": len(unique_lemmatized),
+            # False si algún conteo de distintos superó el umbral y es una estimación
+            "tokens_unicos_exactos": unique_original.exact and unique_lemmatized.exact,
+            "muestra_tokens_originales": sample_original,
+            "muestra_tokens_lematizados": sample_lemmatized,
+            "documentos_relematizados": relemmatized,
+            "documentos_desde_cache": docs_with_field - relemmatized,
+        }
+    
+    batch = []
+    for doc, text in iter_field_documents(coleccion, campo):
+        batch.append((str(doc["_id"]), text))
+        if len(batch) >= CORPUS_BATCH_SIZE:
+            process(batch)
+            batch = []
+            if progress is not None:
+                progress(docs_with_field, total_docs, snapshot())
+    if batch:
+        process(batch)
+    
+    return snapshot()
@@ -1,20 +1,118 @@
 import os
-import requests
+import asyncio
+import httpx
 import secrets
+import time
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from urllib.parse import urlencode
+from datetime import datetime
 from fastapi import HTTPException
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from jose import JWTError, jwt
 from db.database import database
-from auth import get_password_hash
+from auth import OAUTH_ONLY_PASSWORD
+from services.oauth_state_store import create_state_store
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Configuración del cliente HTTP hacia los proveedores
+OAUTH_HTTP_TIMEOUT = float(os.environ.get("OAUTH_HTTP_TIMEOUT", "10"))
+OAUTH_HTTP_RETRIES = int(os.environ.get("OAUTH_HTTP_RETRIES", "2"))
+OAUTH_HTTP_BACKOFF = float(os.environ.get("OAUTH_HTTP_BACKOFF", "0.3"))
+RETRYABLE_STATUS = {502, 503, 504}
+
+# Vida por defecto de documentos de discovery/JWKS sin cabecera Cache-Control
+OIDC_DEFAULT_MAX_AGE = int(os.environ.get("OIDC_DEFAULT_MAX_AGE", "3600"))
+
 class OAuthServiceError(Exception):
     """Excepción personalizada para errores en el servicio OAuth."""
     pass
 
+# Cliente compartido: reutiliza conexiones TLS (keep-alive) entre logins
+_http_client: Optional[httpx.AsyncClient] = None
+
+def _http2_available() -> bool:
+    """HTTP/2 requiere el paquete opcional 'h2' (httpx[http2])."""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def get_http_client() -> httpx.AsyncClient:
+    """Devuelve el cliente HTTP asíncrono compartido, creándolo si hace falta."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=_http2_available(),
+            timeout=httpx.Timeout(OAUTH_HTTP_TIMEOUT, connect=5.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60),
+            headers={'Accept': 'application/json'}
+        )
+    return _http_client
+
+async def close_http_client() -> None:
+    """Cierra el cliente compartido (al apagar la aplicación)."""
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
+
+async def _request_with_retry(method: str, url: str, idempotent: bool = True, **kwargs) -> httpx.Response:
+    """Realiza una petición con reintentos y backoff exponencial.
+
+    Las peticiones no idempotentes (p. ej. el canje de un código de un solo uso) solo se
+    reintentan si la conexión no llegó a establecerse.
+    """
+    client = get_http_client()
+    for attempt in range(OAUTH_HTTP_RETRIES + 1):
+        last_attempt = attempt == OAUTH_HTTP_RETRIES
+        try:
+            response = await client.request(method, url, **kwargs)
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+            if last_attempt:
+                raise
+        except httpx.TransportError:
+            if last_attempt or not idempotent:
+                raise
+        else:
+            if response.status_code not in RETRYABLE_STATUS or last_attempt or not idempotent:
+                response.raise_for_status()
+                return response
+        delay = OAUTH_HTTP_BACKOFF * (2 ** attempt)
+        logger.warning(f"Reintentando {method} {url} en {delay:.2f}s (intento {attempt + 1})")
+        await asyncio.sleep(delay)
+
+# Caché de documentos JSON de los proveedores (discovery OIDC y JWKS): url -> (expira, datos)
+_json_cache: Dict[str, Tuple[float, Any]] = {}
+
+def _cache_max_age(response: httpx.Response) -> int:
+    """Segundos de vida según la cabecera Cache-Control de la respuesta."""
+    for directive in response.headers.get('cache-control', '').split(','):
+        directive = directive.strip().lower()
+        if directive in ('no-store', 'no-cache'):
+            return 0
+        if directive.startswith('max-age='):
+            try:
+                return int(directive.split('=', 1)[1])
+            except ValueError:
+                break
+    return OIDC_DEFAULT_MAX_AGE
+
+async def _get_cached_json(url: str, force_refresh: bool = False) -> Any:
+    """Descarga un documento JSON respetando su tiempo de vida HTTP."""
+    now = time.monotonic()
+    cached = _json_cache.get(url)
+    if cached and not force_refresh and cached[0] > now:
+        return cached[1]
+    response = await _request_with_retry('GET', url)
+    data = response.json()
+    _json_cache[url] = (now + _cache_max_age(response), data)
+    return data
+
 class OAuthService:
     def __init__(self):
         # Configuración de OAuth para diferentes proveedores
@@ -26,6 +124,7 @@ class OAuthService:
         'auth_url': 'https://accounts.google.com/o/oauth2/v2/auth',
         'token_url': 'https://oauth2.googleapis.com/token',
         'user_info_url': 'https://www.googleapis.com/oauth2/v2/userinfo',
+        'discovery_url': 'https://accounts.google.com/.well-known/openid-configuration',
         'scope': 'openid email profile'
     },
     'github': {
@@ -53,13 +152,14 @@ class OAuthService:
         'auth_url': 'https://login.microsoftonline.com/common/oauth2/v2.0/authorize',
         'token_url': 'https://login.microsoftonline.com/common/oauth2/v2.0/token',
         'user_info_url': 'https://graph.microsoft.com/v1.0/me',
+        'discovery_url': 'https://login.microsoftonline.com/common/v2.0/.well-known/openid-configuration',
         'scope': 'openid email profile'
     }
 }
         
         
-        # Store para estados OAuth (en producción usar Redis o similar)
-        self.state_store = {}
+        # Store para estados OAuth con expiración (memoria o MongoDB según OAUTH_STATE_BACKEND)
+        self.state_store = create_state_store()
 
     def get_authorization_url(self, provider: str) -> str:
         """Genera la URL de autorización para un proveedor OAuth."""
@@ -70,10 +170,10 @@ class OAuthService:
         state = secrets.token_urlsafe(32)
         
         # Guardar estado para validación posterior
-        self.state_store[state] = {
+        self.state_store.put(state, {
             'provider': provider,
-            'timestamp': requests.utils.default_user_agent()
-        }
+            'created_at': time.time()
+        })
         
         params = {
             'client_id': config['client_id'],
@@ -92,21 +192,19 @@ class OAuthService:
         
         return auth_url
 
-    def exchange_code_for_token(self, provider: str, code: str, state: str) -> Dict[str, Any]:
+    async def exchange_code_for_token(self, provider: str, code: str, state: str) -> Dict[str, Any]:
         """Intercambia el código de autorización por un token de acceso."""
         if provider not in self.providers:
             raise OAuthServiceError(f"Proveedor '{provider}' no soportado")
         
-        # Validar estado
-        if state not in self.state_store:
-            raise OAuthServiceError("Estado OAuth inválido")
+        # Validar estado (se consume al leerlo, es de un solo uso)
+        state_data = self.state_store.pop(state)
+        if state_data is None:
+            raise OAuthServiceError("Estado OAuth inválido o expirado")
         
-        if self.state_store[state]['provider'] != provider:
+        if state_data['provider'] != provider:
             raise OAuthServiceError("Estado OAuth no coincide con el proveedor")
         
-        # Limpiar estado usado
-        del self.state_store[state]
-        
         config = self.providers[provider]
         
         token_data = {
@@ -127,13 +225,13 @@ class OAuthService:
             headers['Accept'] = 'application/json'
         
         try:
-            response = requests.post(
+            response = await _request_with_retry(
+                'POST',
                 config['token_url'],
+                idempotent=False,
                 data=token_data,
-                headers=headers,
-                timeout=10
+                headers=headers
             )
-            response.raise_for_status()
             
             token_info = response.json()
             
@@ -143,11 +241,11 @@ class OAuthService:
             logger.info(f"Token obtenido exitosamente para {provider}")
             return token_info
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Error al obtener token para {provider}: {str(e)}")
             raise OAuthServiceError(f"Error al obtener token: {str(e)}")
 
-    def get_user_info(self, provider: str, access_token: str) -> Dict[str, Any]:
+    async def get_user_info(self, provider: str, access_token: str) -> Dict[str, Any]:
         """Obtiene información del usuario usando el token de acceso."""
         if provider not in self.providers:
             raise OAuthServiceError(f"Proveedor '{provider}' no soportado")
@@ -165,13 +263,12 @@ class OAuthService:
             params['fields'] = 'id,name,email,picture'
         
         try:
-            response = requests.get(
+            response = await _request_with_retry(
+                'GET',
                 config['user_info_url'],
                 headers=headers,
-                params=params,
-                timeout=10
+                params=params
             )
-            response.raise_for_status()
             
             user_info = response.json()
             
@@ -181,10 +278,94 @@ class OAuthService:
             logger.info(f"Información de usuario obtenida para {provider}: {normalized_user['email']}")
             return normalized_user
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Error al obtener información de usuario para {provider}: {str(e)}")
             raise OAuthServiceError(f"Error al obtener información de usuario: {str(e)}")
 
+    async def get_user_from_id_token(self, provider: str, id_token: str, access_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Verifica localmente el id_token OIDC y devuelve el usuario normalizado.
+
+        Devuelve None si el proveedor no publica discovery, si no se pudieron obtener sus
+        claves o si el token no trae los datos necesarios; en ese caso se debe usar
+        get_user_info. Un token con firma o claims inválidos lanza OAuthServiceError.
+        """
+        config = self.providers.get(provider, {})
+        if not config.get('discovery_url'):
+            return None
+        
+        try:
+            discovery = await _get_cached_json(config['discovery_url'])
+            header = jwt.get_unverified_header(id_token)
+            jwks = await _get_cached_json(discovery['jwks_uri'])
+            key = self._find_jwk(jwks, header.get('kid'))
+            if key is None:
+                # El proveedor pudo rotar sus claves antes de que expire nuestra copia
+                jwks = await _get_cached_json(discovery['jwks_uri'], force_refresh=True)
+                key = self._find_jwk(jwks, header.get('kid'))
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            logger.warning(f"No se pudo obtener discovery/JWKS de {provider}, se usará userinfo: {str(e)}")
+            return None
+        except JWTError as e:
+            raise OAuthServiceError(f"id_token inválido: {str(e)}")
+        
+        if key is None:
+            raise OAuthServiceError("id_token firmado con una clave desconocida")
+        
+        algorithms = discovery.get('id_token_signing_alg_values_supported', ['RS256'])
+        try:
+            claims = jwt.decode(
+                id_token,
+                key,
+                algorithms=[alg for alg in algorithms if alg != 'none'],
+                audience=config['client_id'],
+                access_token=access_token,
+                # El emisor de Microsoft depende del tenant, se valida abajo
+                options={'verify_iss': False}
+            )
+        except JWTError as e:
+            raise OAuthServiceError(f"id_token inválido: {str(e)}")
+        
+        issuer = discovery['issuer'].replace('{tenantid}', str(claims.get('tid', '')))
+        if claims.get('iss') not in (issuer, issuer.replace('https://', '', 1)):
+            raise OAuthServiceError("id_token con emisor inválido")
+        
+        normalized = self._normalize_id_token_claims(provider, claims)
+        if normalized:
+            logger.info(f"id_token verificado localmente para {provider}: {normalized['email']}")
+        return normalized
+
+    @staticmethod
+    def _find_jwk(jwks: Dict[str, Any], kid: Optional[str]) -> Optional[Dict[str, Any]]:
+        for key in jwks.get('keys', []):
+            if key.get('kid') == kid:
+                return key
+        return None
+
+    def _normalize_id_token_claims(self, provider: str, claims: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Normaliza los claims del id_token; None si faltan email o nombre."""
+        if provider == 'google':
+            email = claims.get('email', '')
+            provider_id = claims.get('sub', '')
+        elif provider == 'microsoft':
+            email = claims.get('email') or claims.get('preferred_username', '')
+            # 'oid' es el mismo identificador que devuelve Graph en /me
+            provider_id = claims.get('oid') or claims.get('sub', '')
+        else:
+            return None
+        
+        name = claims.get('name', '')
+        if not email or not name:
+            return None
+        
+        return {
+            'provider': provider,
+            'provider_id': str(provider_id),
+            'email': email,
+            'name': name,
+            'picture': claims.get('picture', ''),
+            'raw_data': claims
+        }
+
     def _normalize_user_data(self, provider: str, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """Normaliza los datos de usuario según el proveedor."""
         normalized = {
@@ -237,49 +418,40 @@ class OAuthService:
             if not email:
                 raise OAuthServiceError("El email es requerido")
             
-            # Buscar usuario existente por email
-            existing_user = database["users"].find_one({"email": email})
-            
-            if existing_user:
-                # Actualizar usuario existente con información OAuth
-                update_data = {
+            now = datetime.utcnow()
+            update = {
+                "$set": {
                     f"oauth_{provider}": {
                         'provider_id': provider_id,
                         'name': user_data['name'],
                         'picture': user_data['picture'],
-                        'last_login': requests.utils.default_user_agent()
+                        'last_login': now
                     }
-                }
-                
-                database["users"].update_one(
-                    {"email": email},
-                    {"$set": update_data}
-                )
-                
-                logger.info(f"Usuario actualizado con OAuth {provider}: {email}")
-                return existing_user
-            else:
-                # Crear nuevo usuario
-                new_user = {
-                    "email": email,
-                    "hashed_password": get_password_hash(secrets.token_urlsafe(32)),  # Password temporal
+                },
+                # Solo para usuarios nuevos: sin contraseña utilizable, solo login OAuth
+                "$setOnInsert": {
+                    "hashed_password": OAUTH_ONLY_PASSWORD,
                     "disabled": False,
                     "created_via": f"oauth_{provider}",
                     "name": user_data['name'],
                     "picture": user_data['picture'],
-                    f"oauth_{provider}": {
-                        'provider_id': provider_id,
-                        'name': user_data['name'],
-                        'picture': user_data['picture'],
-                        'last_login': requests.utils.default_user_agent()
-                    }
+                    "created_at": now
                 }
-                
-                result = database["users"].insert_one(new_user)
-                new_user["_id"] = result.inserted_id
-                
-                logger.info(f"Nuevo usuario creado con OAuth {provider}: {email}")
-                return new_user
+            }
+            
+            # Un único viaje a la base de datos para crear o actualizar
+            try:
+                user = database["users"].find_one_and_update(
+                    {"email": email}, update, upsert=True, return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # Un login simultáneo creó el usuario primero: basta con actualizarlo
+                user = database["users"].find_one_and_update(
+                    {"email": email}, update, return_document=ReturnDocument.AFTER
+                )
+            
+            logger.info(f"Usuario creado/actualizado con OAuth {provider}: {email}")
+            return user
                 
         except Exception as e:
             logger.error(f"Error al crear/actualizar usuario OAuth: {str(e)}")
@@ -0,0 +1,122 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Configuración del almacén de estados OAuth
+OAUTH_STATE_BACKEND = os.environ.get("OAUTH_STATE_BACKEND", "memory")  # 'memory' o 'mongo'
+OAUTH_STATE_TTL_SECONDS = int(os.environ.get("OAUTH_STATE_TTL_SECONDS", "600"))
+OAUTH_STATE_MAX_SIZE = int(os.environ.get("OAUTH_STATE_MAX_SIZE", "10000"))
+OAUTH_STATE_SWEEP_SECONDS = int(os.environ.get("OAUTH_STATE_SWEEP_SECONDS", "60"))
+
+class MemoryStateStore:
+    """Estados OAuth en memoria con expiración, tamaño máximo y barrido en segundo plano.
+
+    Solo sirve cuando el callback llega al mismo proceso que generó el estado
+    (un único worker de uvicorn).
+    """
+
+    def __init__(self, ttl_seconds: int = OAUTH_STATE_TTL_SECONDS, max_size: int = OAUTH_STATE_MAX_SIZE,
+                 sweep_seconds: int = OAUTH_STATE_SWEEP_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.sweep_seconds = sweep_seconds
+        # Orden de inserción == orden de expiración, porque el TTL es constante
+        self._items: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+
+    def put(self, state: str, data: Dict[str, Any]) -> None:
+        self._ensure_sweeper()
+        with self._lock:
+            self._items[state] = (time.monotonic() + self.ttl_seconds, data)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                logger.warning("Almacén de estados OAuth lleno, se descarta el estado más antiguo")
+
+    def pop(self, state: str) -> Optional[Dict[str, Any]]:
+        """Obtiene y elimina un estado (uso único). Devuelve None si no existe o expiró."""
+        with self._lock:
+            item = self._items.pop(state, None)
+        if item is None or item[0] < time.monotonic():
+            return None
+        return item[1]
+
+    def sweep(self) -> int:
+        """Elimina los estados expirados y devuelve cuántos se eliminaron."""
+        now = time.monotonic()
+        removed = 0
+        with self._lock:
+            while self._items:
+                state, (expires_at, _) = next(iter(self._items.items()))
+                if expires_at >= now:
+                    break
+                del self._items[state]
+                removed += 1
+        if removed:
+            logger.debug(f"Estados OAuth expirados eliminados: {removed}")
+        return removed
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _ensure_sweeper(self) -> None:
+        if self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name="oauth-state-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while True:
+            time.sleep(self.sweep_seconds)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Error al barrer estados OAuth: {str(e)}")
+
+class MongoStateStore:
+    """Estados OAuth en una colección con índice TTL, compartidos entre workers y nodos."""
+
+    def __init__(self, collection_name: str = "oauth_states", ttl_seconds: int = OAUTH_STATE_TTL_SECONDS):
+        from db.database import database
+
+        self.ttl_seconds = ttl_seconds
+        self.collection = database[collection_name]
+        # MongoDB elimina los documentos vencidos; pop() además ignora los que aún no se han barrido
+        self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def put(self, state: str, data: Dict[str, Any]) -> None:
+        self.collection.insert_one({
+            "_id": state,
+            "data": data,
+            "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
+        })
+
+    def pop(self, state: str) -> Optional[Dict[str, Any]]:
+        """Obtiene y elimina un estado de forma atómica (uso único)."""
+        doc = self.collection.find_one_and_delete({"_id": state, "expires_at": {"$gt": datetime.utcnow()}})
+        return doc["data"] if doc else None
+
+    def sweep(self) -> int:
+        result = self.collection.delete_many({"expires_at": {"$lte": datetime.utcnow()}})
+        return result.deleted_count
+
+    def __len__(self) -> int:
+        return self.collection.estimated_document_count()
+
+def create_state_store():
+    """Crea el almacén de estados según OAUTH_STATE_BACKEND."""
+    if OAUTH_STATE_BACKEND == "mongo":
+        logger.info("Usando MongoDB como almacén de estados OAuth")
+        return MongoStateStore()
+    if OAUTH_STATE_BACKEND != "memory":
+        logger.warning(f"Backend de estados OAuth desconocido '{OAUTH_STATE_BACKEND}', se usa memoria")
+    return MemoryStateStore()
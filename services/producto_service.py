@@ -3,6 +3,8 @@ from bson import ObjectId
 from models.producto_models import Producto
 from typing import List, Dict, Optional
 from pymongo.errors import PyMongoError
+from services.collection_version_service import bump_collection_version
+from services.term_index_service import record_document_change, needs_previous_version
 import logging
 
 # Configuración de logging detallada
@@ -66,7 +68,10 @@ def insertar_producto(nombre_coleccion: str, producto: Producto) -> Dict[str, st
     logger.info(f"Insertando producto en colección: {nombre_coleccion} - {producto.dict()}")
     try:
         coleccion = database.get_collection(nombre_coleccion)
-        resultado = coleccion.insert_one(producto.dict())
+        documento = producto.dict()
+        resultado = coleccion.insert_one(documento)
+        bump_collection_version(nombre_coleccion)
+        record_document_change(nombre_coleccion, None, documento)
         logger.info(f"Producto insertado con ID: {resultado.inserted_id}")
         return {
             "id": str(resultado.inserted_id),
@@ -99,10 +104,14 @@ def actualizar_producto(nombre_coleccion: str, producto_id: str, producto: Produ
             logger.warning(f"No hay datos para actualizar en producto {producto_id}")
             return {"mensaje": "No hay datos para actualizar"}
             
+        documento_antes = coleccion.find_one({"_id": obj_id}) if needs_previous_version(nombre_coleccion) else None
         resultado = coleccion.update_one({"_id": obj_id}, {"$set": datos_actualizados})
         logger.info(f"Resultado de update_one: matched_count={resultado.matched_count}, modified_count={resultado.modified_count}")
         
         if resultado.matched_count > 0:
+            bump_collection_version(nombre_coleccion)
+            if documento_antes:
+                record_document_change(nombre_coleccion, documento_antes, {**documento_antes, **datos_actualizados})
             logger.info(f"Producto actualizado con ID: {producto_id}")
             return {"mensaje": "Producto actualizado correctamente"}
         logger.info(f"Producto no encontrado para actualización con ID: {producto_id}")
@@ -141,6 +150,8 @@ def eliminar_producto(nombre_coleccion: str, producto_id: str) -> Dict[str, str]
         logger.debug(f"Documento después de eliminar: {documento_despues}")
         
         if resultado.deleted_count > 0 and documento_despues is None:
+            bump_collection_version(nombre_coleccion)
+            record_document_change(nombre_coleccion, documento_antes, None)
             logger.info(f"Producto eliminado con ID: {producto_id}")
             return {"mensaje": "Producto eliminado correctamente"}
         else:
@@ -2,13 +2,6 @@ import subprocess
 import os
 import shutil
 import tempfile
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import pandas as pd
 import json
 import datetime
 import logging
@@ -16,7 +9,8 @@ import io
 import time
 from pymongo import MongoClient
 from db.database import database
-from webdriver_manager.chrome import ChromeDriverManager
+from services.term_index_service import record_documents_inserted, mark_term_indexes_stale
+from services.collection_version_service import bump_collection_version
 import sys
 
 
@@ -37,6 +31,7 @@ def check_rpa_dependencies():
         
         # Verificar Chrome usando webdriver_manager
         try:
+            from webdriver_manager.chrome import ChromeDriverManager
             chrome_path = "Gestionado automáticamente por webdriver_manager"
             chromedriver_path = ChromeDriverManager().install()
             logger.info(f"ChromeDriver instalado en: {chromedriver_path}")
@@ -90,6 +85,16 @@ def scrape_data_automated(url, selector_type="css", selector_value=None, wait_ti
     """
     logger.info(f"Iniciando scraping automatizado de: {url}")
     
+    # Selenium, webdriver_manager y pandas se importan al usarlos para no cargarlos al arrancar la API
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from webdriver_manager.chrome import ChromeDriverManager
+    import pandas as pd
+    
     options = Options()
     options.add_argument("--headless")
     options.add_argument("--no-sandbox")
@@ -269,6 +274,7 @@ def automate_data_entry(collection_name, data_source, field_mappings=None):
         dict: Resultado de la operación
     """
     logger.info(f"Iniciando automatización de entrada de datos a colección: {collection_name}")
+    import pandas as pd
     
     try:
         # Determinar el tipo de origen de datos
@@ -320,7 +326,15 @@ def automate_data_entry(collection_name, data_source, field_mappings=None):
         
         # Insertar en MongoDB
         collection = database[collection_name]
-        result = collection.insert_many(records)
+        try:
+            result = collection.insert_many(records)
+        except Exception:
+            # Una inserción parcial deja los índices de términos sin saber qué documentos entraron
+            bump_collection_version(collection_name)
+            mark_term_indexes_stale(collection_name)
+            raise
+        bump_collection_version(collection_name)
+        record_documents_inserted(collection_name, records)
         
         logger.info(f"Se insertaron {len(result.inserted_ids)} registros en la colección {collection_name}")
         
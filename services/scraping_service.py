@@ -4,7 +4,6 @@ from openpyxl import Workbook
 import io
 import logging
 from urllib.parse import urljoin
-import pandas as pd
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -15,6 +14,9 @@ class ScrapingServiceError(Exception):
 
 def scrape_website(url: str) -> tuple[io.BytesIO, str]:
     """Realiza scraping de una página web y retorna el contenido como un archivo Excel en memoria."""
+    # pandas se importa al usarlo para no cargarlo al arrancar la API
+    import pandas as pd
+    
     try:
         # Realizar la solicitud HTTP
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
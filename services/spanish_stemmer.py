@@ -0,0 +1,109 @@
+import os
+import json
+import hashlib
+from collections import namedtuple
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+
+# Reglas de sufijos del lematizador simplificado para español, como datos. Cada etapa se
+# aplica una vez, en orden, sobre el resultado de la anterior; dentro de una etapa gana
+# la primera regla (en orden de la tabla) cuyo sufijo coincide y cuya condición de
+# longitud se cumple: se quitan `strip` caracteres si len(token) > min_length.
+SuffixRule = namedtuple("SuffixRule", ["suffix", "strip", "min_length"])
+
+SPANISH_SUFFIX_RULES = (
+    # Plurales comunes
+    (SuffixRule("es", 2, 3), SuffixRule("s", 1, 3)),
+    # Diminutivos comunes
+    (SuffixRule("ito", 3, 0), SuffixRule("ita", 3, 0)),
+    # Terminaciones verbales comunes
+    (SuffixRule("ando", 4, 4), SuffixRule("endo", 4, 4),
+     SuffixRule("ar", 2, 4), SuffixRule("er", 2, 4), SuffixRule("ir", 2, 4),
+     SuffixRule("aba", 3, 4), SuffixRule("ada", 3, 4)),
+)
+
+# Fichero JSON opcional con otra tabla: [[["es", 2, 3], ["s", 1, 3]], [["ito", 3, 0], ...], ...]
+SPANISH_SUFFIX_RULES_FILE = os.environ.get("SPANISH_SUFFIX_RULES_FILE")
+
+# Tokens distintos cuyo resultado se recuerda; al llenarse la memoria se vacía entera
+SPANISH_STEMMER_CACHE_SIZE = int(os.environ.get("SPANISH_STEMMER_CACHE_SIZE", "100000"))
+
+def load_rules(path: str):
+    """Carga una tabla de reglas desde un fichero JSON."""
+    with open(path, encoding='utf-8') as f:
+        return tuple(tuple(SuffixRule(*rule) for rule in stage) for stage in json.load(f))
+
+class SuffixStemmer:
+    """Quita sufijos según una tabla de reglas compilada en tablas de búsqueda por sufijo.
+
+    Cada etapa se compila en la tupla de sus sufijos, con la que `str.endswith` descarta
+    en una sola llamada los tokens a los que no se aplica ninguna regla, y en un
+    diccionario indexado por los últimos N caracteres para cada longitud de sufijo de la
+    etapa. Como el vocabulario se repite mucho, los resultados se recuerdan por token.
+    """
+
+    def __init__(self, stages: Sequence[Sequence[SuffixRule]] = SPANISH_SUFFIX_RULES,
+                 cache_size: int = SPANISH_STEMMER_CACHE_SIZE):
+        self.stages = tuple(tuple(SuffixRule(*rule) for rule in stage) for stage in stages)
+        self._tables = [self._compile(stage) for stage in self.stages]
+        self._cache: Dict[str, str] = {}
+        self._cache_size = cache_size
+        serialized = json.dumps([[list(rule) for rule in stage] for stage in self.stages])
+        # Identifica la tabla, para invalidar resultados guardados si cambian las reglas
+        self.fingerprint = hashlib.sha1(serialized.encode('utf-8')).hexdigest()[:12]
+
+    @staticmethod
+    def _compile(stage: Sequence[SuffixRule]) -> Tuple[Tuple[str, ...], Tuple[int, ...], Dict]:
+        by_suffix: Dict[str, List[Tuple[int, SuffixRule]]] = {}
+        for priority, rule in enumerate(stage):
+            by_suffix.setdefault(rule.suffix, []).append((priority, rule))
+        lengths = tuple(sorted({len(rule.suffix) for rule in stage}))
+        return tuple(rule.suffix for rule in stage), lengths, by_suffix
+
+    def _stem(self, token: str) -> str:
+        # Búsqueda en línea (sin una llamada por etapa): es el camino caliente sin memoria
+        for suffixes, lengths, by_suffix in self._tables:
+            if not token.endswith(suffixes):
+                continue
+            best = None
+            length = len(token)
+            for size in lengths:
+                if size > length:
+                    break
+                for priority, rule in by_suffix.get(token[length - size:], ()):
+                    if length > rule.min_length:
+                        if best is None or priority < best[0]:
+                            best = (priority, rule)
+                        break
+            if best is not None and best[1].strip:
+                token = token[:-best[1].strip]
+        return token
+
+    def stem(self, token: str) -> str:
+        stem = self._cache.get(token)
+        if stem is None:
+            stem = self._stem(token)
+            if self._cache_size > 0:
+                if len(self._cache) >= self._cache_size:
+                    self._cache.clear()
+                self._cache[token] = stem
+        return stem
+
+    def stem_array(self, tokens) -> np.ndarray:
+        """Aplica las reglas a un vector de tokens procesando cada token distinto una sola vez."""
+        values = np.asarray(tokens, dtype=object)
+        if values.size == 0:
+            return values
+        unique, inverse = np.unique(values, return_inverse=True)
+        stems = np.array([self.stem(token) for token in unique], dtype=object)
+        return stems[inverse.reshape(values.shape)]
+
+    def stem_series(self, series):
+        """Versión de `stem_array` para una serie de pandas (conserva índice y nombre)."""
+        return type(series)(self.stem_array(series.to_numpy(dtype=object)), index=series.index, name=series.name)
+
+    def stem_many(self, tokens: Sequence[str]) -> List[str]:
+        return self.stem_array(tokens).tolist()
+
+spanish_stemmer = SuffixStemmer(load_rules(SPANISH_SUFFIX_RULES_FILE) if SPANISH_SUFFIX_RULES_FILE
+                                else SPANISH_SUFFIX_RULES)
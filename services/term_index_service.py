@@ -0,0 +1,322 @@
+import os
+import re
+import sys
+import time
+import uuid
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from pymongo import UpdateOne, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from db.database import database
+from services.text_processing import regex_tokenize, filter_stopwords
+from services.corpus_reader import count_field_terms
+from services.collection_version_service import get_write_version
+
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Índice persistente de frecuencias de términos por (colección, campo, idioma).
+# 'term_index' guarda un documento por término y 'term_index_meta' uno por índice. Cada
+# construcción escribe en una generación nueva ("<índice>|<id>") y la meta apunta a la
+# vigente en 'current', así que los lectores nunca ven un índice a medio llenar.
+# 'source_version' guarda la versión de escritura de la colección con la que el índice
+# está al día; si la colección cambia por otra vía (escrituras durante la construcción,
+# ediciones directas que alteran el número de documentos) el índice se reconstruye.
+# TERM_INDEX_MODE decide quién lo mantiene al día: 'service' (las escrituras hechas a
+# través de los servicios) o 'change_stream' (un proceso aparte con watch_collection).
+TERM_INDEX_MODE = os.environ.get("TERM_INDEX_MODE", "service")
+TERM_INDEX_BATCH_SIZE = 1000
+META_CACHE_SECONDS = 10
+# Una construcción que no termina en este tiempo se da por abandonada y otra puede reclamarla
+TERM_INDEX_BUILD_TIMEOUT = int(os.environ.get("TERM_INDEX_BUILD_TIMEOUT", "3600"))
+
+class TermIndexServiceError(Exception):
+    """Excepción personalizada para errores en el índice de términos."""
+    pass
+
+class TermIndexBuildInProgress(TermIndexServiceError):
+    """Otro proceso está construyendo el mismo índice."""
+    pass
+
+_meta_cache: Dict[str, Tuple[float, List[Dict]]] = {}
+
+def _stopwords_language(language: str) -> str:
+    return 'english' if language == 'english' else 'spanish'
+
+def _index_id(coleccion: str, campo: str, language: str) -> str:
+    return f"{coleccion}|{campo}|{_stopwords_language(language)}"
+
+def _generation(meta: Dict) -> str:
+    """Identificador con que están guardados los términos vigentes de un índice."""
+    # Los índices creados antes de las generaciones guardan sus términos con el id de la meta
+    return meta.get("current", meta["_id"])
+
+def count_terms(text, language: str) -> Counter:
+    """Frecuencias de los términos de un texto (tokenizado y sin stopwords)."""
+    if not text:
+        return Counter()
+    return Counter(filter_stopwords(regex_tokenize(str(text)), _stopwords_language(language)))
+
+def indexed_fields(coleccion: str) -> List[Dict]:
+    """Índices listos para una colección (con una caché breve para no consultar en cada escritura)."""
+    now = time.monotonic()
+    cached = _meta_cache.get(coleccion)
+    if cached and cached[0] > now:
+        return cached[1]
+    metas = list(database["term_index_meta"].find({"coleccion": coleccion, "status": "ready"}))
+    _meta_cache[coleccion] = (now + META_CACHE_SECONDS, metas)
+    return metas
+
+def _claim_build(index_id: str, coleccion: str, campo: str, language: str) -> Optional[str]:
+    """Reclama la construcción de un índice; devuelve el token del reclamo o None si ya hay otra en curso."""
+    token = uuid.uuid4().hex
+    now = datetime.utcnow()
+    try:
+        database["term_index_meta"].find_one_and_update(
+            {"_id": index_id, "$or": [{"building": None},
+                                      {"building.started_at": {"$lt": now - timedelta(seconds=TERM_INDEX_BUILD_TIMEOUT)}}]},
+            {"$set": {"coleccion": coleccion, "campo": campo, "language": _stopwords_language(language),
+                      "building": {"token": token, "started_at": now}}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # La meta existe pero no cumple el filtro: otra construcción la tiene reclamada
+        return None
+    return token
+
+def build_term_index(coleccion: str, campo: str = 'description', language: str = 'spanish') -> Dict:
+    """
+    Construye (o reconstruye) el índice recorriendo la colección completa.
+
+    Solo un proceso construye cada índice a la vez (TermIndexBuildInProgress si ya hay
+    otro). Los términos se escriben en una generación nueva y la meta pasa a apuntarla al
+    terminar; mientras tanto se sigue sirviendo la anterior. Las escrituras que lleguen
+    durante la construcción no se aplican a la generación nueva: si la versión de la
+    colección cambió entre el inicio y el final, el índice queda 'stale' y se vuelve a
+    construir en la siguiente consulta.
+
+    Returns:
+        dict: Metadatos del índice
+    """
+    index_id = _index_id(coleccion, campo, language)
+    meta = database["term_index_meta"]
+    terms = database["term_index"]
+    token = _claim_build(index_id, coleccion, campo, language)
+    if token is None:
+        raise TermIndexBuildInProgress(f"El índice de términos {index_id} ya se está construyendo")
+    generation = f"{index_id}|{token}"
+    try:
+        logger.info(f"Construyendo índice de términos {index_id}")
+        source_version = get_write_version(coleccion)
+        # Conteo exacto, sin tope de vocabulario: el índice se guarda como exacto y después
+        # se mantiene con deltas, así que un conteo podado quedaría mal para siempre
+        counter, documentos = count_field_terms(coleccion, campo, lambda text: count_terms(text, language),
+                                                max_terms=sys.maxsize)
+        counts = counter.counts
+
+        batch = []
+        for term, count in counts.items():
+            batch.append({"index": generation, "term": term, "count": count, "length": len(term)})
+            if len(batch) >= TERM_INDEX_BATCH_SIZE:
+                terms.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            terms.insert_many(batch, ordered=False)
+
+        status = "ready"
+        if get_write_version(coleccion) != source_version:
+            status = "stale"
+            logger.warning(f"La colección {coleccion} cambió durante la construcción del índice {index_id}; "
+                           "se reconstruirá en la siguiente consulta")
+        info = {"status": status, "current": generation, "source_version": source_version, "documentos": documentos,
+                "terminos": len(counts), "built_at": datetime.utcnow()}
+        previous = meta.find_one_and_update(
+            {"_id": index_id, "building.token": token},
+            {"$set": info, "$unset": {"building": ""}},
+            return_document=ReturnDocument.BEFORE
+        )
+        if previous is None:
+            # Otra construcción reclamó el índice por tiempo agotado: descartar esta
+            terms.delete_many({"index": generation})
+            raise TermIndexServiceError("La construcción se dio por abandonada antes de terminar")
+        old_generation = _generation(previous)
+        if old_generation != generation:
+            terms.delete_many({"index": old_generation})
+        _meta_cache.pop(coleccion, None)
+        logger.info(f"Índice {index_id} construido: {documentos} documentos, {len(counts)} términos")
+        return {"_id": index_id, "coleccion": coleccion, "campo": campo, **info}
+    except Exception as e:
+        logger.error(f"Error al construir el índice de términos {index_id}: {str(e)}")
+        meta.update_one({"_id": index_id, "building.token": token}, {"$unset": {"building": ""}})
+        terms.delete_many({"index": generation})
+        if isinstance(e, TermIndexServiceError):
+            raise
+        raise TermIndexServiceError(f"Error al construir el índice de términos: {str(e)}")
+
+def has_term_index(coleccion: str, campo: str = 'description', language: str = 'spanish') -> bool:
+    """Indica si el índice ya se construyó alguna vez (aunque ahora esté obsoleto)."""
+    return database["term_index_meta"].find_one(
+        {"_id": _index_id(coleccion, campo, language),
+         "$or": [{"current": {"$exists": True}}, {"status": {"$in": ["ready", "stale"]}}]},
+        {"_id": 1}
+    ) is not None
+
+def ensure_term_index(coleccion: str, campo: str = 'description', language: str = 'spanish') -> Optional[Dict]:
+    """
+    Meta del índice al día, construyéndolo la primera vez que se consulta o si está obsoleto:
+    marcado 'stale' o, en modo 'service', con una versión de escritura distinta de la de la
+    colección (escrituras que no pasaron por los servicios). En modo 'change_stream' esas
+    escrituras las aplica el consumidor, que va por detrás de la versión.
+
+    Returns None si otro proceso lo está construyendo y no hay una versión lista que servir.
+    """
+    index_id = _index_id(coleccion, campo, language)
+    existing = database["term_index_meta"].find_one({"_id": index_id})
+    if existing and existing.get("status") == "ready":
+        if TERM_INDEX_MODE != "service" or existing.get("source_version") == get_write_version(coleccion):
+            return existing
+        logger.info(f"La colección {coleccion} cambió fuera de los servicios; reconstruyendo el índice {index_id}")
+    try:
+        return build_term_index(coleccion, campo, language)
+    except TermIndexBuildInProgress:
+        return None
+
+def top_terms(coleccion: str, campo: str = 'description', language: str = 'spanish',
+              top_n: int = 20, min_length: int = 0) -> List[Tuple[str, int]]:
+    """Términos más frecuentes a partir de los conteos precalculados."""
+    meta = ensure_term_index(coleccion, campo, language)
+    if meta is None:
+        # Índice en construcción por otra petición: contar ahora en lugar de esperarla
+        logger.info(f"Índice {_index_id(coleccion, campo, language)} en construcción; conteo directo")
+        counter, _ = count_field_terms(coleccion, campo, lambda text: count_terms(text, language))
+        counts = ((term, count) for term, count in counter.most_common() if len(term) > min_length)
+        return [pair for _, pair in zip(range(top_n), counts)]
+    query = {"index": _generation(meta)}
+    if min_length:
+        query["length"] = {"$gt": min_length}
+    cursor = database["term_index"].find(query, {"term": 1, "count": 1, "_id": 0})
+    return [(doc["term"], doc["count"]) for doc in cursor.sort("count", DESCENDING).limit(top_n)]
+
+def _apply_delta(index_id: str, delta: Counter) -> None:
+    """Suma a los conteos de un índice las diferencias de `delta` (positivas o negativas)."""
+    operations = [
+        UpdateOne(
+            {"index": index_id, "term": term},
+            {"$inc": {"count": change}, "$setOnInsert": {"length": len(term)}},
+            upsert=True
+        )
+        for term, change in delta.items() if change
+    ]
+    if operations:
+        database["term_index"].bulk_write(operations, ordered=False)
+        database["term_index"].delete_many({"index": index_id, "count": {"$lte": 0}})
+
+def _mark_synced(coleccion: str, metas: List[Dict]) -> None:
+    """Registra que los índices incluyen las escrituras hasta la versión actual de la colección."""
+    if metas:
+        database["term_index_meta"].update_many(
+            {"_id": {"$in": [meta["_id"] for meta in metas]}, "status": "ready"},
+            {"$set": {"source_version": get_write_version(coleccion)}}
+        )
+
+def apply_document_change(coleccion: str, before: Optional[Dict], after: Optional[Dict]) -> None:
+    """Aplica al índice la diferencia de términos entre dos versiones de un documento."""
+    metas = indexed_fields(coleccion)
+    for meta in metas:
+        campo, language = meta["campo"], meta["language"]
+        delta = count_terms((after or {}).get(campo), language)
+        delta.subtract(count_terms((before or {}).get(campo), language))
+        _apply_delta(_generation(meta), delta)
+    _mark_synced(coleccion, metas)
+
+def apply_documents_inserted(coleccion: str, documents: List[Dict]) -> None:
+    """Suma al índice los términos de muchos documentos nuevos con una sola escritura por índice."""
+    metas = indexed_fields(coleccion)
+    for meta in metas:
+        campo, language = meta["campo"], meta["language"]
+        delta = Counter()
+        for document in documents:
+            delta.update(count_terms(document.get(campo), language))
+        _apply_delta(_generation(meta), delta)
+    _mark_synced(coleccion, metas)
+
+def mark_term_indexes_stale(coleccion: str) -> None:
+    """Marca los índices de una colección para que se reconstruyan en la siguiente consulta."""
+    try:
+        database["term_index_meta"].update_many({"coleccion": coleccion, "status": "ready"},
+                                                {"$set": {"status": "stale"}})
+        _meta_cache.pop(coleccion, None)
+    except Exception as e:
+        logger.error(f"Error al marcar como obsoletos los índices de términos de {coleccion}: {str(e)}")
+
+def needs_previous_version(coleccion: str) -> bool:
+    """Indica si una escritura debe leer antes el documento para actualizar los índices."""
+    if TERM_INDEX_MODE != "service":
+        return False
+    try:
+        return bool(indexed_fields(coleccion))
+    except Exception as e:
+        logger.error(f"Error al consultar los índices de términos de {coleccion}: {str(e)}")
+        return False
+
+def record_document_change(coleccion: str, before: Optional[Dict], after: Optional[Dict]) -> None:
+    """Hook para la capa de servicios: actualiza los índices sin hacer fallar la escritura."""
+    if TERM_INDEX_MODE != "service":
+        return
+    try:
+        apply_document_change(coleccion, before, after)
+    except Exception as e:
+        logger.error(f"Error al actualizar el índice de términos de {coleccion}: {str(e)}")
+        mark_term_indexes_stale(coleccion)
+
+def record_documents_inserted(coleccion: str, documents: List[Dict]) -> None:
+    """Hook para inserciones masivas (p. ej. RPA); si falla, los índices quedan para reconstruir."""
+    if TERM_INDEX_MODE != "service":
+        return
+    try:
+        apply_documents_inserted(coleccion, documents)
+    except Exception as e:
+        logger.error(f"Error al actualizar el índice de términos de {coleccion}: {str(e)}")
+        mark_term_indexes_stale(coleccion)
+
+def drop_term_indexes(coleccion: str) -> None:
+    """Elimina todos los índices de términos de una colección."""
+    for meta in database["term_index_meta"].find({"coleccion": coleccion}, {"_id": 1}):
+        # Todas las generaciones, incluida una construcción en curso
+        database["term_index"].delete_many({"index": meta["_id"]})
+        database["term_index"].delete_many({"index": {"$regex": f"^{re.escape(meta['_id'])}\\|"}})
+    database["term_index_meta"].delete_many({"coleccion": coleccion})
+    _meta_cache.pop(coleccion, None)
+
+def watch_collection(coleccion: str) -> None:
+    """
+    Consumidor de change streams que mantiene los índices de una colección.
+
+    Requiere un replica set y, para actualizaciones y borrados, que la colección tenga
+    activadas las pre-imágenes (changeStreamPreAndPostImages).
+    """
+    logger.info(f"Escuchando cambios en {coleccion} para el índice de términos")
+    with database[coleccion].watch(full_document='updateLookup',
+                                   full_document_before_change='whenAvailable') as stream:
+        for change in stream:
+            operation = change["operationType"]
+            if operation == "drop":
+                drop_term_indexes(coleccion)
+                continue
+            if operation not in ("insert", "update", "replace", "delete"):
+                continue
+            before = change.get("fullDocumentBeforeChange")
+            after = change.get("fullDocument") if operation != "delete" else None
+            if operation != "insert" and before is None:
+                logger.warning(f"Cambio sin pre-imagen en {coleccion}; reconstruya el índice para corregirlo")
+                continue
+            apply_document_change(coleccion, before, after)
+
+if __name__ == "__main__":
+    # Uso: TERM_INDEX_MODE=change_stream python -m services.term_index_service <coleccion>
+    if len(sys.argv) != 2:
+        print("Uso: python -m services.term_index_service <coleccion>")
+        sys.exit(1)
+    watch_collection(sys.argv[1])
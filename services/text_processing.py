@@ -0,0 +1,94 @@
+import re
+import threading
+import logging
+from typing import Callable, Dict, FrozenSet, List
+
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Pipeline de texto compartido por los servicios de nube de palabras y lematización.
+# Los recursos costosos (stopwords, lematizador, expresiones regulares) se construyen
+# una sola vez por proceso y se reutilizan en cada llamada. NLTK se importa en el primer
+# uso; sus datos se descargan y verifican aparte con `python preflight.py`.
+
+# Recursos de NLTK que usa la API: (ruta para nltk.data.find, paquete para nltk.download)
+NLTK_RESOURCES = (
+    ('corpora/stopwords', 'stopwords'),
+    ('corpora/wordnet', 'wordnet'),
+    ('corpora/omw-1.4', 'omw-1.4'),
+    ('tokenizers/punkt', 'punkt'),
+    ('tokenizers/punkt_tab', 'punkt_tab'),
+)
+
+# Palabra: letras (incluidas tildes y ñ), dígitos o '_', con guiones o apóstrofos internos
+TOKEN_PATTERN = re.compile(r"\w+(?:[-']\w+)*")
+
+_stopwords: Dict[str, FrozenSet[str]] = {}
+_lemmatizer = None
+_lock = threading.Lock()
+
+def get_stopwords(language: str) -> FrozenSet[str]:
+    """Stopwords de NLTK para un idioma, cargadas una vez y congeladas."""
+    language = language.lower()
+    words = _stopwords.get(language)
+    if words is None:
+        from nltk.corpus import stopwords
+        words = frozenset(stopwords.words(language))
+        _stopwords[language] = words
+    return words
+
+def get_lemmatizer():
+    """Instancia compartida del lematizador de WordNet."""
+    global _lemmatizer
+    if _lemmatizer is None:
+        with _lock:
+            if _lemmatizer is None:
+                from nltk.stem import WordNetLemmatizer
+                _lemmatizer = WordNetLemmatizer()
+    return _lemmatizer
+
+def regex_tokenize(text: str) -> List[str]:
+    """Tokeniza en minúsculas con la expresión regular precompilada."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+def nltk_tokenize(text: str) -> List[str]:
+    """Tokeniza en minúsculas con `word_tokenize` de NLTK (Punkt + Treebank)."""
+    from nltk.tokenize import word_tokenize
+    return word_tokenize(text.lower())
+
+# Tokenizadores seleccionables: 'regex' es el rápido; 'nltk' separa además contracciones
+# y signos de puntuación como tokens (Treebank)
+TOKENIZERS: Dict[str, Callable[[str], List[str]]] = {'regex': regex_tokenize, 'nltk': nltk_tokenize}
+
+def get_tokenizer(name: str) -> Callable[[str], List[str]]:
+    """Tokenizador por nombre ('regex' o 'nltk')."""
+    tokenizer = TOKENIZERS.get(name)
+    if tokenizer is None:
+        raise ValueError(f"Tokenizador no soportado: {name}")
+    return tokenizer
+
+def filter_stopwords(tokens: List[str], language: str, min_length: int = 0) -> List[str]:
+    """Elimina stopwords y, opcionalmente, tokens de longitud menor o igual a `min_length`."""
+    stop_words = get_stopwords(language)
+    if min_length:
+        return [token for token in tokens if token not in stop_words and len(token) > min_length]
+    return [token for token in tokens if token not in stop_words]
+
+def missing_nltk_resources() -> List[str]:
+    """Paquetes de NLTK_RESOURCES que no están instalados."""
+    import nltk
+    missing = []
+    for path, package in NLTK_RESOURCES:
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(package)
+    return missing
+
+def warm_up_text_processing() -> None:
+    """Carga por adelantado stopwords, Punkt y WordNet (WordNet se carga perezosamente en el primer lema)."""
+    for language in ('spanish', 'english'):
+        get_stopwords(language)
+    nltk_tokenize("Warm up.")
+    get_lemmatizer().lemmatize("tests")
+    logger.info("Pipeline de texto precalentado")
@@ -0,0 +1,173 @@
+import os
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from services.text_processing import regex_tokenize, filter_stopwords
+from services.corpus_reader import iter_field_documents
+from services.cloudwords_cache import cache_key
+from services.collection_version_service import get_collection_version
+
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Modelos TF-IDF ajustados en memoria, indexados por la versión de la colección:
+# una escritura cambia la versión y el siguiente análisis vuelve a ajustar el modelo.
+TFIDF_CACHE_SIZE = int(os.environ.get("TFIDF_CACHE_SIZE", "4"))
+TFIDF_MAX_NGRAM = 3
+TFIDF_MAX_FEATURES = int(os.environ.get("TFIDF_MAX_FEATURES", "100000"))
+
+class TfidfServiceError(Exception):
+    """Excepción personalizada para errores en el análisis TF-IDF."""
+    pass
+
+class TfidfModel:
+    """Matriz TF-IDF dispersa (formato COO, filas contiguas y normalizadas con L2)."""
+
+    def __init__(self, labels, terms, idf, rows, cols, values, documentos):
+        self.labels = labels
+        self.terms = terms
+        self.idf = idf
+        self.rows = rows
+        self.cols = cols
+        self.values = values
+        self.documentos = documentos
+        self.bounds = np.searchsorted(rows, np.arange(len(labels) + 1))
+
+    def top_terms(self, row: int, top_n: int) -> List[Dict]:
+        start, end = self.bounds[row], self.bounds[row + 1]
+        cols, values = self.cols[start:end], self.values[start:end]
+        order = np.lexsort((cols, -values))[:top_n]
+        return [{"term": self.terms[cols[i]], "score": round(float(values[i]), 6)} for i in order]
+
+_models: "OrderedDict[str, TfidfModel]" = OrderedDict()
+_models_lock = threading.Lock()
+
+def _ngrams(tokens: List[str], ngram_max: int) -> List[str]:
+    grams = list(tokens)
+    for n in range(2, ngram_max + 1):
+        grams.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+    return grams
+
+def fit_tfidf(coleccion: str, campo: str = 'description', language: str = 'spanish', ngram_max: int = 1,
+              group_by: Optional[str] = None, min_df: int = 1,
+              max_features: int = TFIDF_MAX_FEATURES) -> TfidfModel:
+    """
+    Ajusta un modelo TF-IDF recorriendo la colección con un cursor proyectado.
+
+    Cada documento (o cada grupo, si se indica `group_by`) es una fila. Los términos son
+    n-gramas de 1 a `ngram_max` palabras de más de 2 caracteres, formados tras quitar
+    las stopwords. El idf es suavizado, `ln((1 + n) / (1 + df)) + 1`, y cada fila se
+    normaliza con L2.
+    """
+    stopwords_language = 'english' if language == 'english' else 'spanish'
+    vocabulary: Dict[str, int] = {}
+    labels: List = []
+    label_rows: Dict = {}
+    # Pares (fila, término) acumulados en arrays compactos en lugar de listas de objetos
+    row_ids, term_ids = array('q'), array('q')
+    documentos = 0
+
+    extra_fields = (group_by,) if group_by else ()
+    for doc, text in iter_field_documents(coleccion, campo, extra_fields=extra_fields, include_id=not group_by):
+        documentos += 1
+        if group_by:
+            value = doc.get(group_by)
+            label = str(value) if value is not None else None
+            row = label_rows.get(label)
+            if row is None:
+                row = label_rows[label] = len(labels)
+                labels.append(label)
+        else:
+            row = len(labels)
+            labels.append(str(doc["_id"]))
+        grams = _ngrams(filter_stopwords(regex_tokenize(text), stopwords_language, min_length=2), ngram_max)
+        term_ids.extend(vocabulary.setdefault(gram, len(vocabulary)) for gram in grams)
+        row_ids.extend([row] * len(grams))
+
+    n_rows, n_terms = len(labels), len(vocabulary)
+    rows = np.frombuffer(row_ids, dtype=np.int64) if row_ids else np.zeros(0, dtype=np.int64)
+    cols = np.frombuffer(term_ids, dtype=np.int64) if term_ids else np.zeros(0, dtype=np.int64)
+    keys, counts = np.unique(rows * max(n_terms, 1) + cols, return_counts=True)
+    rows, cols = np.divmod(keys, max(n_terms, 1))
+
+    # Frecuencia documental y poda del vocabulario (min_df y los max_features más frecuentes)
+    df = np.bincount(cols, minlength=n_terms)
+    keep = df >= min_df
+    if keep.sum() > max_features:
+        keep[np.argsort(-df, kind='stable')[max_features:]] = False
+    kept_terms = np.nonzero(keep)[0]
+    remap = np.full(n_terms, -1, dtype=np.int64)
+    remap[kept_terms] = np.arange(len(kept_terms))
+    mask = keep[cols]
+    rows, cols, counts = rows[mask], remap[cols[mask]], counts[mask]
+
+    words = list(vocabulary)
+    terms = [words[i] for i in kept_terms]
+    idf = np.log((1 + n_rows) / (1 + df[kept_terms])) + 1
+    values = counts * idf[cols]
+    norms = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=n_rows))
+    values = values / np.where(norms > 0, norms, 1)[rows]
+
+    logger.info(f"Modelo TF-IDF de {coleccion}.{campo}: {n_rows} filas, {len(terms)} términos")
+    return TfidfModel(labels, terms, idf, rows, cols, values, documentos)
+
+def get_tfidf_model(coleccion: str, campo: str = 'description', language: str = 'spanish', ngram_max: int = 1,
+                    group_by: Optional[str] = None, min_df: int = 1,
+                    max_features: int = TFIDF_MAX_FEATURES) -> TfidfModel:
+    """Modelo ajustado desde la caché o, si la colección cambió, ajustado de nuevo."""
+    key = cache_key("tfidf", coleccion, get_collection_version(coleccion), campo,
+                    'english' if language == 'english' else 'spanish', ngram_max, group_by, min_df, max_features)
+    with _models_lock:
+        model = _models.get(key)
+        if model is not None:
+            _models.move_to_end(key)
+            return model
+    model = fit_tfidf(coleccion, campo, language, ngram_max, group_by, min_df, max_features)
+    with _models_lock:
+        _models[key] = model
+        while len(_models) > TFIDF_CACHE_SIZE:
+            _models.popitem(last=False)
+    return model
+
+def get_distinctive_terms(coleccion: str, campo: str = 'description', language: str = 'spanish',
+                          ngram_max: int = 1, group_by: Optional[str] = None, top_n: int = 10,
+                          min_df: int = 1, skip: int = 0, limit: int = 100) -> Dict:
+    """
+    Obtiene los términos más distintivos (mayor TF-IDF) por documento o por grupo.
+
+    Args:
+        coleccion (str): Nombre de la colección
+        campo (str): Campo de texto a analizar
+        language (str): Idioma para filtrar stopwords ('spanish' o 'english')
+        ngram_max (int): Longitud máxima de los n-gramas (1 a 3)
+        group_by (str): Campo por el que agrupar los documentos (opcional)
+        top_n (int): Términos a retornar por documento o grupo
+        min_df (int): Mínimo de documentos o grupos en que debe aparecer un término
+        skip (int): Filas a saltar (paginación)
+        limit (int): Máximo de filas a retornar
+
+    Returns:
+        dict: Resumen del modelo y los términos distintivos de cada fila
+    """
+    try:
+        model = get_tfidf_model(coleccion, campo, language, ngram_max, group_by, min_df)
+        page = range(skip, min(skip + limit, len(model.labels)))
+        return {
+            "coleccion": coleccion,
+            "campo": campo,
+            "group_by": group_by,
+            "ngram_max": ngram_max,
+            "documentos": model.documentos,
+            "filas": len(model.labels),
+            "vocabulario": len(model.terms),
+            "resultados": [
+                {"grupo" if group_by else "id": model.labels[row], "terms": model.top_terms(row, top_n)}
+                for row in page
+            ]
+        }
+    except Exception as e:
+        logger.error(f"Error en el análisis TF-IDF de {coleccion}: {str(e)}")
+        raise TfidfServiceError(f"Error en el análisis TF-IDF: {str(e)}")
@@ -0,0 +1,58 @@
+import io
+from typing import Dict, Optional
+
+# Este módulo se ejecuta en los procesos del pool de renderizado: solo depende de
+# wordcloud y Pillow (sin matplotlib, sin MongoDB) para que los workers arranquen rápido.
+# Ambos se importan al renderizar, así que el proceso de la API no los carga al arrancar.
+
+TITLE_HEIGHT = 40
+TITLE_FONT_SIZE = 20
+IMAGE_FORMATS = {'png': 'PNG', 'webp': 'WEBP'}
+
+def render_wordcloud(text: Optional[str] = None, frequencies: Optional[Dict[str, float]] = None,
+                     title: str = '', width: int = 800, height: int = 400, image_format: str = 'png') -> bytes:
+    """
+    Renderiza una nube de palabras y la codifica directamente a PNG o WebP.
+
+    Args:
+        text (str): Texto ya filtrado (se ignora si se pasan frecuencias)
+        frequencies (dict): Frecuencias precalculadas palabra -> peso
+        title (str): Título dibujado sobre la imagen
+        width (int): Ancho de la nube
+        height (int): Alto de la nube
+        image_format (str): 'png' o 'webp'
+
+    Returns:
+        bytes: Imagen codificada
+    """
+    from PIL import Image, ImageDraw, ImageFont
+    from wordcloud import WordCloud
+    from wordcloud.wordcloud import FONT_PATH
+    
+    wordcloud = WordCloud(
+        width=width,
+        height=height,
+        background_color='white',
+        colormap='viridis',
+        max_words=200,
+        contour_width=1,
+        contour_color='steelblue'
+    )
+    if frequencies is not None:
+        wordcloud.generate_from_frequencies(frequencies)
+    else:
+        wordcloud.generate(text)
+    image = wordcloud.to_image()
+
+    if title:
+        canvas = Image.new('RGB', (width, height + TITLE_HEIGHT), 'white')
+        canvas.paste(image, (0, TITLE_HEIGHT))
+        draw = ImageDraw.Draw(canvas)
+        font = ImageFont.truetype(FONT_PATH, TITLE_FONT_SIZE)
+        text_width = draw.textlength(title, font=font)
+        draw.text(((width - text_width) / 2, (TITLE_HEIGHT - TITLE_FONT_SIZE) / 2), title, fill='black', font=font)
+        image = canvas
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=IMAGE_FORMATS[image_format])
+    return buffer.getvalue()
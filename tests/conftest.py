@@ -0,0 +1,21 @@
+import sys
+import types
+from pathlib import Path
+import mongomock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Las pruebas no necesitan un MongoDB: db.database se sustituye por una base en memoria
+# antes de que ningún módulo lo importe (el real se conecta al importarse).
+_fake_database = types.ModuleType("db.database")
+_fake_database.client = mongomock.MongoClient()
+_fake_database.database = _fake_database.client["test"]
+_fake_database.database["users"].create_index("email", unique=True)
+_fake_database.USERS_EMAIL_UNIQUE_INDEX = True
+sys.modules["db.database"] = _fake_database
+
+# pymongo >= 4.9 pasa 'sort' a las operaciones de bulk_write y mongomock 4.3 no lo acepta
+_add_update = mongomock.collection.BulkOperationBuilder.add_update
+def _add_update_without_sort(self, *args, sort=None, **kwargs):
+    return _add_update(self, *args, **kwargs)
+mongomock.collection.BulkOperationBuilder.add_update = _add_update_without_sort
@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+import auth
+from auth import RevocationSet, create_access_token, decode_token, set_user_disabled
+from db.database import database
+
+@pytest.fixture(autouse=True)
+def clean_collections():
+    database["users"].delete_many({})
+    database["revoked_tokens"].delete_many({})
+    yield
+
+def test_is_revoked_does_not_query_the_database(monkeypatch):
+    revocations = RevocationSet(refresh_seconds=60)
+    database["revoked_tokens"].insert_one({"jti": "abc"})
+    asyncio.run(revocations.ensure_fresh())
+    assert not revocations.is_stale()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("is_revoked no debe consultar MongoDB")
+    monkeypatch.setattr(revocations, "refresh", fail)
+    assert revocations.is_revoked({"jti": "abc", "sub": "a@example.com"})
+    assert not revocations.is_revoked({"jti": "otro", "sub": "a@example.com"})
+
+def test_set_user_disabled_revokes_existing_tokens(monkeypatch):
+    monkeypatch.setattr(auth, "JWT_STATELESS", True)
+    monkeypatch.setattr(auth, "revocation_set", RevocationSet(refresh_seconds=60))
+    database["users"].insert_one({"email": "a@example.com", "hashed_password": "x", "disabled": False})
+    token = create_access_token({"sub": "a@example.com", "disabled": False, "role": "user"})
+    assert asyncio.run(auth.get_current_user(token)).email == "a@example.com"
+
+    set_user_disabled("a@example.com")
+    assert database["users"].find_one({"email": "a@example.com"})["disabled"] is True
+    assert database["revoked_tokens"].count_documents({"sub": "a@example.com"}) == 1
+    assert auth.revocation_set.is_revoked(decode_token(token))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(auth.get_current_user(token))
+    assert error.value.status_code == 401
+
+def test_set_user_disabled_unknown_user():
+    with pytest.raises(HTTPException) as error:
+        set_user_disabled("nadie@example.com")
+    assert error.value.status_code == 404
@@ -0,0 +1,120 @@
+import asyncio
+from urllib.parse import urlparse, parse_qs
+import httpx
+import pytest
+from services import oauth_service
+from services.oauth_service import OAuthService, OAuthServiceError
+
+TOKEN_URL = "https://stub.example/token"
+USERINFO_URL = "https://stub.example/userinfo"
+USER = {"id": "42", "email": "stub@example.com", "name": "Usuario Stub", "picture": ""}
+
+class StubProvider:
+    """Proveedor falso para httpx.MockTransport: cada ruta responde con la secuencia indicada.
+
+    Cada elemento de la secuencia es un código HTTP o una excepción a lanzar; el último se
+    repite cuando se agota.
+    """
+
+    def __init__(self, routes):
+        self.routes = {path: list(outcomes) for path, outcomes in routes.items()}
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append((request.method, request.url.path))
+        outcomes = self.routes[request.url.path]
+        outcome = outcomes.pop(0) if len(outcomes) > 1 else outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        if isinstance(outcome, httpx.Response):
+            return outcome
+        payload = {"access_token": "stub-token"} if request.url.path == "/token" else USER
+        return httpx.Response(outcome, json=payload if outcome == 200 else {"error": "unavailable"})
+
+    def count(self, path):
+        return sum(1 for _, p in self.requests if p == path)
+
+@pytest.fixture
+def stub(monkeypatch):
+    """Instala un cliente HTTP con el proveedor falso y sin esperas entre reintentos."""
+    monkeypatch.setattr(oauth_service, "OAUTH_HTTP_RETRIES", 2)
+    monkeypatch.setattr(oauth_service, "OAUTH_HTTP_BACKOFF", 0)
+    monkeypatch.setattr(oauth_service, "_json_cache", {})
+
+    def install(routes):
+        provider = StubProvider(routes)
+        monkeypatch.setattr(oauth_service, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(provider)))
+        return provider
+    return install
+
+@pytest.fixture
+def service():
+    service = OAuthService()
+    service.providers["google"].update(token_url=TOKEN_URL, user_info_url=USERINFO_URL)
+    return service
+
+def exchange(service):
+    state = parse_qs(urlparse(service.get_authorization_url("google")).query)["state"][0]
+    return asyncio.run(service.exchange_code_for_token("google", "stub-code", state))
+
+def connect_error():
+    return httpx.ConnectError("conexión rechazada")
+
+def test_get_user_info_retries_transient_5xx(stub, service):
+    provider = stub({"/userinfo": [503, 502, 200]})
+    user = asyncio.run(service.get_user_info("google", "stub-token"))
+    assert user["email"] == USER["email"]
+    assert provider.count("/userinfo") == 3
+
+def test_get_user_info_fails_after_retries(stub, service):
+    provider = stub({"/userinfo": [503]})
+    with pytest.raises(OAuthServiceError):
+        asyncio.run(service.get_user_info("google", "stub-token"))
+    assert provider.count("/userinfo") == 3
+
+def test_exchange_retries_connect_error(stub, service):
+    # El servidor no llegó a recibir la petición: reintentar el canje es seguro
+    provider = stub({"/token": [connect_error(), 200]})
+    assert exchange(service)["access_token"] == "stub-token"
+    assert provider.count("/token") == 2
+
+def test_exchange_gives_up_after_connect_errors(stub, service):
+    provider = stub({"/token": [connect_error()]})
+    with pytest.raises(OAuthServiceError):
+        exchange(service)
+    assert provider.count("/token") == 3
+
+def test_exchange_does_not_retry_5xx(stub, service):
+    # El código es de un solo uso: un 503 pudo llegar tras consumirlo
+    provider = stub({"/token": [503, 200]})
+    with pytest.raises(OAuthServiceError):
+        exchange(service)
+    assert provider.count("/token") == 1
+
+def test_exchange_does_not_retry_read_error(stub, service):
+    provider = stub({"/token": [httpx.ReadError("conexión cortada"), 200]})
+    with pytest.raises(OAuthServiceError):
+        exchange(service)
+    assert provider.count("/token") == 1
+
+def test_cached_json_honors_max_age(stub):
+    provider = stub({"/jwks": [httpx.Response(200, json={"keys": []}, headers={"Cache-Control": "public, max-age=60"})]})
+    for _ in range(3):
+        assert asyncio.run(oauth_service._get_cached_json("https://stub.example/jwks")) == {"keys": []}
+    assert provider.count("/jwks") == 1
+    asyncio.run(oauth_service._get_cached_json("https://stub.example/jwks", force_refresh=True))
+    assert provider.count("/jwks") == 2
+
+@pytest.mark.parametrize("cache_control", ["no-store", "no-cache", "max-age=0"])
+def test_cached_json_refetches_uncacheable(stub, cache_control):
+    provider = stub({"/jwks": [httpx.Response(200, json={"keys": []}, headers={"Cache-Control": cache_control})]})
+    for _ in range(2):
+        asyncio.run(oauth_service._get_cached_json("https://stub.example/jwks"))
+    assert provider.count("/jwks") == 2
+
+def test_cached_json_default_max_age(stub, monkeypatch):
+    monkeypatch.setattr(oauth_service, "OIDC_DEFAULT_MAX_AGE", 3600)
+    provider = stub({"/discovery": [httpx.Response(200, json={"issuer": "https://stub.example"})]})
+    for _ in range(2):
+        asyncio.run(oauth_service._get_cached_json("https://stub.example/discovery"))
+    assert provider.count("/discovery") == 1
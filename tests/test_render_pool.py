@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from services import cloudwords_service
+
+class ConcurrencyProbe:
+    """Sustituto de render_wordcloud que registra cuántos renderizados coinciden."""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+        return b"img"
+
+@pytest.fixture
+def thread_pool(monkeypatch):
+    """Pool de hilos en lugar del de procesos, para poder sustituir la función de renderizado."""
+    pool = ThreadPoolExecutor(max_workers=16)
+    monkeypatch.setattr(cloudwords_service, "_render_pool", pool)
+    yield pool
+    pool.shutdown()
+
+def test_render_slots_bound_requests_and_jobs_together(monkeypatch, thread_pool):
+    probe = ConcurrencyProbe()
+    monkeypatch.setattr(cloudwords_service, "render_wordcloud", probe)
+    monkeypatch.setattr(cloudwords_service, "_render_slots", threading.BoundedSemaphore(2))
+
+    # Trabajos en segundo plano (hilos) y peticiones (event loop) a la vez
+    jobs = [threading.Thread(target=cloudwords_service.render_wordcloud_sync, kwargs={"frequencies": {}})
+            for _ in range(4)]
+    for job in jobs:
+        job.start()
+
+    async def requests():
+        return await asyncio.gather(*(cloudwords_service.render_wordcloud_async(frequencies={}) for _ in range(4)))
+    assert asyncio.run(requests()) == [b"img"] * 4
+    for job in jobs:
+        job.join()
+    assert probe.peak == 2
+
+def test_concurrent_first_use_creates_one_pool(monkeypatch):
+    created = []
+
+    class SlowPool:
+        def __init__(self, **kwargs):
+            time.sleep(0.05)
+            created.append(self)
+
+    monkeypatch.setattr(cloudwords_service, "_render_pool", None)
+    monkeypatch.setattr(cloudwords_service, "ProcessPoolExecutor", SlowPool)
+    pools = []
+    threads = [threading.Thread(target=lambda: pools.append(cloudwords_service._get_render_pool())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+    assert all(pool is created[0] for pool in pools)
+
+class BrokenPool:
+    def __init__(self):
+        self.shutdown_calls = []
+
+    def submit(self, fn):
+        future = Future()
+        future.set_exception(BrokenProcessPool("worker muerto"))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shutdown_calls.append((wait, cancel_futures))
+
+@pytest.mark.parametrize("path", ["sync", "async"])
+def test_broken_pool_is_shut_down_and_replaced(monkeypatch, path):
+    broken = BrokenPool()
+    monkeypatch.setattr(cloudwords_service, "_render_pool", broken)
+    with pytest.raises(BrokenProcessPool):
+        if path == "sync":
+            cloudwords_service.render_wordcloud_sync(frequencies={})
+        else:
+            asyncio.run(cloudwords_service.render_wordcloud_async(frequencies={}))
+    assert broken.shutdown_calls == [(False, True)]
+    assert cloudwords_service._render_pool is None
+    # El hueco de renderizado se devolvió pese al error
+    slots = cloudwords_service._render_slots
+    acquired = [slots.acquire(blocking=False) for _ in range(cloudwords_service.CLOUDWORDS_MAX_CONCURRENT)]
+    assert all(acquired)
+    for _ in acquired:
+        slots.release()
@@ -0,0 +1,65 @@
+import random
+import pytest
+from services.spanish_stemmer import SuffixRule, SuffixStemmer, SPANISH_SUFFIX_RULES
+
+GOLDEN_CASES = {
+    "casas": "casa", "perros": "perro", "mes": "mes", "tres": "tr", "es": "es", "s": "s",
+    "perritos": "perr", "gatita": "gat", "ito": "", "itas": "", "cantando": "cant",
+    "comiendo": "comi", "hablar": "habl", "comer": "com", "vivir": "viv", "trabajaba": "trabaj",
+    "llegada": "lleg", "llegadas": "lleg", "mar": "mar", "ciudades": "ciudad", "niños": "niño",
+    "canciones": "cancion", "lunes": "lun", "andar": "and", "ando": "ando",
+}
+
+def legacy_stem(token):
+    # Cadena original de lemmatize_text para español, que la tabla por defecto reproduce
+    if token.endswith('es') and len(token) > 3:
+        token = token[:-2]
+    elif token.endswith('s') and len(token) > 3:
+        token = token[:-1]
+    if token.endswith('ito') or token.endswith('ita'):
+        token = token[:-3]
+    if len(token) > 4:
+        if token.endswith('ando') or token.endswith('endo'):
+            token = token[:-4]
+        elif token.endswith('ar') or token.endswith('er') or token.endswith('ir'):
+            token = token[:-2]
+        elif token.endswith('aba') or token.endswith('ada'):
+            token = token[:-3]
+    return token
+
+def random_tokens(size, seed=42):
+    rng = random.Random(seed)
+    letters = "aeiousrndtbclmñá"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(1, 10))) for _ in range(size)]
+
+@pytest.mark.parametrize("cache_size", [0, 100000])
+def test_golden_cases(cache_size):
+    stemmer = SuffixStemmer(SPANISH_SUFFIX_RULES, cache_size=cache_size)
+    for token, expected in GOLDEN_CASES.items():
+        assert stemmer.stem(token) == expected, token
+        assert legacy_stem(token) == expected, token
+
+def test_matches_legacy_chain():
+    stemmer = SuffixStemmer(SPANISH_SUFFIX_RULES, cache_size=1000)
+    tokens = random_tokens(50000)
+    assert [stemmer.stem(token) for token in tokens] == [legacy_stem(token) for token in tokens]
+    assert stemmer.stem_many(tokens) == [legacy_stem(token) for token in tokens]
+
+def test_first_rule_in_table_order_wins():
+    # El sufijo corto va antes en la tabla: gana aunque el largo también coincida
+    stemmer = SuffixStemmer([[SuffixRule("s", 1, 0), SuffixRule("es", 2, 0)]], cache_size=0)
+    assert stemmer.stem("meses") == "mese"
+    # Si su condición de longitud no se cumple se prueba la siguiente regla
+    stemmer = SuffixStemmer([[SuffixRule("s", 1, 10), SuffixRule("es", 2, 0)]], cache_size=0)
+    assert stemmer.stem("meses") == "mes"
+
+def test_empty_suffix_and_short_tokens():
+    stemmer = SuffixStemmer([[SuffixRule("ción", 4, 5), SuffixRule("", 1, 6)]], cache_size=0)
+    assert stemmer.stem("canción") == "can"
+    assert stemmer.stem("palabras") == "palabra"
+    assert stemmer.stem("ción") == "ción"
+    assert stemmer.stem("") == ""
+
+def test_fingerprint_depends_only_on_rules():
+    assert SuffixStemmer(SPANISH_SUFFIX_RULES).fingerprint == "b58e612031e0"
+    assert SuffixStemmer(SPANISH_SUFFIX_RULES, cache_size=0).fingerprint == "b58e612031e0"
@@ -0,0 +1,66 @@
+import pytest
+from db.database import database
+from services import term_index_service
+from services.cloudwords_service import collection_top_terms
+from services.collection_version_service import bump_collection_version
+from services.term_index_service import (build_term_index, drop_term_indexes, ensure_term_index, has_term_index,
+                                         record_documents_inserted, top_terms)
+
+COLECCION = "docs_term_index"
+
+@pytest.fixture(autouse=True)
+def coleccion():
+    database[COLECCION].insert_many([{"description": "gato perro"}, {"description": "gato"}])
+    yield COLECCION
+    drop_term_indexes(COLECCION)
+    database[COLECCION].drop()
+    database["collection_versions"].delete_many({"_id": COLECCION})
+
+def counts(pairs):
+    return dict(pairs)
+
+def test_auto_engine_does_not_build_index():
+    terms = collection_top_terms(COLECCION, engine="auto")
+    assert counts(terms)["gato"] == 2
+    assert not has_term_index(COLECCION)
+    assert database["term_index_meta"].count_documents({"coleccion": COLECCION}) == 0
+
+    build_term_index(COLECCION)
+    assert has_term_index(COLECCION)
+    assert counts(collection_top_terms(COLECCION, engine="auto"))["gato"] == 2
+
+def test_write_during_build_marks_index_stale(monkeypatch):
+    count_field_terms = term_index_service.count_field_terms
+
+    def count_then_write(*args, **kwargs):
+        result = count_field_terms(*args, **kwargs)
+        # Escritura por los servicios mientras la construcción aún no ha publicado el índice
+        database[COLECCION].insert_one({"description": "gato raton"})
+        bump_collection_version(COLECCION)
+        record_documents_inserted(COLECCION, [{"description": "gato raton"}])
+        return result
+
+    monkeypatch.setattr(term_index_service, "count_field_terms", count_then_write)
+    assert build_term_index(COLECCION)["status"] == "stale"
+    monkeypatch.setattr(term_index_service, "count_field_terms", count_field_terms)
+
+    assert counts(top_terms(COLECCION))["gato"] == 3
+    assert ensure_term_index(COLECCION)["status"] == "ready"
+
+def test_service_writes_keep_index_current():
+    generation = build_term_index(COLECCION)["current"]
+    database[COLECCION].insert_one({"description": "gato"})
+    bump_collection_version(COLECCION)
+    record_documents_inserted(COLECCION, [{"description": "gato"}])
+
+    meta = ensure_term_index(COLECCION)
+    assert meta["current"] == generation
+    assert counts(top_terms(COLECCION))["gato"] == 3
+
+def test_direct_write_triggers_rebuild():
+    generation = build_term_index(COLECCION)["current"]
+    database[COLECCION].insert_one({"description": "gato"})
+
+    meta = ensure_term_index(COLECCION)
+    assert meta["current"] != generation
+    assert counts(top_terms(COLECCION))["gato"] == 3
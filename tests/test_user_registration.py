@@ -0,0 +1,35 @@
+import pytest
+from fastapi.testclient import TestClient
+import main
+from db.database import database
+
+@pytest.fixture
+def client(monkeypatch):
+    database["users"].delete_many({})
+    # El coste de bcrypt no es lo que se prueba aquí
+    monkeypatch.setattr(main, "get_password_hash", lambda password: f"hash:{password}")
+    return TestClient(main.app)
+
+@pytest.mark.parametrize("unique_index", [True, False])
+def test_register_rejects_duplicate_email(client, monkeypatch, unique_index):
+    # Sin el índice único (creación fallida al arrancar) se comprueba antes de insertar
+    monkeypatch.setattr(main, "USERS_EMAIL_UNIQUE_INDEX", unique_index)
+    if not unique_index:
+        database["users"].drop_index("email_1")
+    try:
+        body = {"email": "dup@example.com", "password": "secreto1"}
+        assert client.post("/register", json=body).status_code == 201
+        response = client.post("/register", json=body)
+        assert response.status_code == 400
+        assert database["users"].count_documents({"email": "dup@example.com"}) == 1
+    finally:
+        database["users"].delete_many({})
+        database["users"].create_index("email", unique=True)
+
+def test_insert_user_documents_filters_existing_without_index(monkeypatch):
+    database["users"].delete_many({})
+    database["users"].insert_one({"email": "old@example.com"})
+    monkeypatch.setattr(main, "USERS_EMAIL_UNIQUE_INDEX", False)
+    documents = [main._new_user_document("old@example.com", "h"), main._new_user_document("new@example.com", "h")]
+    insertados, duplicados, errores = main._insert_user_documents(documents)
+    assert (insertados, duplicados, errores) == (1, ["old@example.com"], [])
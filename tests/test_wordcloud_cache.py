@@ -0,0 +1,53 @@
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from auth import User, get_current_active_user
+from routes import cloudwords_routes
+from services.cloudwords_cache import ContentCache
+from services.job_service import get_job
+
+@pytest.mark.parametrize("disk", [False, True])
+def test_metadata_round_trip(tmp_path, disk):
+    cache = ContentCache(1024 * 1024, str(tmp_path) if disk else None, 1024 * 1024)
+    cache.put_with_metadata("k", b"\x89PNG...", {"X-Frequency-Error-Bound": "7"})
+    if disk:
+        # Forzar la lectura desde disco
+        cache = ContentCache(1024 * 1024, str(tmp_path), 1024 * 1024)
+    assert cache.get_with_metadata("k") == (b"\x89PNG...", {"X-Frequency-Error-Bound": "7"})
+
+def test_entries_without_metadata():
+    cache = ContentCache(1024 * 1024)
+    cache.put("raw", b"\x89PNG...")
+    assert cache.get_with_metadata("raw") == (b"\x89PNG...", {})
+    assert cache.get_with_metadata("missing") is None
+
+@pytest.fixture
+def client(monkeypatch):
+    app = FastAPI()
+    app.include_router(cloudwords_routes.router)
+    app.dependency_overrides[get_current_active_user] = lambda: User(email="a@example.com", role="user")
+    monkeypatch.setattr(cloudwords_routes, "wordcloud_cache", ContentCache(1024 * 1024))
+    monkeypatch.setattr(cloudwords_routes, "get_collection_version", lambda coleccion: "v1")
+    return TestClient(app)
+
+def test_background_render_caches_error_bound_header(client, monkeypatch):
+    monkeypatch.setattr(cloudwords_routes, "build_collection_wordcloud",
+                        lambda *args: (b"\x89PNG...", "wordcloud.png", 7))
+    params = {"engine": "python", "mode": "approx"}
+    response = client.get("/cloudwords/collection/docs", params={**params, "background": True})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    for _ in range(100):
+        if get_job(job_id)["status"] == "completed":
+            break
+        time.sleep(0.02)
+    assert get_job(job_id)["status"] == "completed"
+
+    async def not_rendered(*args, **kwargs):
+        raise AssertionError("debía servirse desde la caché")
+    monkeypatch.setattr(cloudwords_routes, "generate_wordcloud_from_collection", not_rendered)
+    response = client.get("/cloudwords/collection/docs", params=params)
+    assert response.status_code == 200
+    assert response.content == b"\x89PNG..."
+    assert response.headers["X-Frequency-Error-Bound"] == "7"
@@ -0,0 +1,73 @@
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from auth import User, get_current_active_user
+from db.database import database
+from routes import cloudwords_routes
+from services import cloudwords_service
+from services.cloudwords_cache import ContentCache
+from services.job_service import cancel_job, get_job
+from services.term_index_service import build_term_index, drop_term_indexes
+
+COLECCION = "docs_wordcloud_job"
+
+@pytest.fixture
+def client(monkeypatch):
+    database[COLECCION].insert_many([{"description": "gato perro"}, {"description": "gato raton"}])
+    app = FastAPI()
+    app.include_router(cloudwords_routes.router)
+    app.dependency_overrides[get_current_active_user] = lambda: User(email="a@example.com", role="user")
+    monkeypatch.setattr(cloudwords_routes, "wordcloud_cache", ContentCache(1024 * 1024))
+    monkeypatch.setattr(cloudwords_routes, "get_collection_version", lambda coleccion: "v1")
+    yield TestClient(app)
+    drop_term_indexes(COLECCION)
+    database[COLECCION].drop()
+
+def wait_for(job_id):
+    for _ in range(200):
+        job = get_job(job_id)
+        if job["status"] not in ("pending", "running"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError("el trabajo no terminó")
+
+def submit(client, engine):
+    response = client.get(f"/cloudwords/collection/{COLECCION}", params={"engine": engine, "background": True})
+    assert response.status_code == 202
+    return response.json()["job_id"]
+
+@pytest.mark.parametrize("engine", ["index", "python"])
+def test_job_reports_a_step_per_phase(client, monkeypatch, engine):
+    if engine == "index":
+        build_term_index(COLECCION)
+    seen = []
+
+    def render(frequencies, **kwargs):
+        job = database["jobs"].find_one({"params.coleccion": COLECCION, "status": "running"})
+        seen.append((job["progress"], job["partial"]))
+        return b"\x89PNG..."
+    monkeypatch.setattr(cloudwords_service, "render_wordcloud_sync", render)
+
+    job = wait_for(submit(client, engine))
+    assert job["status"] == "completed"
+    assert seen == [({"processed": 1, "total": 3}, {"fase": "renderizado", "terminos": 3})]
+    assert job["progress"] == {"processed": 3, "total": 3}
+
+def test_cancel_during_render_skips_cache(client, monkeypatch):
+    build_term_index(COLECCION)
+
+    def render(frequencies, **kwargs):
+        job = database["jobs"].find_one({"params.coleccion": COLECCION, "status": "running"})
+        cancel_job(job["_id"])
+        return b"\x89PNG..."
+
+    def not_cached(*args):
+        raise AssertionError("un trabajo cancelado no debe guardar la imagen")
+    monkeypatch.setattr(cloudwords_service, "render_wordcloud_sync", render)
+    monkeypatch.setattr(cloudwords_routes.wordcloud_cache, "put_with_metadata", not_cached)
+
+    job = wait_for(submit(client, "index"))
+    assert job["status"] == "cancelled"
+    assert job["progress"] == {"processed": 2, "total": 3}
+    assert "file" not in job